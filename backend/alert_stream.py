@@ -0,0 +1,158 @@
+"""
+Live alert delivery over Server-Sent Events (GET /alerts/stream).
+
+One AlertBroker per API process holds a small bounded queue per open stream.
+A single poller task reads the notifications written since the last poll for
+all connected users in one query and routes them to their queues, so an idle
+connection costs a queue and a suspended generator, never a query or a
+thread. The poller wakes immediately when a dispatch in this process commits
+(backend.alerts listener) and every ALERT_STREAM_POLL_SECONDS otherwise, which
+also picks up notifications written by the bulk loaders and sidecar scheduler.
+"""
+
+import os
+import json
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from sqlmodel import Session, select, func
+
+from .models import Notification
+from . import alerts
+
+POLL_SECONDS = float(os.environ.get("ALERT_STREAM_POLL_SECONDS", "5"))
+HEARTBEAT_SECONDS = float(os.environ.get("ALERT_STREAM_HEARTBEAT_SECONDS", "25"))
+QUEUE_SIZE = int(os.environ.get("ALERT_STREAM_QUEUE_SIZE", "100"))  # Events buffered per slow client
+REPLAY_LIMIT = 100  # Missed events sent on reconnect (Last-Event-ID)
+USER_CHUNK = 500  # SQLite caps bound parameters per statement
+
+
+def notification_event(n: Notification) -> str:
+    """One SSE frame; the notification id is the event id used for Last-Event-ID."""
+    data = {
+        "id": n.id, "product_id": n.product_id, "record_type": n.record_type,
+        "record_id": n.record_id, "title": n.title, "created_at": n.created_at.isoformat()
+    }
+    return f"id: {n.id}\nevent: {n.record_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class AlertBroker:
+    def __init__(self, engine, poll_seconds: float = POLL_SECONDS):
+        self.engine = engine
+        self.poll_seconds = poll_seconds
+        self.queues: Dict[int, Set[asyncio.Queue]] = {}
+        self.last_id: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task = None
+        alerts.add_listener(self.notify)
+
+    def connections(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Registers a stream for the user; starts the poller on the first one."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.queues.setdefault(user_id, set()).add(queue)
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self.run_forever())
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self.queues.get(user_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.queues[user_id]
+
+    def notify(self):
+        """alerts listener: may run in a worker thread (scheduler tick), so hops onto the loop."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def deliver(self, notifications: List[Notification]):
+        for n in notifications:
+            for queue in self.queues.get(n.user_id, ()):
+                if queue.full():
+                    # Slow client: drop its oldest event, it can catch up from /alerts/notifications
+                    queue.get_nowait()
+                queue.put_nowait(n)
+
+    def fetch_new(self, user_ids: List[int]) -> List[Notification]:
+        """Notifications written since the last poll for the connected users (runs in a thread)."""
+        with Session(self.engine) as session:
+            if self.last_id is None:
+                # Streams only carry what happens after the broker started; older ones are replayed per client
+                self.last_id = session.exec(select(func.max(Notification.id))).one() or 0
+                return []
+            latest = session.exec(select(func.max(Notification.id))).one() or 0
+            rows = []
+            for i in range(0, len(user_ids), USER_CHUNK):
+                rows += session.exec(
+                    select(Notification)
+                    .where(Notification.id > self.last_id, Notification.id <= latest)
+                    .where(Notification.user_id.in_(user_ids[i:i + USER_CHUNK]))
+                ).all()
+            self.last_id = latest
+            return sorted(rows, key=lambda n: n.id)
+
+    async def poll(self):
+        user_ids = sorted(self.queues)
+        self.deliver(await asyncio.to_thread(self.fetch_new, user_ids))
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Alert stream poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def replay(self, user_id: int, last_event_id: int) -> List[Notification]:
+        """Notifications the client missed while disconnected (runs in a thread)."""
+        with Session(self.engine) as session:
+            return session.exec(
+                select(Notification)
+                .where(Notification.user_id == user_id, Notification.id > last_event_id)
+                .order_by(Notification.id)
+                .limit(REPLAY_LIMIT)
+            ).all()
+
+    async def stream(self, user_id: int, last_event_id: Optional[int] = None, heartbeat: float = HEARTBEAT_SECONDS):
+        """Async generator of SSE frames for one client; unsubscribes when the client goes away."""
+        queue = self.subscribe(user_id)
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield "retry: 5000\n\n"
+            sent = last_event_id or 0
+            if last_event_id is not None:
+                for n in await asyncio.to_thread(self.replay, user_id, last_event_id):
+                    sent = n.id
+                    yield notification_event(n)
+            while True:
+                try:
+                    n = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment frame keeps proxies from closing the idle connection
+                    yield ": ping\n\n"
+                    continue
+                if n.id > sent:
+                    sent = n.id
+                    yield notification_event(n)
+        finally:
+            self.unsubscribe(user_id, queue)
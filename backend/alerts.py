@@ -0,0 +1,158 @@
+"""
+Alert fan-out: turns newly ingested patents, trials, articles and conference
+abstracts into Notification rows for the users subscribed to their product.
+
+Each dispatch reads the rows inserted since the last one (an id cursor per
+record type), loads the subscriptions of just the products involved in one
+query per 500 products, indexes them by (product, record type) and writes the
+notifications with batched INSERT ... ON CONFLICT DO NOTHING. The cost is one
+pass over the new records plus the notifications written, not a query per
+record or per subscriber.
+
+On PostgreSQL ids are handed out before commit, so a row can become visible
+after a higher id was already dispatched. Each dispatch there re-reads the
+last ALERT_CURSOR_GRACE_IDS ids below the cursor; records already notified
+are skipped by the unique notification key. SQLite serialises writers, so
+its ids always commit in order.
+
+Called after every ingestion path commits (scheduler, refresh, bulk loaders,
+on-demand article refresh). Listeners (the live alert stream) are told when
+a dispatch wrote notifications.
+"""
+
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, select, func
+
+from .models import AlertCursor, AlertSubscription, ClinicalTrial, Conference, Notification, Patent, ScientificArticle
+from .ingestion import bulk_upsert
+
+NOTIFICATION_KEY = ["user_id", "record_type", "record_id"]
+FANOUT_BATCH_SIZE = int(os.environ.get("ALERT_FANOUT_BATCH_SIZE", "5000"))  # New records read per query
+SUBSCRIPTION_CHUNK = 500  # SQLite caps bound parameters per statement
+CURSOR_GRACE_IDS = int(os.environ.get("ALERT_CURSOR_GRACE_IDS", "1000"))  # Ids re-read below the cursor (PostgreSQL)
+
+# record type -> (model, AlertSubscription preference flag)
+RECORD_TYPES = {
+    "patent": (Patent, "alert_patents"),
+    "trial": (ClinicalTrial, "alert_trials"),
+    "article": (ScientificArticle, "alert_articles"),
+    "conference": (Conference, "alert_conferences"),
+}
+
+# (record id, product id, title)
+NewRecord = Tuple[int, int, str]
+
+# Callables invoked as listener() after a dispatch commits new notifications
+_listeners: List[Callable] = []
+
+
+def add_listener(listener: Callable):
+    _listeners.append(listener)
+
+def remove_listener(listener: Callable):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def subscription_index(session: Session, product_ids: Iterable[int]) -> Dict[Tuple[int, str], List[int]]:
+    """(product_id, record_type) -> ids of the users who want those alerts, for the given products."""
+    flags = [getattr(AlertSubscription, flag) for _, flag in RECORD_TYPES.values()]
+    index = {}
+    ids = sorted(set(product_ids))
+    for i in range(0, len(ids), SUBSCRIPTION_CHUNK):
+        rows = session.exec(
+            select(AlertSubscription.product_id, AlertSubscription.user_id, *flags)
+            .where(AlertSubscription.product_id.in_(ids[i:i + SUBSCRIPTION_CHUNK]))
+        ).all()
+        for product_id, user_id, *wanted in rows:
+            for record_type, on in zip(RECORD_TYPES, wanted):
+                if on:
+                    index.setdefault((product_id, record_type), []).append(user_id)
+    return index
+
+def fan_out(session: Session, new_records: Dict[str, List[NewRecord]]) -> int:
+    """
+    Writes one notification per (subscribed user, new record).
+    `new_records` maps record types to their new rows. Returns the number of
+    notifications inserted (duplicates of existing notifications are skipped
+    by the database). Does not commit.
+    """
+    index = subscription_index(session, (pid for records in new_records.values() for _, pid, _ in records if pid))
+    if not index:
+        return 0
+
+    now = datetime.utcnow()
+    rows = (
+        {"user_id": user_id, "product_id": product_id, "record_type": record_type,
+         "record_id": record_id, "title": (title or "")[:300], "created_at": now}
+        for record_type, records in new_records.items()
+        for record_id, product_id, title in records
+        for user_id in index.get((product_id, record_type), ())
+    )
+    return bulk_upsert(session, Notification, rows, NOTIFICATION_KEY)
+
+
+def _cursor(session: Session, record_type: str, model) -> AlertCursor:
+    cursor = session.exec(select(AlertCursor).where(AlertCursor.record_type == record_type)).first()
+    if cursor is None:
+        # First dispatch: start from the current rows, subscribers are not sent the backlog
+        last_id = session.exec(select(func.max(model.id))).one() or 0
+        cursor = AlertCursor(record_type=record_type, last_id=last_id)
+        session.add(cursor)
+        session.flush()
+    return cursor
+
+def dispatch_new_records(session: Session, batch_size: int = FANOUT_BATCH_SIZE, grace: Optional[int] = None) -> int:
+    """
+    Fans out every record inserted since the previous dispatch and advances
+    the cursors. `grace` ids below each cursor are read again (default: none
+    on SQLite, CURSOR_GRACE_IDS elsewhere). Returns the number of
+    notifications written. Does not commit.
+    """
+    if grace is None:
+        grace = 0 if session.get_bind().dialect.name == "sqlite" else CURSOR_GRACE_IDS
+    notifications = 0
+    cursors = {t: _cursor(session, t, model) for t, (model, _) in RECORD_TYPES.items()}
+    after = {t: max(cursor.last_id - grace, 0) for t, cursor in cursors.items()}
+    while True:
+        batch = {}
+        for record_type, (model, _) in RECORD_TYPES.items():
+            rows = session.exec(
+                select(model.id, model.product_id, model.title)
+                .where(model.id > after[record_type])
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if rows:
+                batch[record_type] = rows
+                after[record_type] = rows[-1][0]
+                cursors[record_type].last_id = max(cursors[record_type].last_id, rows[-1][0])
+        if not batch:
+            break
+        notifications += fan_out(session, batch)
+        if all(len(rows) < batch_size for rows in batch.values()):
+            break
+
+    now = datetime.utcnow()
+    for cursor in cursors.values():
+        cursor.updated_at = now
+        session.add(cursor)
+    return notifications
+
+def dispatch_alerts(engine) -> int:
+    """Runs a dispatch in its own transaction. Failures are logged, never raised to the ingestion path."""
+    try:
+        with Session(engine) as session:
+            notifications = dispatch_new_records(session)
+            session.commit()
+        if notifications:
+            print(f"🔔 {notifications} alert notifications")
+            for listener in list(_listeners):
+                listener()
+        return notifications
+    except Exception as e:
+        print(f"Alert dispatch failed: {e}")
+        return 0
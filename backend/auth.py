@@ -4,7 +4,13 @@ Provides password hashing, JWT tokens, and TOTP-based 2FA
 """
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import json
+import asyncio
+import threading
 import secrets
 import hashlib
 import hmac
@@ -12,59 +18,292 @@ import struct
 import time
 import base64
 
-# Password hashing with bcrypt-like approach using hashlib
+# Password hashing
+# Stored as "<scheme>$<params>$<salt>$<hash>"; hashes from before the scheme
+# prefix ("<salt>$<hash>", PBKDF2-SHA256 x 100k) still verify and are upgraded
+# on the next login (needs_rehash).
+PASSWORD_SCHEME = os.environ.get("PASSWORD_SCHEME", "pbkdf2_sha256")  # or "scrypt"
+PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", "100000"))
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+# Hashing is CPU-bound by design: it runs on its own small pool (hashlib
+# releases the GIL), so a burst of logins queues there instead of filling the
+# request threadpool
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+
+def _scheme_params(scheme: str) -> str:
+    if scheme == "scrypt":
+        return f"{SCRYPT_N},{SCRYPT_R},{SCRYPT_P}"
+    if scheme == "pbkdf2_sha256":
+        return str(PBKDF2_ITERATIONS)
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+def _derive(scheme: str, params: str, password: str, salt: str) -> str:
+    if scheme == "scrypt":
+        n, r, p = (int(x) for x in params.split(","))
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=128 * n * r * p + (1 << 20)).hex()
+    if scheme == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), int(params)).hex()
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
 def hash_password(password: str) -> str:
-    """Hash password with salt using SHA-256"""
+    """Hash password with a random salt using the configured scheme"""
     salt = secrets.token_hex(16)
-    pw_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-    return f"{salt}${pw_hash.hex()}"
+    params = _scheme_params(PASSWORD_SCHEME)
+    return f"{PASSWORD_SCHEME}${params}${salt}${_derive(PASSWORD_SCHEME, params, password, salt)}"
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
     try:
-        salt, pw_hash = hashed.split('$')
-        new_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-        return hmac.compare_digest(new_hash.hex(), pw_hash)
+        parts = hashed.split('$')
+        if len(parts) == 2:
+            salt, pw_hash = parts
+            new_hash = _derive("pbkdf2_sha256", str(LEGACY_PBKDF2_ITERATIONS), password, salt)
+        else:
+            scheme, params, salt, pw_hash = parts
+            new_hash = _derive(scheme, params, password, salt)
+        return hmac.compare_digest(new_hash, pw_hash)
     except:
         return False
 
+def needs_rehash(hashed: str) -> bool:
+    """True when the hash was not made with the configured scheme and cost"""
+    parts = hashed.split('$')
+    return len(parts) != 4 or parts[0] != PASSWORD_SCHEME or parts[1] != _scheme_params(PASSWORD_SCHEME)
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, hash_password, password)
 
-# JWT-like token generation (simplified)
-JWT_SECRET = secrets.token_hex(32)
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, verify_password, password, hashed)
+
+
+# JWT (HS256) with persisted, rotatable signing keys
+# Every worker and node must verify every token, so keys are never generated
+# per process. They come from AUTH_SIGNING_KEYS (JSON {"kid": "secret"}, with
+# AUTH_ACTIVE_KID naming the signing key) when set, e.g. from a secret store
+# shared by all nodes; otherwise from AUTH_KEYS_FILE, created when a token is
+# first signed or verified and shared by the workers of a node.
 TOKEN_EXPIRE_HOURS = 24
+TOKEN_LEEWAY_SECONDS = 30  # Clock skew tolerated between nodes
+AUTH_KEYS_FILE = os.environ.get("AUTH_KEYS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "auth_keys.json"))
+AUTH_KEEP_KEYS = int(os.environ.get("AUTH_KEEP_KEYS", "3"))  # Active key + retired keys still accepted
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _new_key() -> Tuple[str, str]:
+    return datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + secrets.token_hex(4), secrets.token_hex(32)
+
+def _write_keys_file(path: str, keys: dict, exclusive: bool) -> bool:
+    """Writes the key file atomically. With `exclusive`, returns False if another process created it first."""
+    tmp = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "w") as fh:
+            json.dump(keys, fh)
+        if exclusive:
+            try:
+                os.link(tmp, path)  # Fails if the file exists: first worker wins
+            except FileExistsError:
+                return False
+        else:
+            os.replace(tmp, path)
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class SigningKeys:
+    """
+    Signing keys by key id (kid), loaded on first use. The key file is
+    re-read when another process rotated it: before signing, and when a
+    token names an unknown kid.
+    """
+    def __init__(self, keys_file: str = AUTH_KEYS_FILE):
+        self.keys_file = keys_file
+        self.active: Optional[str] = None
+        self.keys: Dict[str, bytes] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self.active is None:
+            with self._lock:
+                if self.active is None:
+                    self.load()
+
+    def load(self):
+        configured = os.environ.get("AUTH_SIGNING_KEYS")
+        if configured:
+            keys = json.loads(configured)
+            self.keys = {kid: secret.encode() for kid, secret in keys.items()}
+            self.active = os.environ.get("AUTH_ACTIVE_KID") or list(keys)[-1]
+            return
+        if not os.path.exists(self.keys_file):
+            kid, secret = _new_key()
+            _write_keys_file(self.keys_file, {"active": kid, "keys": {kid: secret}}, exclusive=True)
+        self._read_file()
+
+    def _read_file(self):
+        mtime = os.path.getmtime(self.keys_file)
+        with open(self.keys_file) as fh:
+            data = json.load(fh)
+        self.keys = {kid: secret.encode() for kid, secret in data["keys"].items()}
+        self.active = data["active"]
+        self._mtime = mtime
+
+    def _reload_if_changed(self):
+        if self._mtime is not None and os.path.getmtime(self.keys_file) != self._mtime:
+            with self._lock:
+                if os.path.getmtime(self.keys_file) != self._mtime:
+                    self._read_file()
+
+    def get(self, kid: str) -> Optional[bytes]:
+        self._ensure_loaded()
+        key = self.keys.get(kid)
+        if key is None:
+            # Unknown kid: a rotation in another worker may have added it
+            self._reload_if_changed()
+            key = self.keys.get(kid)
+        return key
+
+    def signing_key(self) -> Tuple[str, bytes]:
+        # Sign with the key another worker may have just rotated in
+        self._ensure_loaded()
+        self._reload_if_changed()
+        active = self.active
+        return active, self.keys[active]
+
+    def rotate(self) -> str:
+        """Adds a new active key; the previous AUTH_KEEP_KEYS - 1 keys keep verifying existing tokens."""
+        if os.environ.get("AUTH_SIGNING_KEYS"):
+            raise RuntimeError("Keys come from AUTH_SIGNING_KEYS: rotate them in the secret store")
+        self._ensure_loaded()
+        with self._lock:
+            self._read_file()
+            kid, secret = _new_key()
+            # Keys are kept in creation order, oldest first
+            kept = list(self.keys)[-(AUTH_KEEP_KEYS - 1):] if AUTH_KEEP_KEYS > 1 else []
+            keys = {k: self.keys[k].decode() for k in kept}
+            keys[kid] = secret
+            _write_keys_file(self.keys_file, {"active": kid, "keys": keys}, exclusive=False)
+            self._read_file()
+        return kid
+
+# Nothing is read or written on import: the key file is loaded on first use
+signing_keys = SigningKeys()
 
 def create_token(user_id: int, username: str) -> str:
-    """Create a simple signed token"""
-    expires = int((datetime.utcnow() + timedelta(hours=TOKEN_EXPIRE_HOURS)).timestamp())
-    payload = f"{user_id}:{username}:{expires}"
-    signature = hmac.new(JWT_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
-    token_data = base64.b64encode(f"{payload}:{signature}".encode()).decode()
-    return token_data
+    """Create a signed JWT (HS256) for the user"""
+    kid, key = signing_keys.signing_key()
+    now = int(time.time())
+    header = _b64url(json.dumps({"alg": "HS256", "typ": "JWT", "kid": kid}, separators=(",", ":")).encode())
+    payload = _b64url(json.dumps({
+        "sub": str(user_id), "username": username, "iat": now, "exp": now + TOKEN_EXPIRE_HOURS * 3600
+    }, separators=(",", ":")).encode())
+    signature = hmac.new(key, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64url(signature)}"
 
 def verify_token(token: str) -> Optional[dict]:
     """Verify token and return payload"""
     try:
-        decoded = base64.b64decode(token.encode()).decode()
-        parts = decoded.rsplit(':', 1)
-        payload, signature = parts[0], parts[1]
+        header_b64, payload_b64, signature = token.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        if header.get("alg") != "HS256":
+            return None
+        key = signing_keys.get(header.get("kid"))
+        if key is None:
+            return None
         
         # Verify signature
-        expected_sig = hmac.new(JWT_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
-        if not hmac.compare_digest(signature, expected_sig):
+        expected_sig = hmac.new(key, f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64url_decode(signature), expected_sig):
             return None
         
-        # Parse payload
-        user_id, username, expires = payload.split(':')
-        
         # Check expiration
-        if int(expires) < int(datetime.utcnow().timestamp()):
+        claims = json.loads(_b64url_decode(payload_b64))
+        if int(claims["exp"]) + TOKEN_LEEWAY_SECONDS < int(time.time()):
             return None
             
-        return {"user_id": int(user_id), "username": username}
+        return {"user_id": int(claims["sub"]), "username": claims["username"], "expires": int(claims["exp"])}
     except:
         return None
 
 
+# Verified-token cache: token -> id of the user it authenticates
+AUTH_CACHE_SECONDS = float(os.environ.get("AUTH_CACHE_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+
+class TokenCache:
+    """
+    LRU cache of verified tokens and the id of the user they authenticate, so
+    repeated requests skip the HMAC check. Entries live for AUTH_CACHE_SECONDS
+    (never past the token expiry). Only the id is cached: the user itself is
+    loaded per request, so changes made on any worker apply immediately.
+    """
+    def __init__(self, ttl: float = AUTH_CACHE_SECONDS, size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expires_at, user_id)
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return entry[1]
+
+    def put(self, token: str, user_id: int, token_expires: Optional[int] = None):
+        ttl = self.ttl
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (time.monotonic() + ttl, user_id)
+            self._by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._by_user.get(entry[1])
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[entry[1]]
+
+token_cache = TokenCache()
+
+
 # TOTP (Time-based One-Time Password) for 2FA
 def generate_totp_secret() -> str:
     """Generate a new TOTP secret"""
@@ -105,3 +344,12 @@ def verify_totp(secret: str, code: str, window: int = 1) -> bool:
 def get_totp_uri(secret: str, username: str, issuer: str = "LetScience") -> str:
     """Generate otpauth URI for QR code"""
     return f"otpauth://totp/{issuer}:{username}?secret={secret}&issuer={issuer}"
+
+
+if __name__ == "__main__":
+    # python -m backend.auth rotate
+    import sys
+    if sys.argv[1:] == ["rotate"]:
+        print(f"Active signing key: {signing_keys.rotate()}")
+    else:
+        print("Usage: python -m backend.auth rotate")
@@ -0,0 +1,113 @@
+"""
+Maintained ClinicalBudget totals per (trial_id, site_name, currency).
+
+BudgetRollup holds the sums and over/under-budget counters the CTA dashboards
+read. The create/delete/import endpoints apply every change to the budget
+lines as a delta in the same transaction, with one
+INSERT ... ON CONFLICT DO UPDATE SET total = total + delta per batch, so
+readers aggregate a few rows per trial instead of scanning the line items.
+Balance and utilisation are derived from the stored sums when read.
+
+Budget lines are only created and deleted (never edited), so a line's
+counters can be subtracted exactly as they were added. `rebuild_rollups`
+recomputes the table from the lines; `ensure_rollups` runs it at startup when
+the rollup's totals no longer match the lines.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import case, delete, func, insert
+from sqlmodel import Session, select
+
+from .models import ClinicalBudget, BudgetRollup
+from .ingestion import UPSERT_BATCH_SIZE, dialect_insert
+
+ROLLUP_KEY = ["trial_id", "site_name", "currency"]
+COUNTERS = ["allocated", "spent", "items", "over_budget_items", "underutilized_items"]
+
+# Lines that have used less than this share of a positive allocation
+UNDERUTILIZED_RATIO = 0.1
+
+
+def _value(line, field):
+    return line[field] if isinstance(line, dict) else getattr(line, field)
+
+def line_deltas(lines: Iterable, sign: int = 1) -> Dict[tuple, Dict]:
+    """Rollup key -> counter deltas for budget lines (ClinicalBudget objects or row dicts)."""
+    deltas: Dict[tuple, Dict] = {}
+    for line in lines:
+        key = tuple(_value(line, k) for k in ROLLUP_KEY)
+        allocated = float(_value(line, "allocated_amount") or 0.0)
+        spent = float(_value(line, "spent_amount") or 0.0)
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = dict.fromkeys(COUNTERS, 0)
+        delta["allocated"] += sign * allocated
+        delta["spent"] += sign * spent
+        delta["items"] += sign
+        delta["over_budget_items"] += sign * (spent > allocated)
+        delta["underutilized_items"] += sign * (allocated > 0 and spent < allocated * UNDERUTILIZED_RATIO)
+    return deltas
+
+def apply_budget_lines(session: Session, lines: Iterable, sign: int = 1, batch_size: int = UPSERT_BATCH_SIZE) -> int:
+    """
+    Adds (sign=1) or removes (sign=-1) budget lines from the rollup. Returns the
+    number of rollup rows touched. Does not commit.
+    """
+    deltas = line_deltas(lines, sign)
+    if not deltas:
+        return 0
+    session.flush()
+    table = BudgetRollup.__table__
+    insert_stmt = dialect_insert(session)
+    now = datetime.utcnow()
+    rows = [dict(zip(ROLLUP_KEY, key), updated_at=now, **delta) for key, delta in deltas.items()]
+    for start in range(0, len(rows), batch_size):
+        stmt = insert_stmt(table).values(rows[start:start + batch_size])
+        set_ = {c: table.c[c] + stmt.excluded[c] for c in COUNTERS}
+        set_["updated_at"] = stmt.excluded.updated_at
+        session.execute(stmt.on_conflict_do_update(index_elements=ROLLUP_KEY, set_=set_))
+    if sign < 0:
+        # Sites left without lines disappear from the portfolio
+        session.execute(delete(BudgetRollup).where(BudgetRollup.items <= 0))
+    return len(rows)
+
+def rebuild_rollups(session: Session) -> int:
+    """Recomputes every rollup row from the budget lines with one grouped INSERT ... SELECT. Does not commit."""
+    allocated, spent = ClinicalBudget.allocated_amount, ClinicalBudget.spent_amount
+    grouped = select(
+        ClinicalBudget.trial_id, ClinicalBudget.site_name, ClinicalBudget.currency,
+        func.coalesce(func.sum(allocated), 0.0), func.coalesce(func.sum(spent), 0.0), func.count(ClinicalBudget.id),
+        func.sum(case((spent > allocated, 1), else_=0)),
+        func.sum(case(((allocated > 0) & (spent < allocated * UNDERUTILIZED_RATIO), 1), else_=0)),
+        func.current_timestamp(),
+    ).group_by(ClinicalBudget.trial_id, ClinicalBudget.site_name, ClinicalBudget.currency)
+    session.execute(delete(BudgetRollup))
+    result = session.execute(insert(BudgetRollup).from_select(ROLLUP_KEY + COUNTERS + ["updated_at"], grouped))
+    return result.rowcount
+
+def rollups_in_sync(session: Session) -> bool:
+    """
+    Cheap checksum: the line count and amount sums must match the rollup's.
+    Lines written outside `apply_budget_lines` (seed scripts, manual SQL) show up here.
+    """
+    lines = session.exec(select(
+        func.count(ClinicalBudget.id),
+        func.coalesce(func.sum(ClinicalBudget.allocated_amount), 0.0),
+        func.coalesce(func.sum(ClinicalBudget.spent_amount), 0.0),
+    )).one()
+    rollup = session.exec(select(
+        func.coalesce(func.sum(BudgetRollup.items), 0),
+        func.coalesce(func.sum(BudgetRollup.allocated), 0.0),
+        func.coalesce(func.sum(BudgetRollup.spent), 0.0),
+    )).one()
+    return lines[0] == rollup[0] and all(abs(a - b) < 0.01 for a, b in zip(lines[1:], rollup[1:]))
+
+def ensure_rollups(session: Session) -> bool:
+    """Rebuilds the rollup when it no longer matches the budget lines. Returns True if it rebuilt."""
+    if rollups_in_sync(session):
+        return False
+    rebuild_rollups(session)
+    session.commit()
+    return True
@@ -0,0 +1,66 @@
+"""
+Shared driver of the offline loaders that map source files to rows in worker
+processes and upsert them from the parent (patent full text, conference
+abstracts).
+
+The ProductMatcher is built once and shipped to each worker through
+`matching.init_worker`; each file's rows are upserted and committed as soon as
+its worker finishes, then alerts are fanned out once for the whole load.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlmodel import Session, SQLModel
+
+from .ingestion import bulk_upsert, new_upsert_stats
+from .matching import init_worker, load_matcher
+from .alerts import dispatch_alerts
+
+
+def load_matched_files(
+    engine,
+    files: List[str],
+    map_file: Callable,
+    model: type[SQLModel],
+    key: List[str],
+    update: List[str],
+    label: str,
+    unit: str,
+    workers: Optional[int] = None,
+    map_args: Sequence = (),
+) -> Dict[str, int]:
+    """
+    Runs map_file(path, *map_args) -> (path, records parsed, rows) for every file
+    in a process pool and upserts the rows on `key`. `label` names the files and
+    `unit` the records in the progress output. Returns the upsert stats.
+    """
+    stats = new_upsert_stats()
+    if not files:
+        print(f"No {label} found.")
+        return stats
+
+    started = time.perf_counter()
+    parsed_total = 0
+    with Session(engine) as session:
+        matcher = load_matcher(session)
+        print(f"📦 Parsing {len(files)} {label} against {len(matcher)} product names and synonyms...")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(matcher,)) as pool:
+            futures = [pool.submit(map_file, f, *map_args) for f in files]
+            for future in as_completed(futures):
+                path, parsed, rows = future.result()
+                parsed_total += parsed
+                bulk_upsert(session, model, rows, key, update, stats=stats)
+                session.commit()
+                elapsed = time.perf_counter() - started
+                print(f"  > {os.path.basename(path)}: {parsed} {unit}, {len(rows)} product links "
+                      f"({parsed_total / elapsed:.0f} {unit}/s)")
+
+    dispatch_alerts(engine)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Parsed {parsed_total} {unit} in {elapsed:.1f}s: {stats['inserted']} inserted, "
+          f"{stats['updated']} updated, {stats['unchanged']} unchanged")
+    return stats
@@ -0,0 +1,310 @@
+"""
+Daily/weekly alert digests.
+
+Each AlertSubscription picks a digest cadence (digest_frequency). A digest run
+covers the notifications written since the previous run of that cadence (an
+AlertCursor per cadence, "digest:daily" / "digest:weekly"):
+
+- one grouped query gives the new record counts per (user, product, type) for
+  the subscriptions on that cadence;
+- one query per 500 products reads the new records, and each product section
+  is rendered once per combination of record types, then reused for every
+  subscriber with those alert preferences;
+- messages go to a pluggable sink in batches, each retried with backoff.
+
+Users whose batch still fails get their own cursor ("digest:daily:<user id>")
+at the start of the window they missed; their next digest covers everything
+since then, and the cursor is dropped once it is delivered.
+
+Runs from the refresh scheduler; a cadence is claimed with a conditional
+UPDATE so several workers never send the same digest twice.
+"""
+
+import os
+import json
+import time
+import smtplib
+from email.message import EmailMessage
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, update
+from sqlmodel import Session, select, func
+
+from data_ingestion.http_client import retry_delay
+from .models import AlertCursor, AlertSubscription, Notification, Product, User
+
+DIGEST_PERIODS = {"daily": timedelta(days=1), "weekly": timedelta(days=7)}
+ITEMS_PER_TYPE = 5  # Titles listed per product and record type; the rest are counted
+DELIVERY_BATCH_SIZE = int(os.environ.get("ALERT_DIGEST_BATCH_SIZE", "100"))
+DELIVERY_RETRIES = 3
+PRODUCT_CHUNK = 500  # SQLite caps bound parameters per statement
+
+RECORD_LABELS = {
+    "patent": "patents",
+    "trial": "clinical trials",
+    "article": "articles",
+    "conference": "conference abstracts",
+}
+
+
+# =====================
+# Sinks
+# =====================
+
+class FileSink:
+    """Appends digests to a JSONL file: local stand-in for email delivery."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, messages: List[Dict]):
+        with open(self.path, "a", encoding="utf-8") as fh:
+            for message in messages:
+                fh.write(json.dumps(message) + "\n")
+
+
+class SMTPSink:
+    """Sends each batch over one SMTP connection."""
+    def __init__(self, host: str, port: int = 587, sender: str = "alerts@letscience.local",
+                 username: Optional[str] = None, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+
+    def send(self, messages: List[Dict]):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.username:
+                smtp.starttls()
+                smtp.login(self.username, self.password or "")
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                smtp.send_message(email)
+
+
+def default_sink():
+    """SMTP when ALERT_DIGEST_SINK=smtp, else the ALERT_DIGEST_FILE file; None when neither is configured."""
+    if os.environ.get("ALERT_DIGEST_SINK", "file").lower() == "smtp":
+        return SMTPSink(
+            os.environ.get("SMTP_HOST", "localhost"), int(os.environ.get("SMTP_PORT", "587")),
+            os.environ.get("SMTP_SENDER", "alerts@letscience.local"),
+            os.environ.get("SMTP_USERNAME"), os.environ.get("SMTP_PASSWORD")
+        )
+    path = os.environ.get("ALERT_DIGEST_FILE")
+    return FileSink(os.path.abspath(path)) if path else None
+
+def deliver(sink, messages: List[Dict], batch_size: int = DELIVERY_BATCH_SIZE,
+            retries: int = DELIVERY_RETRIES) -> Tuple[int, List[Dict]]:
+    """Sends messages in batches, retrying failed batches. Returns (sent, messages that failed)."""
+    sent, failed = 0, []
+    for i in range(0, len(messages), batch_size):
+        batch = messages[i:i + batch_size]
+        for attempt in range(retries + 1):
+            try:
+                sink.send(batch)
+                sent += len(batch)
+                break
+            except Exception as e:
+                print(f"Digest delivery failed (attempt {attempt + 1}): {e}")
+                if attempt == retries:
+                    failed += batch
+                else:
+                    time.sleep(retry_delay(attempt))
+    return sent, failed
+
+
+# =====================
+# Building
+# =====================
+
+def pending_counts(session: Session, frequency: str, after_id: int, upto_id: int,
+                   user_ids: Optional[List[int]] = None) -> Dict[int, Dict[int, Dict[str, int]]]:
+    """
+    user -> product -> record type -> new records in the window, for subscriptions
+    on `frequency` (of `user_ids` only, when given).
+    """
+    query = (
+        select(Notification.user_id, Notification.product_id, Notification.record_type, func.count(Notification.id))
+        .join(AlertSubscription, and_(
+            AlertSubscription.user_id == Notification.user_id,
+            AlertSubscription.product_id == Notification.product_id
+        ))
+        .where(AlertSubscription.digest_frequency == frequency)
+        .where(Notification.id > after_id, Notification.id <= upto_id)
+        .group_by(Notification.user_id, Notification.product_id, Notification.record_type)
+    )
+    if user_ids is not None:
+        query = query.where(Notification.user_id.in_(user_ids))
+    rows = session.exec(query).all()
+    counts = {}
+    for user_id, product_id, record_type, n in rows:
+        counts.setdefault(user_id, {}).setdefault(product_id, {})[record_type] = n
+    return counts
+
+def product_records(session: Session, product_ids: List[int], after_id: int, upto_id: int) -> Dict[int, Dict[str, Dict]]:
+    """product -> record type -> {"count", "titles"} for the records new in the window."""
+    records = {}
+    for i in range(0, len(product_ids), PRODUCT_CHUNK):
+        rows = session.exec(
+            select(Notification.product_id, Notification.record_type, Notification.record_id, Notification.title)
+            .where(Notification.product_id.in_(product_ids[i:i + PRODUCT_CHUNK]))
+            .where(Notification.id > after_id, Notification.id <= upto_id)
+            .distinct()
+            .order_by(Notification.record_id.desc())
+        ).all()
+        for product_id, record_type, _, title in rows:
+            entry = records.setdefault(product_id, {}).setdefault(record_type, {"count": 0, "titles": []})
+            entry["count"] += 1
+            if len(entry["titles"]) < ITEMS_PER_TYPE:
+                entry["titles"].append(title)
+    return records
+
+def render_section(name: str, records: Dict[str, Dict], record_types: Tuple[str, ...]) -> str:
+    lines = [name]
+    for record_type in record_types:
+        entry = records.get(record_type)
+        if not entry:
+            continue
+        lines.append(f"  {entry['count']} new {RECORD_LABELS.get(record_type, record_type)}")
+        lines += [f"    - {title}" for title in entry["titles"]]
+        if entry["count"] > len(entry["titles"]):
+            lines.append(f"    ... and {entry['count'] - len(entry['titles'])} more")
+    return "\n".join(lines)
+
+def build_digests(session: Session, frequency: str, after_id: int, upto_id: int,
+                  user_ids: Optional[List[int]] = None) -> List[Dict]:
+    """One message per user (of `user_ids`, when given) with new records in the window."""
+    counts = pending_counts(session, frequency, after_id, upto_id, user_ids)
+    if not counts:
+        return []
+
+    product_ids = sorted({pid for products in counts.values() for pid in products})
+    records = product_records(session, product_ids, after_id, upto_id)
+    names = {}
+    for i in range(0, len(product_ids), PRODUCT_CHUNK):
+        names.update(session.exec(
+            select(Product.id, Product.name).where(Product.id.in_(product_ids[i:i + PRODUCT_CHUNK]))
+        ).all())
+    user_ids = sorted(counts)
+    users = {}
+    for i in range(0, len(user_ids), PRODUCT_CHUNK):
+        users.update({u.id: u for u in session.exec(
+            select(User).where(User.id.in_(user_ids[i:i + PRODUCT_CHUNK]), User.is_active == True)
+        ).all()})
+
+    # Sections depend only on the product and the record types a subscriber wants
+    sections: Dict[Tuple[int, Tuple[str, ...]], str] = {}
+    messages = []
+    for user_id, products in counts.items():
+        user = users.get(user_id)
+        if not user:
+            continue
+        body = []
+        for product_id in sorted(products, key=lambda pid: names.get(pid, "")):
+            key = (product_id, tuple(sorted(products[product_id])))
+            if key not in sections:
+                sections[key] = render_section(names.get(product_id, f"Product {product_id}"), records.get(product_id, {}), key[1])
+            body.append(sections[key])
+        updates = sum(sum(types.values()) for types in products.values())
+        messages.append({
+            "user_id": user_id,
+            "after_id": after_id,
+            "to": user.email,
+            "subject": f"LetScience {frequency} digest: {updates} updates on {len(products)} products",
+            "body": "\n\n".join(body),
+        })
+    return messages
+
+
+# =====================
+# Running
+# =====================
+
+def retry_cursors(session: Session, frequency: str) -> Dict[int, AlertCursor]:
+    """user id -> cursor at the start of the window that user has not been sent yet."""
+    prefix = f"digest:{frequency}:"
+    cursors = session.exec(select(AlertCursor).where(AlertCursor.record_type.startswith(prefix))).all()
+    return {int(c.record_type[len(prefix):]): c for c in cursors}
+
+def build_window(session: Session, frequency: str, after_id: int, upto_id: int,
+                 retries: Dict[int, AlertCursor]) -> List[Dict]:
+    """The digests for the window, with the users owed an earlier window sent everything since its start."""
+    messages = [m for m in build_digests(session, frequency, after_id, upto_id) if m["user_id"] not in retries]
+    starts: Dict[int, List[int]] = {}
+    for user_id, cursor in retries.items():
+        starts.setdefault(cursor.last_id, []).append(user_id)
+    for start, user_ids in starts.items():
+        for i in range(0, len(user_ids), PRODUCT_CHUNK):
+            messages += build_digests(session, frequency, start, upto_id, user_ids[i:i + PRODUCT_CHUNK])
+    return messages
+
+def record_delivery(session: Session, frequency: str, retries: Dict[int, AlertCursor], failed: List[Dict], now: datetime):
+    """Drops the retry cursors of users who are caught up and opens one for each new failure. Does not commit."""
+    failed_at = {m["user_id"]: m["after_id"] for m in failed}
+    for user_id, cursor in retries.items():
+        if user_id not in failed_at:
+            session.delete(cursor)
+    for user_id, after_id in failed_at.items():
+        if user_id not in retries:
+            session.add(AlertCursor(record_type=f"digest:{frequency}:{user_id}", last_id=after_id, updated_at=now))
+
+def send_digest(engine, frequency: str, sink=None, now: Optional[datetime] = None) -> int:
+    """Sends the `frequency` digest if its period has elapsed. Returns the messages sent."""
+    now = now or datetime.utcnow()
+    sink = sink or default_sink()
+    if sink is None:
+        return 0
+    period = DIGEST_PERIODS[frequency]
+    with Session(engine) as session:
+        record_type = f"digest:{frequency}"
+        cursor = session.exec(select(AlertCursor).where(AlertCursor.record_type == record_type)).first()
+        upto_id = session.exec(select(func.max(Notification.id))).one() or 0
+        if cursor is None:
+            # First run: the first digest covers what arrives from now on
+            session.add(AlertCursor(record_type=record_type, last_id=upto_id, updated_at=now))
+            session.commit()
+            return 0
+        if now - cursor.updated_at < period:
+            return 0
+
+        # Claim this window: only one worker wins the conditional UPDATE
+        previous = cursor.updated_at
+        claimed = session.exec(
+            update(AlertCursor)
+            .where(AlertCursor.id == cursor.id, AlertCursor.updated_at == previous)
+            .values(updated_at=now)
+        ).rowcount
+        session.commit()
+        if not claimed:
+            return 0
+
+        retries = retry_cursors(session, frequency)
+        messages = build_window(session, frequency, cursor.last_id, upto_id, retries)
+        sent, failed = deliver(sink, messages)
+        if failed and not sent:
+            # Sink is down: release the window so the next tick retries it
+            session.exec(update(AlertCursor).where(AlertCursor.id == cursor.id).values(updated_at=previous))
+        else:
+            # Users whose batch failed keep a cursor of their own until they are sent
+            record_delivery(session, frequency, retries, failed, now)
+            session.exec(update(AlertCursor).where(AlertCursor.id == cursor.id).values(last_id=upto_id))
+        session.commit()
+
+    if messages:
+        print(f"📧 {frequency} digest: {sent} sent, {len(failed)} failed")
+    return sent
+
+def send_due_digests(engine, sink=None, now: Optional[datetime] = None) -> int:
+    """Sends every digest whose period has elapsed. Failures are logged, never raised to the scheduler."""
+    sent = 0
+    for frequency in DIGEST_PERIODS:
+        try:
+            sent += send_digest(engine, frequency, sink, now)
+        except Exception as e:
+            print(f"{frequency} digest failed: {e}")
+    return sent
@@ -1,34 +1,55 @@
 from sqlmodel import Session, select
 from backend.models import Product, ProductPharmacodynamics, ProductSideEffect
 from backend.main import engine
+from backend.ingestion import set_if_changed, track_run
+from data_ingestion import metrics
 
 def enrich_data():
+    changed = unchanged = 0
     with Session(engine) as session:
         # 1. Update Existing Products
         pembro = session.exec(select(Product).where(Product.name == "Pembrolizumab")).first()
         if pembro:
-            pembro.description = "A programmed death receptor-1 (PD-1)-blocking antibody (checkpoint inhibitor)."
-            pembro.target_indication = "Melanoma, NSCLC, TNBC"
+            # Only write fields that differ, so re-runs leave the row alone
+            updated = set_if_changed(
+                pembro,
+                description="A programmed death receptor-1 (PD-1)-blocking antibody (checkpoint inhibitor).",
+                target_indication="Melanoma, NSCLC, TNBC"
+            )
             # Add PD target if missing
             if not pembro.pharmacodynamics:
                 session.add(ProductPharmacodynamics(product_id=pembro.id, parameter="Ki", value="0.5 nM", target="PD-1"))
+                updated = True
             # Side effects
             if not pembro.side_effects:
                  session.add(ProductSideEffect(product_id=pembro.id, effect="Fatigue"))
                  session.add(ProductSideEffect(product_id=pembro.id, effect="Rash"))
-            session.add(pembro)
-            print("Updated Pembrolizumab")
+                 updated = True
+            if updated:
+                session.add(pembro)
+                changed += 1
+                print("Updated Pembrolizumab")
+            else:
+                unchanged += 1
 
         adal = session.exec(select(Product).where(Product.name == "Adalimumab")).first()
         if adal:
-            adal.description = "A tumor necrosis factor (TNF) blocker (antagonist) that reduces inflammation."
+            updated = set_if_changed(
+                adal, description="A tumor necrosis factor (TNF) blocker (antagonist) that reduces inflammation."
+            )
             if not adal.pharmacodynamics:
                 session.add(ProductPharmacodynamics(product_id=adal.id, parameter="Kd", value="10 pM", target="TNF-alpha"))
+                updated = True
             if not adal.side_effects:
                  session.add(ProductSideEffect(product_id=adal.id, effect="Injection Usage Reaction"))
                  session.add(ProductSideEffect(product_id=adal.id, effect="Fatigue")) # Overlapping
-            session.add(adal)
-            print("Updated Adalimumab")
+                 updated = True
+            if updated:
+                session.add(adal)
+                changed += 1
+                print("Updated Adalimumab")
+            else:
+                unchanged += 1
 
         # 2. Add New Products for Synergy Testing
         # Lenvatinib (VEGF inhibitor) -> Synergy with PD-1
@@ -46,7 +67,10 @@ def enrich_data():
             session.add(ProductPharmacodynamics(product_id=lenv.id, parameter="IC50", value="4 nM", target="VEGFR2"))
             session.add(ProductSideEffect(product_id=lenv.id, effect="Hypertension"))
             session.add(ProductSideEffect(product_id=lenv.id, effect="Fatigue")) # Overlapping
+            changed += 1
             print("Added Lenvatinib")
+        else:
+            unchanged += 1
             
         # Cisplatin (Chemo) -> Synergy with PD-1
         cis = session.exec(select(Product).where(Product.name == "Cisplatin")).first()
@@ -62,10 +86,16 @@ def enrich_data():
             session.refresh(cis)
             session.add(ProductSideEffect(product_id=cis.id, effect="Nausea"))
             session.add(ProductSideEffect(product_id=cis.id, effect="Fatigue")) # Overlapping
+            changed += 1
             print("Added Cisplatin")
+        else:
+            unchanged += 1
             
-        session.commit()
-        print("Data enrichment complete.")
+        if changed:
+            session.commit()
+        metrics.count("enrich", updated=changed, unchanged=unchanged)
+        print(f"Data enrichment complete: {changed} products changed, {unchanged} unchanged.")
 
 if __name__ == "__main__":
-    enrich_data()
+    with track_run(engine, "enrich"):
+        enrich_data()
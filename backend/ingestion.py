@@ -0,0 +1,445 @@
+"""
+Shared ingestion helpers: per-product/per-source watermarks, batched upserts
+on natural keys and the mapping from connector records to database rows.
+
+Used by the seed script, the catalogue refresh and the API refresh endpoint so
+that every path only asks the sources for what changed since the last run and
+writes it in a handful of statements.
+"""
+
+import os
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import tuple_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, SQLModel, select
+
+from .models import (
+    Product, Patent, ScientificArticle, ClinicalTrial, ProductSideEffect, IngestionWatermark,
+    CompoundProperty, Conference, IngestionRun
+)
+from .nlp_utils import parse_label_side_effects
+from data_ingestion.clinical_trials_connector import normalize_status, format_phases
+from data_ingestion import metrics
+from data_ingestion.metrics import RunMetrics
+
+# Watermarked sources
+SOURCE_PUBMED = "pubmed"
+SOURCE_CLINICAL_TRIALS = "clinical_trials"
+SOURCE_OPENFDA = "openfda"
+
+WATERMARKED_SOURCES = [SOURCE_PUBMED, SOURCE_CLINICAL_TRIALS, SOURCE_OPENFDA]
+
+# Natural keys (backed by unique indexes on the models) and the columns a
+# re-ingested record may change
+ARTICLE_KEY = ["product_id", "doi"]
+TRIAL_KEY = ["product_id", "nct_id"]
+PATENT_KEY = ["product_id", "source_id"]
+SYNONYM_KEY = ["product_id", "synonym"]
+CONFERENCE_KEY = ["product_id", "source_id"]
+
+ARTICLE_UPDATE = ["title", "abstract", "authors", "publication_date", "url", "pmid"]
+TRIAL_UPDATE = ["title", "status", "phase", "url"]
+PATENT_UPDATE = ["title", "abstract", "assignee", "status", "publication_date", "url", "expiry_date"]
+CONFERENCE_UPDATE = ["title", "abstract", "conference_name", "date", "url"]
+
+# Fields covered by `content_hash`, fixed per model so that every loader of a
+# model hashes the same columns (a loader's extra `update` columns are compared
+# directly instead)
+HASHED_FIELDS = {
+    ScientificArticle: ARTICLE_UPDATE,
+    ClinicalTrial: TRIAL_UPDATE,
+    Patent: PATENT_UPDATE,
+    Conference: CONFERENCE_UPDATE,
+}
+
+UPSERT_BATCH_SIZE = 500
+
+# How long cached PubChem properties are trusted before being re-fetched
+PUBCHEM_CACHE_TTL = timedelta(days=int(os.environ.get("PUBCHEM_CACHE_TTL_DAYS", "30")))
+
+
+# =====================
+# Bulk Upsert
+# =====================
+
+def content_hash(row: Dict, columns: List[str]) -> str:
+    """Stable hash of the ingested fields of a row."""
+    payload = json.dumps([row.get(c) for c in columns], default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def new_upsert_stats() -> Dict[str, int]:
+    return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+def dialect_insert(session: Session):
+    """The INSERT construct with ON CONFLICT support for the session's database."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert
+    if dialect == "postgresql":
+        return postgresql.insert
+    raise NotImplementedError(f"ON CONFLICT upserts are not supported on {dialect}")
+
+def bulk_upsert(
+    session: Session,
+    model: type[SQLModel],
+    rows: Iterable[Dict],
+    key: List[str],
+    update: Optional[List[str]] = None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    stats: Optional[Dict[str, int]] = None
+) -> int:
+    """
+    INSERT ... ON CONFLICT (key) in batches of `batch_size` rows.
+
+    Conflicting rows are left alone, or have the `update` columns overwritten
+    when given. `key` must match a unique index on the model. Returns the
+    number of rows inserted or updated. Does not commit.
+
+    On models with a `content_hash` column the hash of the model's
+    HASHED_FIELDS is stored, and conflicting rows whose hash and other
+    `update` columns are unchanged are not written.
+    Pass a `new_upsert_stats()` dict as `stats` to accumulate inserted /
+    updated / unchanged counts.
+    """
+    insert = dialect_insert(session)
+
+    # Flush pending ORM objects (e.g. a freshly added product) before raw inserts
+    session.flush()
+
+    written = 0
+    batch: Dict[tuple, Dict] = {}
+    for row in rows:
+        # Last occurrence wins: a statement may not touch the same key twice
+        batch[tuple(row[k] for k in key)] = row
+        if len(batch) >= batch_size:
+            written += _upsert_batch(session, model, insert, batch, key, update, stats)
+            batch = {}
+    if batch:
+        written += _upsert_batch(session, model, insert, batch, key, update, stats)
+    return written
+
+def bulk_insert(session: Session, model: type[SQLModel], rows: Iterable[Dict], batch_size: int = UPSERT_BATCH_SIZE) -> int:
+    """
+    Plain batched INSERT (executemany) for rows without a natural key, e.g.
+    side effects of a product created in the same run. Does not commit.
+    """
+    session.flush()
+    stmt = model.__table__.insert()
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            session.execute(stmt, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        session.execute(stmt, batch)
+        written += len(batch)
+    return written
+
+def _upsert_batch(session, model, insert, batch, key, update, stats) -> int:
+    table = model.__table__
+    hashed = "content_hash" in table.c
+    rows = list(batch.values())
+    # Multi-row VALUES needs the same columns in every row
+    columns = sorted({c for row in rows for c in row})
+    compared = []  # Columns whose change alone triggers an update
+    if hashed:
+        hash_columns = HASHED_FIELDS.get(model) or sorted(set(columns) - set(key) - {"content_hash"})
+        rows = [dict(row, content_hash=content_hash(row, hash_columns)) for row in rows]
+        columns = sorted(set(columns) | {"content_hash"})
+        compared = ["content_hash"] + [c for c in update or [] if c in columns and c not in hash_columns]
+
+    if stats is not None:
+        # One lookup per batch tells new rows from changed and unchanged ones
+        key_columns = [table.c[k] for k in key]
+        found = session.execute(
+            select(*key_columns, *[table.c[c] for c in compared]).where(tuple_(*key_columns).in_(list(batch)))
+        ).all()
+        existing = {tuple(r[:len(key)]): tuple(r[len(key):]) for r in found}
+        for k, row in zip(batch, rows):
+            if k not in existing:
+                stats["inserted"] += 1
+            elif update and (not hashed or existing[k] != tuple(row.get(c) for c in compared)):
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+
+    values = [{c: row.get(c) for c in columns} for row in rows]
+
+    stmt = insert(table).values(values)
+    if update:
+        set_ = {c: stmt.excluded[c] for c in update if c in columns}
+        where = None
+        if hashed:
+            set_["content_hash"] = stmt.excluded.content_hash
+            # Identical re-ingested rows are skipped entirely
+            where = or_(*[table.c[c].is_distinct_from(stmt.excluded[c]) for c in compared])
+        stmt = stmt.on_conflict_do_update(index_elements=key, set_=set_, where=where)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=key)
+    return session.exec(stmt).rowcount
+
+
+def set_if_changed(obj: SQLModel, **values) -> bool:
+    """Assigns only the fields whose value differs. Returns True if anything changed."""
+    changed = False
+    for field, value in values.items():
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed = True
+    return changed
+
+
+# =====================
+# Watermarks
+# =====================
+
+def get_watermark(session: Session, product_id: int, source: str) -> Optional[datetime]:
+    """Returns the newest source timestamp already ingested for this product/source."""
+    mark = session.exec(select(IngestionWatermark).where(
+        IngestionWatermark.product_id == product_id,
+        IngestionWatermark.source == source
+    )).first()
+    return mark.watermark if mark else None
+
+def last_checked(session: Session, product_id: int, source: str) -> Optional[datetime]:
+    """When this product/source was last refreshed, whether or not anything new arrived."""
+    mark = session.exec(select(IngestionWatermark).where(
+        IngestionWatermark.product_id == product_id,
+        IngestionWatermark.source == source
+    )).first()
+    return mark.updated_at if mark else None
+
+def advance_watermark(session: Session, product_id: int, source: str, seen: List[Optional[datetime]]) -> Optional[datetime]:
+    """
+    Moves the watermark forward to the newest timestamp in `seen`.
+    Never moves it backwards; the row is touched even when nothing new arrived
+    so `updated_at` records when the source was last checked.
+    """
+    mark = session.exec(select(IngestionWatermark).where(
+        IngestionWatermark.product_id == product_id,
+        IngestionWatermark.source == source
+    )).first()
+    if not mark:
+        mark = IngestionWatermark(product_id=product_id, source=source)
+
+    newest = max([d for d in seen if d], default=None)
+    if newest and (mark.watermark is None or newest > mark.watermark):
+        mark.watermark = newest
+    mark.updated_at = datetime.utcnow()
+    session.add(mark)
+    return mark.watermark
+
+
+# =====================
+# Run Metrics
+# =====================
+
+@contextmanager
+def track_run(engine, name: str):
+    """
+    Collects RunMetrics for the enclosed ingestion run (see data_ingestion.metrics)
+    and stores them as an IngestionRun row: created when the run starts, completed
+    with status, duration and metrics when it ends, including on failure.
+    """
+    IngestionRun.__table__.create(engine, checkfirst=True)
+    with Session(engine) as session:
+        run = IngestionRun(name=name)
+        session.add(run)
+        session.commit()
+        run_id = run.id
+
+    collector = RunMetrics(name)
+    started = time.perf_counter()
+    status, error = "error", "interrupted"
+    try:
+        with metrics.collecting(collector):
+            yield collector
+        status, error = "ok", None
+    except Exception as e:
+        error = str(e)[:500]
+        raise
+    finally:
+        summary = collector.summary()
+        try:
+            with Session(engine) as session:
+                run = session.get(IngestionRun, run_id)
+                run.finished_at = datetime.utcnow()
+                run.duration_ms = int((time.perf_counter() - started) * 1000)
+                run.status = status
+                run.error = error
+                run.records_written = summary["records_written"]
+                run.metrics = json.dumps(summary)
+                session.add(run)
+                session.commit()
+        except Exception as e:
+            print(f"Error saving ingestion run metrics: {e}")
+
+
+# =====================
+# PubChem Property Cache
+# =====================
+
+def lookup_compound_properties(session: Session, names: List[str], connector, ttl: timedelta = PUBCHEM_CACHE_TTL) -> Dict[str, Optional[Dict]]:
+    """
+    Returns {name: PubChem properties or None} for many drug names at once.
+
+    Fresh entries are answered from the CompoundProperty table. Stale entries
+    with a known CID are re-fetched in CID batches; only names never seen
+    before (or previously unknown to PubChem) need a name lookup. Does not commit.
+    """
+    wanted = {name.lower(): name for name in names}
+    keys = list(wanted)
+    cached = {}
+    for i in range(0, len(keys), UPSERT_BATCH_SIZE):
+        chunk = keys[i:i + UPSERT_BATCH_SIZE]
+        for row in session.exec(select(CompoundProperty).where(CompoundProperty.name.in_(chunk))).all():
+            cached[row.name] = row
+
+    cutoff = datetime.utcnow() - ttl
+    results = {}
+    stale = {}  # cid -> cache keys
+    unknown = []
+    for key, name in wanted.items():
+        row = cached.get(key)
+        if row and row.fetched_at >= cutoff:
+            results[name] = json.loads(row.properties) if row.properties else None
+        elif row and row.cid:
+            stale.setdefault(row.cid, []).append(key)
+        else:
+            unknown.append(key)
+
+    fetched = {}  # cache key -> (cid, properties)
+    if stale:
+        props = connector.get_properties_by_cids(list(stale))
+        for cid, cache_keys in stale.items():
+            for key in cache_keys:
+                fetched[key] = (cid, props.get(cid))
+    if unknown:
+        cids = connector.resolve_cids(unknown)
+        props = connector.get_properties_by_cids(sorted({c for c in cids.values() if c}))
+        for key in unknown:
+            cid = cids.get(key)
+            fetched[key] = (cid, props.get(cid) if cid else None)
+
+    now = datetime.utcnow()
+    bulk_upsert(session, CompoundProperty, [
+        {"name": key, "cid": cid, "properties": json.dumps(p) if p else None, "fetched_at": now}
+        for key, (cid, p) in fetched.items()
+    ], ["name"], ["cid", "properties", "fetched_at"])
+    for key, (cid, p) in fetched.items():
+        results[wanted[key]] = p
+    return results
+
+
+# =====================
+# Record -> Row Mapping
+# =====================
+
+def trial_row(product_id: int, t) -> Dict:
+    return dict(
+        product_id=product_id,
+        nct_id=t.source_id,
+        title=t.title,
+        status=normalize_status(t.metadata.get("status")),
+        phase=format_phases(t.metadata.get("phase")),
+        start_date=datetime.now(), # Placeholder as API v2 might not give simple start date in list
+        url=t.url
+    )
+
+def article_row(product_id: int, a) -> Dict:
+    return dict(
+        product_id=product_id,
+        doi=a.source_id,
+        pmid=a.metadata.get("pmid"),
+        title=a.title,
+        abstract=a.abstract,
+        authors=", ".join(a.authors),
+        publication_date=a.publication_date,
+        url=a.url
+    )
+
+def patent_row(product_id: int, p) -> Dict:
+    expiry = p.metadata.get("expiry_date")
+    return dict(
+        product_id=product_id,
+        source_id=p.source_id,
+        title=p.title,
+        abstract=p.abstract,
+        assignee=p.metadata.get("assignee"),
+        status=p.metadata.get("status"),
+        publication_date=p.publication_date,
+        url=p.url,
+        patent_type=p.metadata.get("patent_type", "Product"),
+        expiry_date=datetime.fromisoformat(expiry) if isinstance(expiry, str) else expiry
+    )
+
+def conference_row(product_id: int, c) -> Dict:
+    return dict(
+        product_id=product_id,
+        source_id=c.source_id,
+        title=c.title,
+        abstract=c.abstract,
+        conference_name=c.metadata.get("conference_name") or "Unknown Meeting",
+        date=c.publication_date,
+        url=c.url
+    )
+
+
+# =====================
+# Incremental Refresh
+# =====================
+
+def refresh_product_source(session: Session, product: Product, source: str, connector) -> Dict:
+    """
+    Fetches only the records changed since this product's watermark for `source`,
+    upserts them and advances the watermark. Does not commit.
+    """
+    since = get_watermark(session, product.id, source)
+    with metrics.stage(f"fetch.{source}"):
+        records = connector.search(product.name, since=since)
+    stats = new_upsert_stats()
+    written = 0
+
+    if source == SOURCE_PUBMED:
+        written = bulk_upsert(session, ScientificArticle, [article_row(product.id, a) for a in records], ARTICLE_KEY, stats=stats)
+
+    elif source == SOURCE_CLINICAL_TRIALS:
+        # Updated studies get their mutable fields refreshed
+        written = bulk_upsert(session, ClinicalTrial, [trial_row(product.id, t) for t in records], TRIAL_KEY, TRIAL_UPDATE, stats=stats)
+
+    elif source == SOURCE_OPENFDA:
+        if records:
+            # A newer label revision replaces description and side effects
+            label = records[0]
+            raw_se = label.metadata.get("side_effects")
+            side_effects = parse_label_side_effects(raw_se) if raw_se else None
+            current = [se.effect for se in product.side_effects]
+            if label.abstract == product.description and side_effects in (None, current):
+                stats["unchanged"] += 1
+            else:
+                product.description = label.abstract
+                session.add(product)
+                if side_effects is not None and side_effects != current:
+                    for se in product.side_effects:
+                        session.delete(se)
+                    for se in side_effects:
+                        session.add(ProductSideEffect(product_id=product.id, effect=se))
+                        written += 1
+                stats["updated"] += 1
+
+    else:
+        raise ValueError(f"Unknown source: {source}")
+
+    watermark = advance_watermark(session, product.id, source, [r.updated_at for r in records])
+    metrics.count(source, fetched=len(records), **stats)
+    return {"source": source, "since": since, "fetched": len(records), "written": written,
+            "unchanged": stats["unchanged"], "watermark": watermark}
@@ -0,0 +1,170 @@
+"""
+Offline loader for the full ClinicalTrials.gov universe, from either
+- the AACT pipe-delimited flat-file export (https://aact.ctti-clinicaltrials.org/download),
+  as the downloaded zip or its extracted directory, or
+- the ClinicalTrials.gov bulk JSON export (one NCTxxxxxxxx.json per study, zipped).
+
+Interventions are matched to catalogue products through the product names
+and ProductSynonym rows, and matching studies are upserted as ClinicalTrial
+rows with sponsor, start and completion dates. Every file is streamed once;
+memory is bounded by the number of matched studies, not the ~500k in the dump.
+
+Usage:
+    python backend/load_aact_trials.py downloads/aact_flatfiles.zip
+    python backend/load_aact_trials.py downloads/ctg-studies.json.zip
+"""
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel
+from backend.main import engine
+from backend.models import ClinicalTrial
+from backend.ingestion import TRIAL_KEY, TRIAL_UPDATE, bulk_upsert, new_upsert_stats
+from backend.matching import load_matcher
+from backend.alerts import dispatch_alerts
+from data_ingestion.bulk_files import open_member, iter_delimited, iter_json_documents
+from data_ingestion.clinical_trials_connector import parse_date, normalize_status, normalize_phase, format_phases
+
+# Bulk rows also carry the fields the v2 search API does not give us. The
+# content hash covers TRIAL_UPDATE only, like the API refresh, so the two paths
+# do not rewrite each other's rows; the extra columns are compared directly.
+AACT_UPDATE = TRIAL_UPDATE + ["sponsor", "start_date", "completion_date"]
+COMMIT_EVERY = 5000  # rows per transaction
+
+PROGRESS_EVERY = 100000
+
+
+def _progress(label, n, started):
+    if n % PROGRESS_EVERY == 0:
+        print(f"  > {label}: {n} rows ({n / (time.perf_counter() - started):.0f} rows/s)")
+
+
+# =====================
+# AACT flat files
+# =====================
+
+def match_aact_interventions(source, matcher) -> dict:
+    """nct_id -> product ids, from interventions.txt and intervention_other_names.txt."""
+    matched = {}
+    started = time.perf_counter()
+    n = 0
+    for name in ["interventions.txt", "intervention_other_names.txt"]:
+        for row in iter_delimited(source, name):
+            n += 1
+            _progress(name, n, started)
+            ids = matcher.match(row.get("name") or "")
+            if ids:
+                matched.setdefault(row["nct_id"], set()).update(ids)
+    return matched
+
+def lead_sponsors(source, wanted) -> dict:
+    sponsors = {}
+    for row in iter_delimited(source, "sponsors.txt"):
+        if row["nct_id"] in wanted and row.get("lead_or_collaborator") == "lead":
+            sponsors[row["nct_id"]] = row.get("name")
+    return sponsors
+
+def iter_aact_rows(source, matched, sponsors):
+    started = time.perf_counter()
+    for n, row in enumerate(iter_delimited(source, "studies.txt"), 1):
+        _progress("studies.txt", n, started)
+        product_ids = matched.get(row["nct_id"])
+        if not product_ids:
+            continue
+        for product_id in product_ids:
+            yield dict(
+                product_id=product_id,
+                nct_id=row["nct_id"],
+                title=row.get("official_title") or row.get("brief_title") or "No Title",
+                status=normalize_status(row.get("overall_status")),
+                phase=normalize_phase(row.get("phase")),
+                start_date=parse_date(row.get("start_date")),
+                completion_date=parse_date(row.get("completion_date")),
+                sponsor=sponsors.get(row["nct_id"]),
+                url=f"https://clinicaltrials.gov/study/{row['nct_id']}"
+            )
+
+
+# =====================
+# ClinicalTrials.gov JSON
+# =====================
+
+def iter_ctgov_rows(source, matcher):
+    started = time.perf_counter()
+    for n, study in enumerate(iter_json_documents(source), 1):
+        _progress("studies", n, started)
+        protocol = study.get("protocolSection", {})
+        product_ids = set()
+        for intervention in protocol.get("armsInterventionsModule", {}).get("interventions", []):
+            for name in [intervention.get("name", "")] + intervention.get("otherNames", []):
+                product_ids |= matcher.match(name)
+        if not product_ids:
+            continue
+
+        id_module = protocol.get("identificationModule", {})
+        status_module = protocol.get("statusModule", {})
+        nct_id = id_module.get("nctId")
+        phases = protocol.get("designModule", {}).get("phases")
+        for product_id in product_ids:
+            yield dict(
+                product_id=product_id,
+                nct_id=nct_id,
+                title=id_module.get("officialTitle") or id_module.get("briefTitle", "No Title"),
+                status=normalize_status(status_module.get("overallStatus")),
+                phase=format_phases(phases),
+                start_date=parse_date(status_module.get("startDateStruct", {}).get("date")),
+                completion_date=parse_date(status_module.get("completionDateStruct", {}).get("date")),
+                sponsor=protocol.get("sponsorCollaboratorsModule", {}).get("leadSponsor", {}).get("name"),
+                url=f"https://clinicaltrials.gov/study/{nct_id}"
+            )
+
+
+def is_aact_dump(source) -> bool:
+    with open_member(source, "studies.txt") as fh:
+        return fh is not None
+
+def write_rows(session, rows, stats) -> int:
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= COMMIT_EVERY:
+            written += bulk_upsert(session, ClinicalTrial, chunk, TRIAL_KEY, AACT_UPDATE, stats=stats)
+            session.commit()
+            chunk = []
+    if chunk:
+        written += bulk_upsert(session, ClinicalTrial, chunk, TRIAL_KEY, AACT_UPDATE, stats=stats)
+        session.commit()
+    return written
+
+def load_trials(source) -> dict:
+    SQLModel.metadata.create_all(engine)
+    started = time.perf_counter()
+    stats = new_upsert_stats()
+    with Session(engine) as session:
+        matcher = load_matcher(session)
+        print(f"🔎 Matching against {len(matcher)} product names and synonyms...")
+
+        if is_aact_dump(source):
+            matched = match_aact_interventions(source, matcher)
+            print(f"  > {len(matched)} studies mention a catalogue product")
+            rows = iter_aact_rows(source, matched, lead_sponsors(source, matched))
+        else:
+            rows = iter_ctgov_rows(source, matcher)
+        write_rows(session, rows, stats)
+
+    dispatch_alerts(engine)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Trials loaded in {elapsed:.1f}s: {stats['inserted']} inserted, "
+          f"{stats['updated']} updated, {stats['unchanged']} unchanged")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load ClinicalTrials.gov studies from an AACT or CT.gov JSON dump.")
+    parser.add_argument("source", help="AACT flat-file zip/directory, or CT.gov JSON zip/directory")
+    args = parser.parse_args()
+    load_trials(args.source)
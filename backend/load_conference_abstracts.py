@@ -0,0 +1,52 @@
+"""
+Offline loader for conference abstract exports (ASCO, ESMO, AACR...) in
+CSV/TSV, JSON/JSONL or XML form, as downloaded from the meeting sites.
+
+Each export is streamed in a worker process. Abstracts whose title or body
+mention a catalogue product (names and ProductSynonym rows) are upserted as
+Conference rows keyed on (product, meeting + abstract number), so reloading
+an export, or a corrected re-release of it, does not duplicate abstracts.
+
+Usage:
+    python backend/load_conference_abstracts.py downloads/asco_2025.csv downloads/esmo/ [--conference "ESMO Congress 2024"] [--workers 4]
+"""
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel
+from backend.main import engine
+from backend.models import Conference
+from backend.ingestion import CONFERENCE_KEY, CONFERENCE_UPDATE, conference_row
+from backend.matching import worker_matcher
+from backend.bulk_load import load_matched_files
+from data_ingestion.conference_connector import find_dump_files, iter_abstracts
+
+
+def map_abstract_file(path, conference=None, matcher=None):
+    """
+    Worker: streams one export and returns the Conference rows of abstracts mentioning a catalogue product.
+    """
+    matcher = matcher or worker_matcher()
+    abstracts = 0
+    rows = []
+    for abstract in iter_abstracts(path, conference):
+        abstracts += 1
+        product_ids = matcher.find(f"{abstract.title} {abstract.abstract or ''}")
+        rows.extend(conference_row(product_id, abstract) for product_id in sorted(product_ids))
+    return path, abstracts, rows
+
+def load_conference_abstracts(paths, conference=None, workers=None) -> dict:
+    SQLModel.metadata.create_all(engine)
+    return load_matched_files(engine, find_dump_files(paths), map_abstract_file, Conference, CONFERENCE_KEY,
+                              CONFERENCE_UPDATE, "conference abstract exports", "abstracts", workers, (conference,))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load conference abstract exports (CSV/JSON/XML) from local disk.")
+    parser.add_argument("paths", nargs="+", help="Export files or directories containing them")
+    parser.add_argument("--conference", default=None, help="Meeting name for exports that do not carry one (default: file name)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+    load_conference_abstracts(args.paths, args.conference, args.workers)
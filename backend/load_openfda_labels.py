@@ -0,0 +1,146 @@
+"""
+Offline loader for the OpenFDA drug-label bulk download
+(https://open.fda.gov/apis/drug/label/download/).
+
+Streams every `drug-label-*.json.zip` partition from local disk, maps labels to
+Product, ProductIndication and ProductSideEffect rows and bulk-inserts them.
+Partitions are parsed in parallel, one per worker process.
+
+Usage:
+    python backend/load_openfda_labels.py downloads/openfda/ [--workers 4]
+"""
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, select
+from backend.main import engine
+from backend.models import Product, ProductIndication, ProductSideEffect, ProductSynonym
+from backend.ingestion import SYNONYM_KEY, bulk_insert, bulk_upsert
+from backend.matching import synonym_rows
+from backend.seed_data import transform_label
+from data_ingestion.bulk_files import expand_paths, iter_zip_json_arrays
+from data_ingestion.openfda_connector import parse_label
+
+LABEL_FILE_PATTERN = "drug-label-*.json*"
+
+def map_label_file(path):
+    """
+    Worker: streams one partition and returns one compact row per branded label.
+    """
+    rows = []
+    for res in iter_zip_json_arrays(path, "results"):
+        if not res.get("openfda", {}).get("brand_name"):
+            continue # Unbranded/bulk ingredient labels have no product to attach to
+        record = parse_label(res)
+        name = record.metadata["brand_name"].title()
+        description, category, disease, side_effects = transform_label(
+            name, None, record.abstract, record.metadata["indications"], record.metadata["side_effects"]
+        )
+        rows.append({
+            "name": name,
+            "description": description,
+            "target_indication": category,
+            "disease": disease,
+            "side_effects": side_effects,
+            "url": record.url,
+            "generic_name": record.metadata["generic_name"],
+            "effective_time": record.updated_at
+        })
+    return path, rows
+
+def merge_latest(labels, rows):
+    """Keeps the most recent label revision per brand (repackagers publish many copies)."""
+    for row in rows:
+        key = row["name"].lower()
+        current = labels.get(key)
+        if current is None:
+            labels[key] = row
+        elif row["effective_time"] and (
+            current["effective_time"] is None or row["effective_time"] > current["effective_time"]
+        ):
+            labels[key] = row
+
+def write_labels(labels) -> dict:
+    """Bulk-inserts products that are not in the catalogue yet, with their indication and side effects."""
+    with Session(engine) as session:
+        existing = {name.lower() for name in session.exec(select(Product.name)).all()}
+        new = [row for key, row in labels.items() if key not in existing]
+
+        bulk_insert(session, Product, [{
+            "name": row["name"],
+            "description": row["description"],
+            "target_indication": row["target_indication"],
+            "development_phase": "Approved"
+        } for row in new])
+
+        # Resolve the new IDs in chunks (SQLite caps bound parameters per statement)
+        names = [row["name"] for row in new]
+        ids = {}
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            ids.update({name: pid for pid, name in session.exec(
+                select(Product.id, Product.name).where(Product.name.in_(chunk))
+            ).all()})
+
+        indications = bulk_insert(session, ProductIndication, [{
+            "product_id": ids[row["name"]],
+            "disease_name": row["disease"],
+            "approval_status": "Approved",
+            "reference_url": row["url"],
+            "reference_title": "FDA Label"
+        } for row in new])
+        side_effects = bulk_insert(session, ProductSideEffect, [
+            {"product_id": ids[row["name"]], "effect": se}
+            for row in new for se in row["side_effects"]
+        ])
+        bulk_upsert(session, ProductSynonym, [
+            syn for row in new for syn in synonym_rows(ids[row["name"]], [row["name"], row["generic_name"]], "label")
+        ], SYNONYM_KEY)
+        session.commit()
+
+    return {
+        "products": len(new),
+        "skipped_existing": len(labels) - len(new),
+        "indications": indications,
+        "side_effects": side_effects
+    }
+
+def load_openfda_labels(paths, workers=None):
+    SQLModel.metadata.create_all(engine)
+    files = expand_paths(paths, LABEL_FILE_PATTERN)
+    if not files:
+        print("No OpenFDA label partitions found.")
+        return
+
+    print(f"📦 Parsing {len(files)} OpenFDA label partitions...")
+    started = time.perf_counter()
+    labels = {}
+    parsed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(map_label_file, f) for f in files]
+        for future in as_completed(futures):
+            path, rows = future.result()
+            parsed += len(rows)
+            merge_latest(labels, rows)
+            elapsed = time.perf_counter() - started
+            print(f"  > {os.path.basename(path)}: {len(rows)} labels ({parsed / elapsed:.0f} labels/s)")
+
+    print(f"💾 Writing {len(labels)} unique brands...")
+    stats = write_labels(labels)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Loaded {stats['products']} products, {stats['indications']} indications, "
+          f"{stats['side_effects']} side effects from {parsed} labels in {elapsed:.1f}s "
+          f"({stats['skipped_existing']} brands already in catalogue)")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the OpenFDA drug-label bulk download from local disk.")
+    parser.add_argument("paths", nargs="+", help="Partition files or directories containing them")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+    load_openfda_labels(args.paths, args.workers)
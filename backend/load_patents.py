@@ -0,0 +1,93 @@
+"""
+Offline loader for patent full-text bulk XML: the USPTO weekly grant and
+application files (https://bulkdata.uspto.gov/, `ipgYYMMDD.zip` / `ipaYYMMDD.zip`)
+and EPO publication server documents.
+
+Each file is streamed in a worker process, one document at a time. Patents are
+linked to catalogue products by matching the title, abstract and claims against
+the product names and ProductSynonym rows; only matched patents leave the
+worker, so memory is bounded by the matches rather than the ~7k documents per
+weekly file.
+
+Usage:
+    python backend/load_patents.py downloads/uspto/ [--workers 4]
+"""
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel
+from backend.main import engine
+from backend.models import Patent
+from backend.ingestion import PATENT_KEY, PATENT_UPDATE
+from backend.matching import worker_matcher
+from backend.bulk_load import load_matched_files
+from backend.nlp_utils import extract_claim_diseases, classify_claim
+from data_ingestion.bulk_files import expand_paths
+from data_ingestion.patent_xml import iter_xml_documents, parse_patent_document
+
+# Full-text rows also carry the fields the curated/search data does not give us
+FULLTEXT_UPDATE = PATENT_UPDATE + [
+    "claims", "claim_summary", "diseases_in_claims", "patent_type", "filing_date", "priority_date"
+]
+CLAIM_SUMMARY_LENGTH = 500
+
+
+def patent_rows(patent, product_ids):
+    """Patent rows (one per matched product) for a parsed document."""
+    claims = "\n\n".join(patent["claims"])
+    first_claim = patent["claims"][0] if patent["claims"] else ""
+    return [{
+        "product_id": product_id,
+        "source_id": patent["source_id"],
+        "title": patent["title"],
+        "abstract": patent["abstract"],
+        "assignee": patent["assignee"],
+        "status": patent["status"],
+        "publication_date": patent["publication_date"],
+        "url": f"https://patents.google.com/patent/{patent['source_id']}{patent['kind'] or ''}",
+        "expiry_date": patent["expiry_date"],
+        "filing_date": patent["filing_date"],
+        "priority_date": patent["priority_date"],
+        "claims": claims or None,
+        "claim_summary": first_claim[:CLAIM_SUMMARY_LENGTH] or None,
+        "diseases_in_claims": ", ".join(extract_claim_diseases(claims)) or None,
+        "patent_type": classify_claim(first_claim) if first_claim else None,
+    } for product_id in sorted(product_ids)]
+
+def map_patent_file(path, matcher=None):
+    """
+    Worker: streams one bulk file and returns the rows of patents mentioning a catalogue product.
+    """
+    matcher = matcher or worker_matcher()
+    documents = 0
+    rows = []
+    for doc in iter_xml_documents(path):
+        try:
+            patent = parse_patent_document(doc)
+        except Exception as e:
+            print(f"Skipping unparseable document in {os.path.basename(path)}: {e}")
+            continue
+        if patent is None:
+            continue
+        documents += 1
+        text = " ".join([patent["title"], patent["abstract"] or ""] + patent["claims"])
+        product_ids = matcher.find(text)
+        if product_ids:
+            rows.extend(patent_rows(patent, product_ids))
+    return path, documents, rows
+
+def load_patents(paths, workers=None) -> dict:
+    SQLModel.metadata.create_all(engine)
+    files = [f for f in expand_paths(paths, "*") if f.lower().endswith((".zip", ".xml"))]
+    return load_matched_files(engine, files, map_patent_file, Patent, PATENT_KEY, FULLTEXT_UPDATE,
+                              "patent bulk files", "patents", workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load USPTO/EPO patent full-text bulk XML from local disk.")
+    parser.add_argument("paths", nargs="+", help="Bulk files (.zip/.xml) or directories containing them")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+    load_patents(args.paths, args.workers)
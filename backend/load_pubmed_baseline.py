@@ -0,0 +1,121 @@
+"""
+Offline loader for the PubMed baseline and daily update files
+(https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/, .../updatefiles/),
+e.g. `pubmed24n0001.xml.gz`.
+
+Each gzipped file is streamed with iterparse in a worker process, one
+<PubmedArticle> at a time. Articles whose title, abstract, chemical list or
+keywords mention a catalogue product (names and ProductSynonym rows) are
+upserted as ScientificArticle rows; <DeleteCitation> entries in update files
+remove the retracted PMIDs. Files are applied in name order, so a baseline
+followed by its update files ends up in the same state as PubMed.
+
+Usage:
+    python backend/load_pubmed_baseline.py downloads/pubmed/baseline/ downloads/pubmed/updatefiles/ [--workers 4]
+"""
+import sys
+import os
+import gzip
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, delete
+from backend.main import engine
+from backend.models import ScientificArticle
+from backend.ingestion import ARTICLE_KEY, ARTICLE_UPDATE, article_row, bulk_upsert, new_upsert_stats
+from backend.matching import load_matcher, init_worker, worker_matcher
+from backend.alerts import dispatch_alerts
+from data_ingestion.bulk_files import expand_paths
+from data_ingestion.pubmed_connector import parse_article
+
+BASELINE_FILE_PATTERN = "*.xml*"
+DELETE_BATCH_SIZE = 500  # SQLite caps bound parameters per statement
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def article_text(article) -> str:
+    """The parts of a citation searched for product mentions."""
+    parts = ["".join(node.itertext()) for node in article.findall(".//ArticleTitle") + article.findall(".//AbstractText")]
+    parts += [node.text or "" for node in article.findall(".//ChemicalList/Chemical/NameOfSubstance")]
+    parts += [node.text or "" for node in article.findall(".//KeywordList/Keyword")]
+    return " ".join(parts)
+
+def map_baseline_file(path, matcher=None):
+    """
+    Worker: streams one baseline/update file. Returns the number of citations
+    read, the article rows mentioning a catalogue product and the deleted PMIDs.
+    """
+    matcher = matcher or worker_matcher()
+    citations = 0
+    rows = []
+    deleted = []
+    with _open(path) as fh:
+        context = ET.iterparse(fh, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "PubmedArticle":
+                citations += 1
+                product_ids = matcher.find(article_text(elem))
+                if product_ids:
+                    record = parse_article(elem)
+                    rows.extend(article_row(product_id, record) for product_id in sorted(product_ids))
+                root.clear()  # Drop the parsed citations, the file holds ~30k of them
+            elif elem.tag == "DeleteCitation":
+                deleted.extend(pmid.text for pmid in elem.findall("PMID"))
+                root.clear()
+    return path, citations, rows, deleted
+
+def delete_citations(session, pmids) -> int:
+    removed = 0
+    for i in range(0, len(pmids), DELETE_BATCH_SIZE):
+        removed += session.exec(
+            delete(ScientificArticle).where(ScientificArticle.pmid.in_(pmids[i:i + DELETE_BATCH_SIZE]))
+        ).rowcount
+    return removed
+
+def load_pubmed_baseline(paths, workers=None) -> dict:
+    SQLModel.metadata.create_all(engine)
+    files = [f for f in expand_paths(paths, BASELINE_FILE_PATTERN) if not f.endswith(".md5")]
+    stats = new_upsert_stats()
+    stats["deleted"] = 0
+    if not files:
+        print("No PubMed baseline files found.")
+        return stats
+
+    started = time.perf_counter()
+    citations = 0
+    with Session(engine) as session:
+        matcher = load_matcher(session)
+        print(f"📦 Parsing {len(files)} PubMed files against {len(matcher)} product names and synonyms...")
+
+        # map() keeps file order: update files must apply after the baseline
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(matcher,)) as pool:
+            for path, parsed, rows, deleted in pool.map(map_baseline_file, files):
+                citations += parsed
+                bulk_upsert(session, ScientificArticle, rows, ARTICLE_KEY, ARTICLE_UPDATE, stats=stats)
+                stats["deleted"] += delete_citations(session, deleted)
+                session.commit()
+                elapsed = time.perf_counter() - started
+                print(f"  > {os.path.basename(path)}: {parsed} citations, {len(rows)} product links, "
+                      f"{len(deleted)} deletions ({citations / elapsed:.0f} citations/s)")
+
+    dispatch_alerts(engine)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Parsed {citations} citations in {elapsed:.1f}s: {stats['inserted']} inserted, "
+          f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['deleted']} deleted")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load PubMed baseline/update XML files from local disk.")
+    parser.add_argument("paths", nargs="+", help="Baseline/update files (.xml.gz) or directories containing them")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+    load_pubmed_baseline(args.paths, args.workers)
@@ -10,11 +10,11 @@ from .models import (
     Product, Patent, ScientificArticle, ClinicalTrial, Conference, User, AlertSubscription,
     ProductPharmacokinetics, ProductPharmacodynamics, ProductExperimentalModel, ProductSynthesisScheme,
     ProductMilestone, ProductIndication, ProductRead,
-    RegulatoryDocument, ClinicalBudget
+    RegulatoryDocument, ClinicalBudget, BudgetRollup
 )
 from .auth import (
-    hash_password, verify_password, 
-    create_token, verify_token,
+    hash_password_async, verify_password_async, needs_rehash,
+    create_token, verify_token, token_cache,
     generate_totp_secret, verify_totp, get_totp_uri
 )
 from contextlib import asynccontextmanager
@@ -32,6 +32,10 @@ engine = create_engine(sqlite_url, connect_args=connect_args)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    from .budget_rollup import ensure_rollups
+    with Session(engine) as session:
+        if ensure_rollups(session):
+            print("Budget rollup rebuilt from the budget lines (out of sync)")
 
 def get_session():
     with Session(engine) as session:
@@ -40,7 +44,15 @@ def get_session():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    # Catalogue refresh runs in the background, never on the request path
+    from .scheduler import RefreshScheduler, SCHEDULER_ENABLED
+    scheduler = RefreshScheduler(engine) if SCHEDULER_ENABLED else None
+    if scheduler:
+        scheduler.start()
     yield
+    if scheduler:
+        await scheduler.stop()
+    await alert_broker.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -48,6 +60,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
+# Per-plan rate limits and report quotas (added first so CORS headers wrap its 429s)
+from .quotas import QuotaMiddleware
+app.add_middleware(QuotaMiddleware, engine=engine)
+
 # Enable CORS just in case
 app.add_middleware(
     CORSMiddleware,
@@ -248,64 +264,111 @@ def get_combination_analysis(drug_a: int, drug_b: int, session: Session = Depend
 
 # Import connector
 from .pubmed_connector import fetch_pubmed_articles
-from datetime import datetime
+from .ingestion import SOURCE_PUBMED, ARTICLE_KEY, get_watermark, advance_watermark, bulk_upsert, last_checked
+from .alerts import dispatch_alerts
+from datetime import datetime, timedelta
+import asyncio
 
-@app.post("/products/{product_id}/refresh-articles")
-async def refresh_product_articles(product_id: int, session: Session = Depends(get_session)):
+# On-demand refreshes within this window are answered without calling PubMed
+ARTICLE_REFRESH_TTL = timedelta(seconds=int(os.environ.get("ARTICLE_REFRESH_TTL_SECONDS", "900")))
+
+# product_id -> the PubMed refresh currently running for it
+_article_refreshes = {}
+
+def _article_watermark(product_id: int):
+    with Session(engine) as session:
+        return get_watermark(session, product_id, SOURCE_PUBMED)
+
+def _store_articles(product_id: int, articles_data: list) -> int:
+    """Upserts fetched articles, advances the watermark and fans out alerts. Blocking: run in a thread."""
+    rows = []
+    for item in articles_data:
+        # Parse date safely
+        pub_date = datetime.now()
+        try:
+            # Try parsing "YYYY Mon DD" or "YYYY"
+            # This is a naive parser for demo
+             pub_date = datetime.strptime(item["date"][0:4], "%Y")
+        except:
+            pass
+
+        rows.append(dict(
+            product_id=product_id,
+            title=item["title"],
+            # Natural key: DOI, or the PubMed ID when the article has none
+            doi=item["doi"] if item["doi"] != "N/A" else f"PMID:{item['source_id']}",
+            pmid=item["source_id"],
+            authors=item["authors"],
+            abstract=item["desc"], # Summary from e-utils
+            url=item["url"],
+            publication_date=pub_date
+        ))
+
+    with Session(engine) as session:
+        # One INSERT ... ON CONFLICT DO NOTHING instead of a lookup per article
+        added_count = bulk_upsert(session, ScientificArticle, rows, ARTICLE_KEY)
+
+        # Also stamps the refresh time used by the freshness TTL
+        advance_watermark(session, product_id, SOURCE_PUBMED, [item.get("entrez_date") for item in articles_data])
+        session.commit()
+
+    if added_count:
+        dispatch_alerts(engine)
+    return added_count
+
+async def _refresh_articles(product_id: int, product_name: str) -> dict:
     """
-    Triggers a real-time fetch of articles from PubMed for the given product.
+    Fetches and stores new PubMed articles for one product. Runs once per in-flight refresh.
+    Database and alert work runs in worker threads so SQLite lock waits never block the event loop.
     """
-    product = session.get(Product, product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-        
-    # Fetch real data
-    print(f"Fetching PubMed data for {product.name}...")
+    # Fetch real data: every article PubMed added since the last refresh, or the newest 5 on a first refresh
+    since = await asyncio.to_thread(_article_watermark, product_id)
+    print(f"Fetching PubMed data for {product_name} since {since or 'beginning'}...")
     try:
-        articles_data = await fetch_pubmed_articles(product.name, max_results=5)
+        articles_data = await fetch_pubmed_articles(product_name, max_results=5, mindate=since)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"External API failed: {str(e)}")
-        
-    added_count = 0
-    
-    for item in articles_data:
-        # Check duplicate by title (simple check)
-        # In a real app, use DOI or hash
-        exists = session.exec(select(ScientificArticle).where(
-            ScientificArticle.product_id == product_id,
-            ScientificArticle.title == item["title"]
-        )).first()
-        
-        if not exists:
-            # Parse date safely
-            pub_date = datetime.now()
-            try:
-                # Try parsing "YYYY Mon DD" or "YYYY"
-                # This is a naive parser for demo
-                 pub_date = datetime.strptime(item["date"][0:4], "%Y")
-            except:
-                pass
-
-            new_article = ScientificArticle(
-                product_id=product_id,
-                title=item["title"],
-                doi=item["doi"],
-                authors=item["authors"],
-                abstract=item["desc"], # Summary from e-utils
-                url=item["url"],
-                publication_date=pub_date
-            )
-            session.add(new_article)
-            added_count += 1
-            
-    session.commit()
-    
+
+    added_count = await asyncio.to_thread(_store_articles, product_id, articles_data)
+
     return {
         "message": f"Successfully refreshed data. Added {added_count} new articles.",
         "articles_found": len(articles_data),
         "articles_added": added_count
     }
 
+def _article_freshness(session: Session, product_id: int):
+    product = session.get(Product, product_id)
+    return product, product and last_checked(session, product_id, SOURCE_PUBMED)
+
+@app.post("/products/{product_id}/refresh-articles")
+async def refresh_product_articles(product_id: int, session: Session = Depends(get_session)):
+    """
+    Triggers a real-time fetch of articles from PubMed for the given product.
+    Concurrent calls for the same product share one fetch, and a product
+    refreshed within ARTICLE_REFRESH_TTL is returned as is.
+    """
+    product, checked = await asyncio.to_thread(_article_freshness, session, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    if checked and datetime.utcnow() - checked < ARTICLE_REFRESH_TTL:
+        return {
+            "message": "Articles are up to date.",
+            "articles_found": 0,
+            "articles_added": 0,
+            "refreshed_at": checked
+        }
+
+    task = _article_refreshes.get(product_id)
+    if task is None:
+        task = asyncio.create_task(_refresh_articles(product_id, product.name))
+        _article_refreshes[product_id] = task
+        task.add_done_callback(lambda t: _article_refreshes.pop(product_id, None))
+
+    # Shielded so one caller disconnecting does not cancel the fetch for the others
+    return await asyncio.shield(task)
+
 class ChatRequest(BaseModel):
     query: str
     context_product_id: Optional[int] = None
@@ -564,19 +627,28 @@ class Verify2FARequest(BaseModel):
     temp_token: str
 
 def get_current_user(authorization: Optional[str] = Header(None), session: Session = Depends(get_session)) -> Optional[User]:
-    """Get current authenticated user from token"""
+    """
+    Get current authenticated user from token.
+    Verified tokens are cached with their user id, so most calls run no HMAC;
+    the user is always loaded by primary key, so deactivation and other
+    changes apply on every worker at once.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         return None
     token = authorization.replace("Bearer ", "")
-    payload = verify_token(token)
-    if not payload:
+    user_id = token_cache.get(token)
+    if user_id is None:
+        payload = verify_token(token)
+        if not payload:
+            return None
+        user_id = payload["user_id"]
+        token_cache.put(token, user_id, payload["expires"])
+    user = session.get(User, user_id)
+    if not user or not user.is_active:
         return None
-    user = session.exec(select(User).where(User.id == payload["user_id"])).first()
     return user
 
-@app.post("/auth/register")
-def register(data: RegisterRequest, session: Session = Depends(get_session)):
-    """Register a new user (admin only in production)"""
+def _create_user(session: Session, data: RegisterRequest, password_hash: str) -> int:
     # Check if username exists
     existing = session.exec(select(User).where(User.username == data.username)).first()
     if existing:
@@ -591,28 +663,41 @@ def register(data: RegisterRequest, session: Session = Depends(get_session)):
     user = User(
         username=data.username,
         email=data.email,
-        password_hash=hash_password(data.password),
+        password_hash=password_hash,
         is_admin=False
     )
     session.add(user)
     session.commit()
     session.refresh(user)
-    
-    return {"message": "User registered successfully", "user_id": user.id}
+    return user.id
 
-@app.post("/auth/login")
-def login(data: LoginRequest, session: Session = Depends(get_session)):
-    """Login with username and password"""
-    user = session.exec(select(User).where(User.username == data.username)).first()
-    
-    if not user or not verify_password(data.password, user.password_hash):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    if not user.is_active:
-        raise HTTPException(status_code=403, detail="Account disabled")
+@app.post("/auth/register")
+async def register(data: RegisterRequest, session: Session = Depends(get_session)):
+    """Register a new user (admin only in production)"""
+    # Hash first, on the password pool: no pooled connection is held while it runs
+    password_hash = await hash_password_async(data.password)
+    # Database work runs in a worker thread, off the event loop
+    user_id = await asyncio.to_thread(_create_user, session, data, password_hash)
+    return {"message": "User registered successfully", "user_id": user_id}
+
+def _find_login_user(session: Session, username: str) -> Optional[User]:
+    """Reads the user detached from the session and ends the read, so no pooled connection is held while hashing"""
+    user = session.exec(select(User).where(User.username == username)).first()
+    if user:
+        session.expunge(user)
+    session.rollback()
+    return user
+
+def _complete_login(session: Session, user: User, new_hash: Optional[str]) -> dict:
+    """Stores an upgraded hash and the login time, and builds the login response"""
+    session.add(user)
+    # Upgrade hashes made with an older scheme or cost
+    if new_hash:
+        user.password_hash = new_hash
     
     # Check if 2FA is enabled
     if user.is_2fa_enabled:
+        session.commit()
         # Return temporary token that requires 2FA verification
         temp_token = create_token(user.id, user.username)
         return {
@@ -623,7 +708,6 @@ def login(data: LoginRequest, session: Session = Depends(get_session)):
     
     # Update last login
     user.last_login = datetime.utcnow()
-    session.add(user)
     session.commit()
     
     # Return full access token
@@ -639,6 +723,20 @@ def login(data: LoginRequest, session: Session = Depends(get_session)):
         }
     }
 
+@app.post("/auth/login")
+async def login(data: LoginRequest, session: Session = Depends(get_session)):
+    """Login with username and password"""
+    # Database work runs in a worker thread, hashing on the password pool: neither blocks the event loop
+    user = await asyncio.to_thread(_find_login_user, session, data.username)
+    if not user or not await verify_password_async(data.password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="Account disabled")
+    
+    new_hash = await hash_password_async(data.password) if needs_rehash(user.password_hash) else None
+    return await asyncio.to_thread(_complete_login, session, user, new_hash)
+
 @app.post("/auth/verify-2fa")
 def verify_2fa(data: Verify2FARequest, session: Session = Depends(get_session)):
     """Verify 2FA code to complete login"""
@@ -726,6 +824,8 @@ def enable_2fa(code: str, user: User = Depends(get_current_user), session: Sessi
 # =====================
 # Alert Subscription Endpoints
 # =====================
+from sqlmodel import update
+from .models import Notification
 
 @app.post("/alerts/subscribe/{product_id}")
 def subscribe_to_product(product_id: int, user: User = Depends(get_current_user), session: Session = Depends(get_session)):
@@ -788,6 +888,43 @@ def check_subscription(product_id: int, user: User = Depends(get_current_user),
     
     return {"subscribed": subscription is not None}
 
+@app.get("/alerts/check")
+def check_subscriptions(ids: List[int] = Query(..., description="Product IDs to check"),
+                        user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    """Check many products at once: {product_id: subscribed}"""
+    if not user:
+        return {"subscribed": {i: False for i in ids}}
+
+    subscribed = set(session.exec(
+        select(AlertSubscription.product_id).where(
+            AlertSubscription.user_id == user.id,
+            AlertSubscription.product_id.in_(ids)
+        )
+    ).all())
+    return {"subscribed": {i: i in subscribed for i in ids}}
+
+@app.put("/alerts/digest/{product_id}")
+def set_digest_frequency(product_id: int, frequency: str, user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    """Set the email digest cadence for a subscription: daily, weekly or off"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if frequency not in ("daily", "weekly", "off"):
+        raise HTTPException(status_code=400, detail="frequency must be daily, weekly or off")
+
+    subscription = session.exec(
+        select(AlertSubscription).where(
+            AlertSubscription.user_id == user.id,
+            AlertSubscription.product_id == product_id
+        )
+    ).first()
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Not subscribed to this product")
+
+    subscription.digest_frequency = frequency
+    session.add(subscription)
+    session.commit()
+    return {"product_id": product_id, "digest_frequency": frequency}
+
 @app.get("/alerts/my-subscriptions")
 def get_my_subscriptions(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     """Get all products user is subscribed to"""
@@ -803,6 +940,145 @@ def get_my_subscriptions(user: User = Depends(get_current_user), session: Sessio
     
     return products
 
+@app.get("/alerts/notifications")
+def get_my_notifications(unread: bool = True, limit: int = 50,
+                         user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    """Latest alert notifications for the current user"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    query = select(Notification).where(Notification.user_id == user.id)
+    if unread:
+        query = query.where(Notification.read_at == None)
+    return session.exec(query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(min(limit, 500))).all()
+
+@app.post("/alerts/notifications/read")
+def mark_notifications_read(ids: Optional[List[int]] = None,
+                            user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    """Mark notifications as read (all unread ones when no ids are given)"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    query = update(Notification).where(Notification.user_id == user.id, Notification.read_at == None)
+    if ids:
+        query = query.where(Notification.id.in_(ids))
+    marked = session.exec(query.values(read_at=datetime.utcnow())).rowcount
+    session.commit()
+    return {"status": "ok", "marked": marked}
+
+from fastapi.responses import StreamingResponse
+from .alert_stream import AlertBroker
+
+alert_broker = AlertBroker(engine)
+
+def get_stream_user(token: Optional[str] = None, authorization: Optional[str] = Header(None)) -> User:
+    """
+    Authenticates a stream from the Authorization header or a `token` query
+    parameter (EventSource cannot send headers). Uses a short-lived session
+    rather than get_session, so open streams do not hold pooled connections.
+    """
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization.replace("Bearer ", "")
+    payload = verify_token(token) if token else None
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    with Session(engine) as session:
+        user = session.get(User, payload["user_id"])
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user
+
+@app.get("/alerts/stream")
+async def stream_alerts(user: User = Depends(get_stream_user),
+                        last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")):
+    """Server-Sent Events stream of new alert notifications for the current user"""
+    return StreamingResponse(
+        alert_broker.stream(user.id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =====================
+# Admin: Ingestion Runs
+# =====================
+import json
+from statistics import median
+from .models import IngestionRun
+
+def require_admin(user: User = Depends(get_current_user)) -> User:
+    """Dependency for admin-only endpoints"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+def ingestion_run_view(run: IngestionRun) -> dict:
+    return {
+        "id": run.id, "name": run.name, "status": run.status, "error": run.error,
+        "started_at": run.started_at, "finished_at": run.finished_at, "duration_ms": run.duration_ms,
+        "records_written": run.records_written,
+        "metrics": json.loads(run.metrics) if run.metrics else None
+    }
+
+@app.post("/admin/users/{user_id}/deactivate")
+def deactivate_user(user_id: int, admin: User = Depends(require_admin), session: Session = Depends(get_session)):
+    """Deactivate a user; their tokens stop working immediately"""
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.is_active = False
+    session.add(user)
+    session.commit()
+    token_cache.invalidate_user(user_id)
+    return {"id": user_id, "is_active": False}
+
+@app.get("/admin/ingestion-runs")
+def list_ingestion_runs(name: Optional[str] = None, limit: int = Query(50, le=500),
+                        admin: User = Depends(require_admin), session: Session = Depends(get_session)):
+    """Latest ingestion runs (seed, refresh, scheduler...) with their metrics, newest first"""
+    statement = select(IngestionRun).order_by(IngestionRun.started_at.desc()).limit(limit)
+    if name:
+        statement = statement.where(IngestionRun.name == name)
+    return [ingestion_run_view(r) for r in session.exec(statement).all()]
+
+@app.get("/admin/ingestion-runs/summary")
+def ingestion_runs_summary(window: int = Query(10, ge=1, le=100),
+                           admin: User = Depends(require_admin), session: Session = Depends(get_session)):
+    """
+    Latest successful run of each kind against the median of the `window`
+    successful runs before it, to spot slowdowns and throughput regressions.
+    """
+    summary = []
+    for name in sorted(session.exec(select(IngestionRun.name).distinct()).all()):
+        runs = session.exec(
+            select(IngestionRun)
+            .where(IngestionRun.name == name, IngestionRun.status == "ok")
+            .order_by(IngestionRun.started_at.desc())
+            .limit(window + 1)
+        ).all()
+        last = session.exec(
+            select(IngestionRun).where(IngestionRun.name == name).order_by(IngestionRun.started_at.desc())
+        ).first()
+        latest, previous = (runs[0], runs[1:]) if runs else (None, [])
+        baseline = median(r.duration_ms for r in previous) if previous else None
+        summary.append({
+            "name": name,
+            "last_status": last.status,
+            "latest_ok": ingestion_run_view(latest) if latest else None,
+            "baseline_duration_ms": baseline,
+            "duration_ratio": round(latest.duration_ms / baseline, 2) if latest and baseline else None
+        })
+    return summary
+
+@app.get("/admin/ingestion-runs/{run_id}")
+def get_ingestion_run(run_id: int, admin: User = Depends(require_admin), session: Session = Depends(get_session)):
+    """One ingestion run with its full metrics"""
+    run = session.get(IngestionRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Ingestion run not found")
+    return ingestion_run_view(run)
+
 @app.get("/products/compare")
 def compare_products(ids: List[int] = Query(...), session: Session = Depends(get_session)):
     """
@@ -1206,10 +1482,13 @@ def get_clinical_budget(session: Session = Depends(get_session)):
     """List all clinical budget items"""
     return session.exec(select(ClinicalBudget)).all()
 
+from .budget_rollup import apply_budget_lines
+
 @app.post("/cta/budget", response_model=ClinicalBudget)
 def create_clinical_budget(item: ClinicalBudget, session: Session = Depends(get_session)):
     """Add a new budget item"""
     session.add(item)
+    apply_budget_lines(session, [item])
     session.commit()
     session.refresh(item)
     return item
@@ -1220,19 +1499,55 @@ def delete_clinical_budget(item_id: int, session: Session = Depends(get_session)
     item = session.get(ClinicalBudget, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Budget item not found")
+    apply_budget_lines(session, [item], sign=-1)
     session.delete(item)
     session.commit()
     return {"ok": True}
 
+from sqlalchemy import func
+
+def budget_totals(*group_by):
+    """SUM/COUNT of the budget lines, optionally grouped by ClinicalBudget columns"""
+    allocated = func.coalesce(func.sum(ClinicalBudget.allocated_amount), 0.0)
+    spent = func.coalesce(func.sum(ClinicalBudget.spent_amount), 0.0)
+    return select(*group_by, allocated.label("allocated"), spent.label("spent"),
+                  func.count(ClinicalBudget.id).label("items")).group_by(*group_by)
+
+def rollup_totals(*group_by):
+    """SUM of the maintained BudgetRollup rows, optionally grouped by BudgetRollup columns"""
+    return select(*group_by, func.coalesce(func.sum(BudgetRollup.allocated), 0.0).label("allocated"),
+                  func.coalesce(func.sum(BudgetRollup.spent), 0.0).label("spent"),
+                  func.coalesce(func.sum(BudgetRollup.items), 0).label("items")).group_by(*group_by)
+
+def budget_view(allocated: float, spent: float, items: int) -> dict:
+    return {
+        "allocated": allocated, "spent": spent, "balance": allocated - spent,
+        "utilization_rate": round(spent / allocated * 100, 2) if allocated > 0 else 0, "items": items
+    }
+
 @app.get("/cta/economic-memory")
-def get_economic_memory(session: Session = Depends(get_session)):
-    """Generate 'Memoria Económica' (Inputs -> Process -> Outputs)"""
-    items = session.exec(select(ClinicalBudget)).all()
-    
-    total_allocated = sum(i.allocated_amount for i in items)
-    total_spent = sum(i.spent_amount for i in items)
+def get_economic_memory(limit: int = Query(50, ge=0, le=500), offset: int = Query(0, ge=0),
+                        site_limit: int = Query(50, ge=0, le=500), site_offset: int = Query(0, ge=0),
+                        session: Session = Depends(get_session)):
+    """
+    Generate 'Memoria Económica' (Inputs -> Process -> Outputs).
+    Totals and per trial/site breakdowns come from the BudgetRollup; line items (limit/offset)
+    and sites (site_limit/site_offset) are paginated separately.
+    """
+    total_allocated, total_spent, total_items = session.exec(rollup_totals()).one()
     remaining = total_allocated - total_spent
     utilization = (total_spent / total_allocated * 100) if total_allocated > 0 else 0
+
+    by_trial = session.exec(rollup_totals(BudgetRollup.trial_id).order_by(BudgetRollup.trial_id)).all()
+    by_status = session.exec(budget_totals(ClinicalBudget.status).order_by(ClinicalBudget.status)).all()
+    by_site = session.exec(
+        rollup_totals(BudgetRollup.trial_id, BudgetRollup.site_name)
+        .order_by(BudgetRollup.trial_id, BudgetRollup.site_name).offset(site_offset).limit(site_limit)
+    ).all()
+    sites_total = session.exec(
+        select(func.count()).select_from(select(BudgetRollup.trial_id, BudgetRollup.site_name).distinct().subquery())
+    ).one()
+    items = session.exec(select(ClinicalBudget).order_by(ClinicalBudget.id).offset(offset).limit(limit)).all()
     
     return {
         "summary": {
@@ -1241,6 +1556,9 @@ def get_economic_memory(session: Session = Depends(get_session)):
             "balance": remaining,
             "utilization_rate": round(utilization, 2)
         },
+        "by_trial": [dict(budget_view(a, sp, n), trial_id=t) for t, a, sp, n in by_trial],
+        "by_status": [dict(budget_view(a, sp, n), status=st) for st, a, sp, n in by_status],
+        "by_site": [dict(budget_view(a, sp, n), trial_id=t, site_name=site) for t, site, a, sp, n in by_site],
         "sections": {
             "inputs": [
                 "Protocolo aprobado (v4.0)",
@@ -1260,31 +1578,55 @@ def get_economic_memory(session: Session = Depends(get_session)):
                 "Mejoras del proceso de evaluación identificadas"
             ]
         },
-        "items": items
+        "items": items,
+        "items_total": total_items,
+        "limit": limit,
+        "offset": offset,
+        "sites_total": sites_total,
+        "site_limit": site_limit,
+        "site_offset": site_offset
     }
 
+@app.get("/cta/portfolio")
+def get_budget_portfolio(trial_id: Optional[int] = None, session: Session = Depends(get_session)):
+    """Multi-trial budget portfolio: totals per trial and currency, read from the BudgetRollup"""
+    query = select(
+        BudgetRollup.trial_id, BudgetRollup.currency,
+        func.sum(BudgetRollup.allocated), func.sum(BudgetRollup.spent), func.sum(BudgetRollup.items),
+        func.count(BudgetRollup.id), func.sum(BudgetRollup.over_budget_items), func.sum(BudgetRollup.underutilized_items)
+    ).group_by(BudgetRollup.trial_id, BudgetRollup.currency).order_by(BudgetRollup.trial_id, BudgetRollup.currency)
+    if trial_id is not None:
+        query = query.where(BudgetRollup.trial_id == trial_id)
+    return [
+        dict(budget_view(allocated, spent, items), trial_id=t, currency=currency, sites=sites,
+             over_budget_items=over, underutilized_items=under)
+        for t, currency, allocated, spent, items, sites, over, under in session.exec(query).all()
+    ]
+
 @app.get("/cta/process-improvements")
 def get_process_improvements(session: Session = Depends(get_session)):
     """Analyze budget and suggest 'Mejoras del proceso'"""
-    items = session.exec(select(ClinicalBudget)).all()
+    # Both checks are counters maintained in the rollup
+    overbudget_sites, underutilized = session.exec(select(
+        func.coalesce(func.sum(BudgetRollup.over_budget_items), 0),
+        func.coalesce(func.sum(BudgetRollup.underutilized_items), 0)
+    )).one()
     suggestions = []
     
     # 1. Check for Overspending
-    overbudget_sites = [i for i in items if i.spent_amount > i.allocated_amount]
     if overbudget_sites:
         suggestions.append({
             "type": "Critical",
             "title": "Desviación de Costes Detectada",
-            "description": f"{len(overbudget_sites)} centros han superado su asignación. Revisar 'Análisis de costes de sostenibilidad'."
+            "description": f"{overbudget_sites} centros han superado su asignación. Revisar 'Análisis de costes de sostenibilidad'."
         })
         
     # 2. Check for Low Utilization (Inefficiency)
-    underutilized = [i for i in items if i.allocated_amount > 0 and (i.spent_amount / i.allocated_amount) < 0.1]
     if underutilized:
         suggestions.append({
             "type": "Optimization",
             "title": "Recursos Inmovilizados",
-            "description": f"{len(underutilized)} centros tienen <10% de ejecución. Valorar reasignación de partidas ('Planeación')."
+            "description": f"{underutilized} centros tienen <10% de ejecución. Valorar reasignación de partidas ('Planeación')."
         })
         
     # 3. Protocol Compliance (Stub logic)
@@ -1297,73 +1639,22 @@ def get_process_improvements(session: Session = Depends(get_session)):
     return suggestions
 
 from fastapi import UploadFile, File
-import pandas as pd
-import io
+from .cta_import import import_cta_file
 
 @app.post("/cta/import")
-async def import_cta_data(file: UploadFile = File(...), session: Session = Depends(get_session)):
-    """Smart Import: Accepts Excel/CSV and populates Valid Records"""
+def import_cta_data(file: UploadFile = File(...), session: Session = Depends(get_session)):
+    """
+    Smart Import: Accepts Excel/CSV and populates Valid Records.
+    Streams the spooled upload in chunks; returns the per-row validation report and rows/s.
+    """
     try:
-        contents = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-            
-        # Normalize columns
-        df.columns = [str(c).lower().strip() for c in df.columns]
-        
-        # DEBUG: Log columns to see why it fails
-        with open("debug_import_columns.txt", "w") as f:
-            f.write(f"Columns found: {list(df.columns)}\n")
-            f.write(f"First row: {df.iloc[0].to_dict() if not df.empty else 'EMPTY'}\n")
-        
-        count = 0
-        
-        # Heuristic 1: Regulatory Documents (Broadened)
-        if any(c in df.columns for c in ['title', 'document', 'submission', 'protocol']):
-            for _, row in df.iterrows():
-                # Normalizing Data
-                raw_status = str(row.get('status', 'Pending')).strip().title()
-                raw_type = str(row.get('type', 'Other')).strip()
-                
-                doc = RegulatoryDocument(
-                    product_id=1, 
-                    title=str(row.get('title', row.get('document', 'Untitled'))),
-                    # ... rest of fields
-                    type=raw_type,
-                    status=raw_status,
-                    submission_date=datetime.now()
-                )
-                session.add(doc)
-                count += 1
-            detected_type = "regulatory"
-                
-        # Heuristic 2: Budget (Broadened)
-        elif any(c in df.columns for c in ['site', 'hospital', 'center', 'amount', 'budget', 'allocated', 'cost', 'gastos']):
-             for _, row in df.iterrows():
-                # Fuzzy mappings
-                site = row.get('site') or row.get('hospital') or row.get('center') or 'Unknown Site'
-                allocated = row.get('allocated') or row.get('amount') or row.get('budget') or 0
-                spent = row.get('spent') or row.get('cost') or row.get('gastos') or 0
-                
-                budget = ClinicalBudget(
-                    trial_id=1,
-                    site_name=str(site),
-                    allocated_amount=float(allocated),
-                    spent_amount=float(spent),
-                    status=str(row.get('status', 'Active'))
-                )
-                session.add(budget)
-                count += 1
-             detected_type = "budget"
-        else:
-             detected_type = "unknown"
-                
-        session.commit()
-        return {"message": f"Successfully imported {count} records.", "type": detected_type}
-        
+        return import_cta_file(session, file.file, file.filename)
+    except ValueError as e:
+        # Empty upload or header without rows
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        session.rollback()
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
@@ -0,0 +1,94 @@
+"""
+Product name matching for the bulk loaders: maps intervention names,
+claims and abstracts from source dumps to catalogue products through the
+product names and their ProductSynonym rows (brand, generic, code names).
+
+Matching works on normalized word n-grams looked up in a dict, so the cost
+is linear in the text length whatever the number of synonyms.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from .models import Product, ProductSynonym
+
+MIN_SYNONYM_LENGTH = 4  # Shorter names ("IL", "PD") match far too much text
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_TRADEMARKS = re.compile(r"[®™©]")
+
+
+def normalize(name: str) -> str:
+    """Lower-cases and reduces punctuation to single spaces: "Sacubitril/Valsartan®" -> "sacubitril valsartan"."""
+    return _NON_WORD.sub(" ", _TRADEMARKS.sub("", name or "").lower()).strip()
+
+
+class ProductMatcher:
+    """Index of normalized synonym -> product ids. Picklable, so it can be shipped to worker processes."""
+
+    def __init__(self, synonyms: Iterable[Tuple[str, int]] = ()):
+        self.index: Dict[str, Set[int]] = {}
+        self.max_words = 1
+        for name, product_id in synonyms:
+            self.add(name, product_id)
+
+    def add(self, name: str, product_id: int):
+        key = normalize(name)
+        if len(key) < MIN_SYNONYM_LENGTH:
+            return
+        self.index.setdefault(key, set()).add(product_id)
+        self.max_words = max(self.max_words, key.count(" ") + 1)
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, name: str) -> Set[int]:
+        """Products whose name or synonym is exactly `name` (after normalization)."""
+        return self.index.get(normalize(name), set())
+
+    def find(self, text: str) -> Set[int]:
+        """Products mentioned anywhere in `text` (whole-word matches only)."""
+        words = normalize(text).split()
+        found = set()
+        for i in range(len(words)):
+            for n in range(1, min(self.max_words, len(words) - i) + 1):
+                ids = self.index.get(" ".join(words[i:i + n]))
+                if ids:
+                    found |= ids
+        return found
+
+    def match(self, name: str) -> Set[int]:
+        """Exact lookup first, then mentions (e.g. "Pembrolizumab 200 mg IV")."""
+        return self.lookup(name) or self.find(name)
+
+
+def load_matcher(session: Session) -> ProductMatcher:
+    """Builds the matcher from every product name and synonym in the database."""
+    matcher = ProductMatcher(
+        (name, pid) for pid, name in session.exec(select(Product.id, Product.name)).all()
+    )
+    for product_id, synonym in session.exec(select(ProductSynonym.product_id, ProductSynonym.synonym)).all():
+        matcher.add(synonym, product_id)
+    return matcher
+
+# Worker processes of the bulk loaders receive the matcher once, through init_worker
+_worker_matcher: Optional[ProductMatcher] = None
+
+def init_worker(matcher: ProductMatcher):
+    """ProcessPoolExecutor initializer: keeps the matcher for the worker's map calls."""
+    global _worker_matcher
+    _worker_matcher = matcher
+
+def worker_matcher() -> ProductMatcher:
+    return _worker_matcher
+
+def synonym_rows(product_id: int, names: Iterable[Optional[str]], source: str) -> List[Dict]:
+    """ProductSynonym rows for the usable names among `names` (for bulk_upsert on SYNONYM_KEY)."""
+    rows = {}
+    for name in names:
+        key = normalize(name)
+        if len(key) >= MIN_SYNONYM_LENGTH and key != "unknown":
+            rows[key] = {"product_id": product_id, "synonym": key, "source": source}
+    return list(rows.values())
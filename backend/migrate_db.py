@@ -1,6 +1,7 @@
 
 from sqlmodel import Session, create_engine, text
 from backend.main import engine
+from backend.models import Patent, ScientificArticle, ClinicalTrial, Conference
 
 def migrate_db():
     print("Checking database schema...")
@@ -18,5 +19,124 @@ def migrate_db():
     except Exception as e:
         print(f"Migration failed: {e}")
 
+def migrate_natural_keys():
+    """
+    Adds the unique natural-key indexes used by bulk upserts to an existing database.
+    Duplicate rows left by the old row-at-a-time inserts are collapsed first.
+    """
+    print("Checking natural-key indexes...")
+    try:
+        with Session(engine) as session:
+            try:
+                session.exec(text("SELECT pmid FROM scientificarticle LIMIT 1"))
+            except Exception:
+                print("Column 'pmid' missing. Adding it...")
+                session.exec(text("ALTER TABLE scientificarticle ADD COLUMN pmid VARCHAR"))
+
+            try:
+                session.exec(text("SELECT source_id FROM conference LIMIT 1"))
+            except Exception:
+                print("Column 'source_id' missing from 'conference'. Adding it...")
+                session.exec(text("ALTER TABLE conference ADD COLUMN source_id VARCHAR"))
+
+            for table in ["scientificarticle", "clinicaltrial", "patent", "conference"]:
+                try:
+                    session.exec(text(f"SELECT content_hash FROM {table} LIMIT 1"))
+                except Exception:
+                    print(f"Column 'content_hash' missing from '{table}'. Adding it...")
+                    session.exec(text(f"ALTER TABLE {table} ADD COLUMN content_hash VARCHAR"))
+
+            # Articles stored without a DOI were all "N/A": give each its own key
+            session.exec(text("UPDATE scientificarticle SET doi = 'legacy:' || id WHERE doi IS NULL OR doi = 'N/A'"))
+            session.exec(text("UPDATE conference SET source_id = 'legacy:' || id WHERE source_id IS NULL"))
+
+            # Budgets reference trials: repoint them to the surviving row before deleting duplicates
+            session.exec(text("""
+                UPDATE clinicalbudget SET trial_id = (
+                    SELECT MIN(t2.id) FROM clinicaltrial t1
+                    JOIN clinicaltrial t2 ON t1.product_id IS t2.product_id AND t1.nct_id = t2.nct_id
+                    WHERE t1.id = clinicalbudget.trial_id
+                ) WHERE trial_id IN (SELECT id FROM clinicaltrial)
+            """))
+            for table, key in [
+                ("scientificarticle", "product_id, doi"),
+                ("clinicaltrial", "product_id, nct_id"),
+                ("patent", "product_id, source_id"),
+            ]:
+                removed = session.exec(text(
+                    f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {key})"
+                )).rowcount
+                print(f"Removed {removed} duplicate rows from '{table}'.")
+            session.commit()
+
+        for model in [ScientificArticle, ClinicalTrial, Patent, Conference]:
+            for index in model.__table__.indexes:
+                if index.unique:
+                    index.create(engine, checkfirst=True)
+                    print(f"Index '{index.name}' ready.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+def migrate_patent_fields():
+    """Adds the columns filled by the patent full-text loader."""
+    print("Checking patent columns...")
+    try:
+        with Session(engine) as session:
+            for column, sql_type in [("filing_date", "DATETIME"), ("priority_date", "DATETIME"), ("claims", "VARCHAR")]:
+                try:
+                    session.exec(text(f"SELECT {column} FROM patent LIMIT 1"))
+                except Exception:
+                    print(f"Column '{column}' missing from 'patent'. Adding it...")
+                    session.exec(text(f"ALTER TABLE patent ADD COLUMN {column} {sql_type}"))
+            session.commit()
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+def migrate_alert_fields():
+    """Adds the per-subscription digest cadence."""
+    print("Checking alert subscription columns...")
+    try:
+        with Session(engine) as session:
+            try:
+                session.exec(text("SELECT digest_frequency FROM alertsubscription LIMIT 1"))
+            except Exception:
+                print("Column 'digest_frequency' missing from 'alertsubscription'. Adding it...")
+                session.exec(text("ALTER TABLE alertsubscription ADD COLUMN digest_frequency VARCHAR NOT NULL DEFAULT 'daily'"))
+            session.commit()
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+def migrate_remove_simulated_conferences():
+    """Deletes the placeholder abstracts the conference connector used to return without exports."""
+    print("Removing simulated conference abstracts...")
+    try:
+        with Session(engine) as session:
+            removed = session.exec(text(
+                "DELETE FROM conference WHERE source_id IN ('ASCO-2025-ABS-1001', 'ESMO-2024-LBA-5')"
+            )).rowcount
+            session.commit()
+        print(f"Removed {removed} simulated abstracts")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
+def migrate_budget_rollup():
+    """Creates the BudgetRollup table and recomputes it from the budget lines."""
+    print("Rebuilding budget rollup...")
+    try:
+        from backend.models import BudgetRollup
+        from backend.budget_rollup import rebuild_rollups
+        BudgetRollup.__table__.create(engine, checkfirst=True)
+        with Session(engine) as session:
+            rows = rebuild_rollups(session)
+            session.commit()
+        print(f"Budget rollup rebuilt: {rows} trial/site/currency rows")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+
 if __name__ == "__main__":
     migrate_db()
+    migrate_natural_keys()
+    migrate_patent_fields()
+    migrate_alert_fields()
+    migrate_remove_simulated_conferences()
+    migrate_budget_rollup()
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from datetime import datetime
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import UniqueConstraint, Index
 
 class ProductBase(SQLModel):
     name: str # e.g. "Pembrolizumab"
@@ -41,6 +42,9 @@ class ProductSynthesis(SQLModel, table=True):
     product: Optional[Product] = Relationship(back_populates="synthesis_steps")
 
 class Patent(SQLModel, table=True):
+    # Natural key for bulk upserts: one row per patent number per product
+    __table_args__ = (Index("ux_patent_product_source", "product_id", "source_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_id: Optional[int] = Field(default=None, foreign_key="product.id")
     
@@ -57,23 +61,37 @@ class Patent(SQLModel, table=True):
     diseases_in_claims: Optional[str] = None  # Comma-separated diseases from claims
     patent_type: Optional[str] = None  # "Product", "Combination", "Use"
     expiry_date: Optional[datetime] = None
+    filing_date: Optional[datetime] = None
+    priority_date: Optional[datetime] = None  # Earliest priority claim (or the filing date)
+    claims: Optional[str] = None  # Full claims text, from the bulk full-text files
+
+    # Hash of the ingested fields, lets re-ingestion skip unchanged rows
+    content_hash: Optional[str] = None
     
     product: Optional[Product] = Relationship(back_populates="patents")
 
 class ScientificArticle(SQLModel, table=True):
+    # Natural key for bulk upserts. Articles without a DOI are keyed as "PMID:<pmid>"
+    __table_args__ = (Index("ux_scientificarticle_product_doi", "product_id", "doi", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_id: Optional[int] = Field(default=None, foreign_key="product.id")
     
     doi: str
+    pmid: Optional[str] = None
     title: str
     abstract: Optional[str]
     authors: Optional[str] # Comma separated
     publication_date: Optional[datetime]
     url: Optional[str]
+    content_hash: Optional[str] = None  # Hash of the ingested fields
     
     product: Optional[Product] = Relationship(back_populates="articles")
 
 class ClinicalTrial(SQLModel, table=True):
+    # Natural key for bulk upserts: one row per NCT ID per product
+    __table_args__ = (Index("ux_clinicaltrial_product_nct", "product_id", "nct_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_id: Optional[int] = Field(default=None, foreign_key="product.id")
     
@@ -85,19 +103,27 @@ class ClinicalTrial(SQLModel, table=True):
     completion_date: Optional[datetime] = None # Added for Gantt Chart
     sponsor: Optional[str] = None
     url: Optional[str]
+    content_hash: Optional[str] = None  # Hash of the ingested fields
     
     product: Optional[Product] = Relationship(back_populates="trials")
 
 class Conference(SQLModel, table=True):
+    # Natural key for bulk upserts: one row per abstract per product
+    __table_args__ = (Index("ux_conference_product_source", "product_id", "source_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_id: Optional[int] = Field(default=None, foreign_key="product.id")
     
+    source_id: Optional[str] = None  # Abstract number, prefixed with the meeting
     title: str
     abstract: Optional[str]
     conference_name: str
     date: Optional[datetime]
     url: Optional[str]
 
+    # Hash of the ingested fields, lets re-ingestion skip unchanged rows
+    content_hash: Optional[str] = None
+
     product: Optional[Product] = Relationship(back_populates="conferences")
 
 # --- Enhanced Models ---
@@ -170,6 +196,75 @@ class ProductExperimentalModel(SQLModel, table=True):
     product: Optional[Product] = Relationship(back_populates="experimental_models")
 
 
+# =====================
+# Ingestion State
+# =====================
+
+class IngestionWatermark(SQLModel, table=True):
+    """Newest source timestamp ingested per (product, source), for incremental refreshes"""
+    __table_args__ = (UniqueConstraint("product_id", "source"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+    source: str  # "pubmed", "clinical_trials", "openfda"
+
+    # PubMed edat / CT.gov LastUpdatePostDate / OpenFDA effective_time of the newest record seen
+    watermark: Optional[datetime] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ProductSynonym(SQLModel, table=True):
+    """Alternative product names (generic, brand, code names) used to match bulk source records"""
+    __table_args__ = (UniqueConstraint("product_id", "synonym"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+    synonym: str = Field(index=True)  # Normalized, see matching.normalize
+    source: Optional[str] = None  # "seed", "label", "manual"...
+
+
+class RefreshJob(SQLModel, table=True):
+    """Persistent state of the background refresh of one product from one source"""
+    __table_args__ = (UniqueConstraint("product_id", "source"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+    source: str  # One of the watermarked sources
+
+    next_run_at: datetime = Field(index=True)
+    last_run_at: Optional[datetime] = None
+    last_status: Optional[str] = None  # "ok", "error"
+    last_error: Optional[str] = None
+    last_duration_ms: Optional[int] = None
+    runs: int = Field(default=0)
+
+
+class IngestionRun(SQLModel, table=True):
+    """Metrics of one ingestion run (seed, refresh, scheduler tick, bulk load)"""
+    __tablename__ = "ingestion_run"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True)  # "seed", "refresh", "scheduler", "load_patents"...
+    started_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    status: str = Field(default="running")  # "running", "ok", "error"
+    error: Optional[str] = None
+
+    records_written: int = Field(default=0)
+    metrics: Optional[str] = None  # JSON of RunMetrics.summary(): sources, stages, http, errors
+
+
+class CompoundProperty(SQLModel, table=True):
+    """PubChem property cache, so re-seeding does not look compounds up again"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True, index=True)  # Lower-cased drug name as looked up
+
+    cid: Optional[int] = None  # None: PubChem does not know this name
+    properties: Optional[str] = None  # JSON of the PUG REST PropertyTable entry
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # =====================
 # Authentication Models
 # =====================
@@ -207,6 +302,9 @@ class AlertSubscription(SQLModel, table=True):
     alert_trials: bool = Field(default=True)
     alert_articles: bool = Field(default=True)
     alert_conferences: bool = Field(default=True)
+
+    # Email digest cadence: "daily", "weekly" or "off" (in-app notifications are always kept)
+    digest_frequency: str = Field(default="daily")
     
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -215,6 +313,30 @@ class AlertSubscription(SQLModel, table=True):
         # Unique constraint: one subscription per user per product
         pass
 
+
+class Notification(SQLModel, table=True):
+    """One alert for one user about one newly ingested record"""
+    __table_args__ = (UniqueConstraint("user_id", "record_type", "record_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+
+    record_type: str  # "patent", "trial", "article", "conference"
+    record_id: int  # Row id in the record type's table
+    title: str
+
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    read_at: Optional[datetime] = None
+
+
+class AlertCursor(SQLModel, table=True):
+    """Highest record id already fanned out to subscribers, per record type"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    record_type: str = Field(unique=True)
+    last_id: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 # =====================
 # SaaS / Subscription Models
 # =====================
@@ -271,3 +393,19 @@ class ClinicalBudget(SQLModel, table=True):
     
     currency: str = Field(default="EUR")
     status: str = Field(default="Active") # Active, Closed, Hold
+
+class BudgetRollup(SQLModel, table=True):
+    """ClinicalBudget totals per trial, site and currency, maintained by the CTA endpoints"""
+    __table_args__ = (UniqueConstraint("trial_id", "site_name", "currency"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    trial_id: int = Field(foreign_key="clinicaltrial.id")
+    site_name: str
+    currency: str = Field(default="EUR")
+
+    allocated: float = Field(default=0.0)
+    spent: float = Field(default=0.0)
+    items: int = Field(default=0)
+    over_budget_items: int = Field(default=0)  # spent > allocated
+    underutilized_items: int = Field(default=0)  # spent < 10% of a positive allocation
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -34,3 +34,55 @@ def extract_synthesis_steps(text: str) -> List[str]:
             steps.append(sent.strip())
             
     return steps
+
+def parse_label_side_effects(raw_se: str, limit: int = 8) -> List[str]:
+    """
+    Splits the free-text adverse reactions section of an FDA label into short effect names.
+    """
+    # Remove common intro phrases
+    cleaned_se = re.split(r'(?:include|are|:|The most common)', raw_se, flags=re.IGNORECASE)[-1]
+    # Split by common delimiters
+    candidates = re.split(r'[,;\.]', cleaned_se)
+    # Filter and clean
+    side_effects = []
+    for c in candidates:
+        clean_c = c.strip()
+        if 3 < len(clean_c) < 50 and "adverse" not in clean_c.lower() and "reported" not in clean_c.lower():
+            side_effects.append(clean_c)
+            
+    return side_effects[:limit]
+
+def extract_claim_diseases(text: str, limit: int = 5) -> List[str]:
+    """
+    Extracts the diseases named in patent claims (e.g. "a method of treating melanoma...").
+    Keyword based, like extract_side_effects.
+    """
+    common_diseases = [
+        "melanoma", "lymphoma", "leukemia", "myeloma", "carcinoma", "breast cancer", "lung cancer",
+        "prostate cancer", "diabetes", "obesity", "hypertension", "heart failure", "thrombosis",
+        "atrial fibrillation", "rheumatoid arthritis", "psoriasis", "crohn's disease", "ulcerative colitis",
+        "lupus", "hiv", "hepatitis", "alzheimer's disease", "parkinson's disease", "multiple sclerosis",
+        "depression", "schizophrenia", "epilepsy", "migraine", "asthma", "copd", "cystic fibrosis"
+    ]
+
+    found = []
+    text_lower = text.lower()
+    for disease in common_diseases:
+        if re.search(r'\b%s\b' % re.escape(disease), text_lower):
+            found.append(disease.upper() if disease in ("hiv", "copd") else disease.title())
+
+    return found[:limit]
+
+def classify_claim(text: str) -> str:
+    """
+    Classifies a patent from its first independent claim, using the same
+    categories as the curated patent data.
+    """
+    text_lower = text.lower()
+    if re.search(r'\b(process|method) (for|of) (preparing|producing|making|manufacturing|synthesi[sz]ing)\b', text_lower):
+        return "Process"
+    if re.search(r'\b(method|use) (of|for) (treating|treatment|preventing|prevention)\b', text_lower):
+        return "Method of Use"
+    if re.search(r'\b(formulation|dosage form|tablet|capsule|excipient)\b', text_lower):
+        return "Formulation"
+    return "Composition of Matter"
@@ -1,107 +1,148 @@
+import os
 import httpx
 import asyncio
 from datetime import datetime
 from typing import List, Dict, Optional
 import xml.etree.ElementTree as ET
+from data_ingestion import http_client
 
 # Base URL for NCBI E-utilities
-BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+BASE_URL = os.environ.get("PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
 
-async def fetch_pubmed_articles(keyword: str, max_results: int = 5) -> List[Dict]:
+# PMIDs per ESearch/ESummary page of an incremental refresh
+PAGE_SIZE = int(os.environ.get("PUBMED_PAGE_SIZE", "200"))
+# ESearch cannot page past retstart 9999
+MAX_RESULTS = 9999
+
+async def fetch_pubmed_articles(keyword: str, max_results: int = 5, mindate: Optional[datetime] = None) -> List[Dict]:
     """
     Fetches scientific articles from PubMed for a given keyword.
     
     Args:
         keyword: Search term (e.g. "Apixaban")
-        max_results: Maximum number of articles to return
+        max_results: Maximum number of articles to return on a first fetch (no mindate)
+        mindate: Only return articles added to PubMed (Entrez date) on/after this date;
+                 the whole window is paged through, since the caller's watermark moves past it
         
     Returns:
-        List of dictionaries with keys: title, doi, authors, date, desc (abstract/summary), url
+        List of dictionaries with keys: title, doi, authors, date, desc (abstract/summary), url, entrez_date
     """
     async with httpx.AsyncClient() as client:
         try:
-            # Step 1: Search (esearch)
-            # Use retmode=json for easier parsing
-            search_params = {
-                "db": "pubmed",
-                "term": f"{keyword}[Title/Abstract]", # Search in title/abstract for relevance
-                "retmode": "json",
-                "retmax": max_results,
-                "sort": "date" # Get most recent
-            }
-            
-            search_res = await client.get(f"{BASE_URL}/esearch.fcgi", params=search_params)
-            search_res.raise_for_status()
-            search_data = search_res.json()
-            
-            id_list = search_data.get("esearchresult", {}).get("idlist", [])
-            
-            if not id_list:
-                return []
-            
-            # Step 2: Summary (esummary)
-            # esummary also supports JSON
-            ids_str = ",".join(id_list)
-            summary_params = {
-                "db": "pubmed",
-                "id": ids_str,
-                "retmode": "json"
-            }
-            
-            summary_res = await client.get(f"{BASE_URL}/esummary.fcgi", params=summary_params)
-            summary_res.raise_for_status()
-            summary_data = summary_res.json()
-            
+            limit = MAX_RESULTS if mindate else min(max_results, MAX_RESULTS)
             articles = []
-            result_dict = summary_data.get("result", {})
-            
-            for uid in id_list:
-                if uid not in result_dict:
-                    continue
-                    
-                item = result_dict[uid]
-                
-                # Extract fields
-                title = item.get("title", "No Title")
-                
-                # Authors
-                authors_list = item.get("authors", [])
-                authors_str = ", ".join([a.get("name", "") for a in authors_list])
-                if len(authors_list) > 3:
-                     authors_str = ", ".join([a.get("name", "") for a in authors_list[:3]]) + " et al."
-                
-                # DOI logic (scan articleids)
-                doi = None
-                for aid in item.get("articleids", []):
-                    if aid.get("idtype") == "doi":
-                        doi = aid.get("value")
-                        break
+            start = total = 0
+            while start < limit:
+                # Step 1: Search (esearch), one page of IDs
+                # Use retmode=json for easier parsing
+                search_params = {
+                    "db": "pubmed",
+                    "term": f"{keyword}[Title/Abstract]", # Search in title/abstract for relevance
+                    "retmode": "json",
+                    "retstart": start,
+                    "retmax": min(PAGE_SIZE, limit - start),
+                    "sort": "date" # Get most recent
+                }
+                if mindate:
+                    # Incremental refresh: PubMed requires maxdate whenever mindate is set
+                    search_params.update({"datetype": "edat", "mindate": mindate.strftime("%Y/%m/%d"), "maxdate": "3000"})
                 
-                # Date
-                pub_date_str = item.get("pubdate", "")
-                # Convert date if possible, otherwise keep string or default
-                # PubMed dates vary widely (e.g. "2023 Dec 1", "2023", "2023 Summer")
-                # We'll try to extract YYYY-MM-DD or just use YYYY-01-01
-                
-                # Link
-                url = f"https://pubmed.ncbi.nlm.nih.gov/{uid}/"
-                
-                articles.append({
-                    "title": title,
-                    "doi": doi or "N/A",
-                    "authors": authors_str,
-                    "date": pub_date_str, # Client can parse or we can standardize
-                    "desc": item.get("source", "") + "; " + (item.get("epubdate") or ""), # Summary usually doesn't have abstract, just source/journal
-                    "url": url,
-                    "source_id": uid # PubMed ID
-                })
+                search_res = await http_client.arequest(client, "GET", f"{BASE_URL}/esearch.fcgi", params=search_params)
+                search_res.raise_for_status()
+                search_data = search_res.json().get("esearchresult", {})
                 
+                id_list = search_data.get("idlist", [])
+                if not id_list:
+                    break
+                articles += await _summaries(client, id_list)
+                start += len(id_list)
+                total = int(search_data.get("count", 0))
+                if start >= total:
+                    break
+            
+            if mindate and start < total:
+                # Newest first: the unfetched remainder is older than what was fetched, so the
+                # watermark must not move past it. Without entrez dates it stays put.
+                print(f"PubMed: '{keyword}' has {total} new articles since {mindate:%Y-%m-%d}; only the first {start} were fetched")
+                for article in articles:
+                    article["entrez_date"] = None
             return articles
 
         except Exception as e:
             print(f"Error fetching PubMed data: {e}")
             return []
 
+async def _summaries(client: httpx.AsyncClient, id_list: List[str]) -> List[Dict]:
+    """Step 2: Summary (esummary) of one page of PMIDs, in id_list order."""
+    # esummary also supports JSON
+    ids_str = ",".join(id_list)
+    summary_params = {
+        "db": "pubmed",
+        "id": ids_str,
+        "retmode": "json"
+    }
+    
+    summary_res = await http_client.arequest(client, "GET", f"{BASE_URL}/esummary.fcgi", params=summary_params)
+    summary_res.raise_for_status()
+    summary_data = summary_res.json()
+    
+    articles = []
+    result_dict = summary_data.get("result", {})
+    
+    for uid in id_list:
+        if uid not in result_dict:
+            continue
+            
+        item = result_dict[uid]
+        
+        # Extract fields
+        title = item.get("title", "No Title")
+        
+        # Authors
+        authors_list = item.get("authors", [])
+        authors_str = ", ".join([a.get("name", "") for a in authors_list])
+        if len(authors_list) > 3:
+             authors_str = ", ".join([a.get("name", "") for a in authors_list[:3]]) + " et al."
+        
+        # DOI logic (scan articleids)
+        doi = None
+        for aid in item.get("articleids", []):
+            if aid.get("idtype") == "doi":
+                doi = aid.get("value")
+                break
+        
+        # Date
+        pub_date_str = item.get("pubdate", "")
+        # Convert date if possible, otherwise keep string or default
+        # PubMed dates vary widely (e.g. "2023 Dec 1", "2023", "2023 Summer")
+        # We'll try to extract YYYY-MM-DD or just use YYYY-01-01
+        
+        # Entrez date (when the record was added to PubMed) drives the refresh watermark
+        entrez_date = None
+        for h in item.get("history", []):
+            if h.get("pubstatus") == "entrez":
+                try:
+                    entrez_date = datetime.strptime(h.get("date", "")[:10], "%Y/%m/%d")
+                except ValueError:
+                    pass
+                break
+        
+        # Link
+        url = f"https://pubmed.ncbi.nlm.nih.gov/{uid}/"
+        
+        articles.append({
+            "title": title,
+            "doi": doi or "N/A",
+            "authors": authors_str,
+            "date": pub_date_str, # Client can parse or we can standardize
+            "desc": item.get("source", "") + "; " + (item.get("epubdate") or ""), # Summary usually doesn't have abstract, just source/journal
+            "url": url,
+            "source_id": uid, # PubMed ID
+            "entrez_date": entrez_date
+        })
+        
+    return articles
+
 if __name__ == "__main__":
     # Test script
     async def test():
@@ -0,0 +1,244 @@
+"""
+Plan-aware rate limits and quotas.
+
+Each user's entitlements come from their active UserSubscription's
+SubscriptionPlan.features, parsed once and cached per user. `features` is
+either the historical JSON list of feature names or an object
+{"features": [...], "limits": {...}} whose limits override DEFAULT_LIMITS.
+
+QuotaMiddleware charges every API request against token buckets keyed by
+user (or client address when anonymous):
+- "requests_per_minute": all API calls;
+- "reports_per_day": PDF/report generation endpoints;
+- "chat_per_minute": /chat.
+A limit of None means unlimited. Rejected requests get a 429 with Retry-After.
+
+Tokens are checked through the shared verified-token cache, so most
+requests run no HMAC. Behind a reverse proxy every anonymous caller has the
+proxy's address: list the proxies in QUOTA_TRUSTED_PROXIES (comma-separated
+addresses) so X-Forwarded-For is used for connections from them. It is never
+read otherwise, as any client can set it.
+
+Buckets live in a MemoryBucketStore by default (per process). For several
+workers or nodes, pass a store with the same `take` method backed by a
+shared service.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from .models import SubscriptionPlan, UserSubscription
+from .auth import verify_token, token_cache
+
+QUOTAS_ENABLED = os.environ.get("QUOTAS", "on").lower() not in ("off", "0", "false")
+ENTITLEMENTS_TTL_SECONDS = float(os.environ.get("QUOTA_ENTITLEMENTS_TTL_SECONDS", "300"))
+MAX_BUCKETS = int(os.environ.get("QUOTA_MAX_BUCKETS", "100000"))
+TRUSTED_PROXIES = frozenset(p.strip() for p in os.environ.get("QUOTA_TRUSTED_PROXIES", "").split(",") if p.strip())
+
+# Limits for signed-in users without a plan, and for plans that do not set them
+DEFAULT_LIMITS = {"requests_per_minute": 300, "reports_per_day": 20, "chat_per_minute": 10}
+ANONYMOUS_LIMITS = {"requests_per_minute": 120, "reports_per_day": 5, "chat_per_minute": 5}
+
+# limit name -> bucket refill window (seconds)
+LIMIT_WINDOWS = {"requests_per_minute": 60, "reports_per_day": 86400, "chat_per_minute": 60}
+
+REPORT_PATHS = re.compile(r"^/(reports/landscape|analysis/report|products/\d+/(dossier|patentability/report))$")
+CHAT_PATHS = re.compile(r"^/chat$")
+UNMETERED_PATHS = re.compile(r"^/($|app/|static/)")
+
+
+class Entitlements:
+    def __init__(self, plan: Optional[str], features, limits: Dict[str, Optional[int]]):
+        self.plan = plan
+        self.features = frozenset(features)
+        self.limits = limits
+
+    def has_feature(self, feature: str) -> bool:
+        return feature in self.features or "all_features" in self.features
+
+def parse_features(features: Optional[str]) -> Tuple[list, Dict[str, Optional[int]]]:
+    """(feature names, limits) from SubscriptionPlan.features (list or {"features", "limits"} JSON)."""
+    try:
+        data = json.loads(features) if features else []
+    except ValueError:
+        data = []
+    if isinstance(data, dict):
+        return list(data.get("features", [])), dict(DEFAULT_LIMITS, **data.get("limits", {}))
+    return list(data), dict(DEFAULT_LIMITS)
+
+ANONYMOUS = Entitlements(None, [], ANONYMOUS_LIMITS)
+
+
+class EntitlementCache:
+    """user id -> Entitlements, loaded with one query on a miss and kept for ENTITLEMENTS_TTL_SECONDS."""
+    def __init__(self, engine, ttl: float = ENTITLEMENTS_TTL_SECONDS):
+        self.engine = engine
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, Entitlements]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id: int) -> Entitlements:
+        with Session(self.engine) as session:
+            row = session.exec(
+                select(SubscriptionPlan.name, SubscriptionPlan.features)
+                .join(UserSubscription, UserSubscription.plan_id == SubscriptionPlan.id)
+                .where(UserSubscription.user_id == user_id, UserSubscription.status == "active")
+                .order_by(UserSubscription.start_date.desc())
+            ).first()
+        if row is None:
+            return Entitlements(None, [], dict(DEFAULT_LIMITS))
+        features, limits = parse_features(row[1])
+        return Entitlements(row[0], features, limits)
+
+    def get(self, user_id: int) -> Entitlements:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        entitlements = self.load(user_id)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, entitlements)
+        return entitlements
+
+    def cached(self, user_id: int) -> Optional[Entitlements]:
+        entry = self._entries.get(user_id)
+        return entry[1] if entry is not None and entry[0] > time.monotonic() else None
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory, least recently used evicted past MAX_BUCKETS."""
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, window: float, cost: float = 1) -> Tuple[bool, float]:
+        """Takes `cost` tokens from a bucket refilled at capacity/window per second. Returns (allowed, retry_after)."""
+        if capacity <= 0:
+            return False, window
+        now = time.monotonic()
+        rate = capacity / window
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / rate
+
+
+def request_limits(path: str):
+    """Names of the limits charged by a request to `path`."""
+    if UNMETERED_PATHS.match(path):
+        return []
+    limits = ["requests_per_minute"]
+    if REPORT_PATHS.match(path):
+        limits.append("reports_per_day")
+    elif CHAT_PATHS.match(path):
+        limits.append("chat_per_minute")
+    return limits
+
+def _token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value.startswith(b"Bearer "):
+            return value[7:].decode("latin-1")
+    match = re.search(r"(?:^|&)token=([^&]+)", scope.get("query_string", b"").decode("latin-1"))
+    return match.group(1) if match else None
+
+def _user_id(token: str) -> Optional[int]:
+    user_id = token_cache.get(token)
+    if user_id is None:
+        payload = verify_token(token)
+        if not payload:
+            return None
+        user_id = payload["user_id"]
+        token_cache.put(token, user_id, payload["expires"])
+    return user_id
+
+def client_address(scope, trusted_proxies=frozenset()) -> str:
+    """
+    The caller's address. For connections from a trusted proxy, the right-most
+    X-Forwarded-For address that is not itself a trusted proxy.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if address not in trusted_proxies:
+        return address
+    forwarded = ",".join(v.decode("latin-1") for n, v in scope.get("headers", []) if n == b"x-forwarded-for")
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if hop not in trusted_proxies:
+            return hop
+    return address
+
+
+class QuotaMiddleware:
+    """ASGI middleware enforcing the caller's plan limits before the request reaches the app."""
+    def __init__(self, app, engine=None, store=None, entitlements: Optional[EntitlementCache] = None,
+                 enabled: bool = QUOTAS_ENABLED, trusted_proxies=TRUSTED_PROXIES):
+        self.app = app
+        self.store = store or MemoryBucketStore()
+        self.entitlements = entitlements or EntitlementCache(engine)
+        self.enabled = enabled
+        self.trusted_proxies = frozenset(trusted_proxies)
+
+    async def principal(self, scope) -> Tuple[str, Entitlements]:
+        token = _token(scope)
+        user_id = _user_id(token) if token else None
+        if user_id is not None:
+            entitlements = self.entitlements.cached(user_id)
+            if entitlements is None:
+                try:
+                    entitlements = await asyncio.to_thread(self.entitlements.get, user_id)
+                except Exception as e:
+                    print(f"Entitlement lookup failed for user {user_id}: {e}")
+                    entitlements = Entitlements(None, [], dict(DEFAULT_LIMITS))
+            return f"user:{user_id}", entitlements
+        return f"ip:{client_address(scope, self.trusted_proxies)}", ANONYMOUS
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limits = request_limits(scope["path"])
+        if not limits:
+            return await self.app(scope, receive, send)
+
+        key, entitlements = await self.principal(scope)
+        for name in limits:
+            capacity = entitlements.limits.get(name)
+            if capacity is None:
+                continue
+            allowed, retry_after = self.store.take(f"{key}:{name}", capacity, LIMIT_WINDOWS[name])
+            if not allowed:
+                return await self.reject(send, name, capacity, retry_after)
+        return await self.app(scope, receive, send)
+
+    async def reject(self, send, name: str, capacity: int, retry_after: float):
+        body = json.dumps({"detail": "Rate limit exceeded", "limit": name, "allowed": capacity}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,167 @@
+"""
+Re-derives the database from the raw-payload archive (data_ingestion/archive.py)
+instead of the network, e.g. after a fix to a connector parser,
+classify_indication or the nlp_utils extraction.
+
+Segments are parsed and transformed in parallel, one per worker process, and
+written in segment order (oldest first) so the newest payload of a record wins.
+Records are attached to products by the query they were fetched for.
+
+Usage:
+    python backend/reprocess_archive.py [--root raw_archive] [--source pubmed ...] [--workers 4]
+"""
+import sys
+import os
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, delete, update
+from sqlmodel import Session, SQLModel, select
+from backend.main import engine
+from backend.models import Product, ScientificArticle, ClinicalTrial, ProductSideEffect, ProductIndication
+from backend.ingestion import (
+    SOURCE_PUBMED, SOURCE_CLINICAL_TRIALS, SOURCE_OPENFDA,
+    ARTICLE_KEY, ARTICLE_UPDATE, TRIAL_KEY, TRIAL_UPDATE,
+    article_row, trial_row, bulk_upsert, bulk_insert, new_upsert_stats
+)
+from backend.seed_data import TARGET_DRUGS, transform_label
+from data_ingestion.archive import ARCHIVE_DIR, list_segments, iter_segment
+from data_ingestion.pubmed_connector import parse_article
+from data_ingestion.clinical_trials_connector import parse_study
+from data_ingestion.openfda_connector import parse_label
+
+MANUAL_INDICATIONS = {d["name"].lower(): d.get("indication") for d in TARGET_DRUGS}
+
+
+def transform_envelope(env):
+    """Parses one archived payload into a row (product_id filled in by the writer)."""
+    source, query, payload = env["source"], env["query"], env["payload"]
+    if source == SOURCE_PUBMED:
+        return article_row(None, parse_article(ET.fromstring(payload)))
+    if source == SOURCE_CLINICAL_TRIALS:
+        return trial_row(None, parse_study(payload))
+    if source == SOURCE_OPENFDA:
+        label = parse_label(payload, query)
+        description, category, disease, side_effects = transform_label(
+            query, MANUAL_INDICATIONS.get((query or "").lower()), label.abstract,
+            label.metadata.get("indications"), label.metadata.get("side_effects")
+        )
+        return {"description": description, "target_indication": category,
+                "disease": disease, "side_effects": side_effects}
+    return None
+
+def transform_segment(path):
+    """Worker: returns [(source, query, row)] for every payload of one segment."""
+    out = []
+    for env in iter_segment(path):
+        try:
+            row = transform_envelope(env)
+        except Exception as e:
+            print(f"  ! {env.get('source')} {env.get('id')}: {e}")
+            continue
+        if row is not None:
+            out.append((env["source"], (env.get("query") or "").lower(), row))
+    return path, out
+
+
+def write_segment(session, product_ids, items) -> dict:
+    """Bulk-writes one transformed segment. Records for unknown products are skipped."""
+    articles, trials, labels = [], [], {}
+    skipped = 0
+    for source, query, row in items:
+        pid = product_ids.get(query)
+        if pid is None:
+            skipped += 1
+            continue
+        if source == SOURCE_PUBMED:
+            articles.append(dict(row, product_id=pid))
+        elif source == SOURCE_CLINICAL_TRIALS:
+            trials.append(dict(row, product_id=pid))
+        elif source == SOURCE_OPENFDA:
+            labels[pid] = row  # Later label revisions win
+
+    # Re-derived fields overwrite what the previous parser produced; identical rows are skipped
+    stats = new_upsert_stats()
+    written = bulk_upsert(session, ScientificArticle, articles, ARTICLE_KEY, ARTICLE_UPDATE, stats=stats)
+    written += bulk_upsert(session, ClinicalTrial, trials, TRIAL_KEY, TRIAL_UPDATE, stats=stats)
+
+    if labels:
+        # Labels that re-derive to what is already stored are not rewritten
+        current = {pid: (desc, ind) for pid, desc, ind in session.exec(
+            select(Product.id, Product.description, Product.target_indication).where(Product.id.in_(list(labels)))
+        ).all()}
+        effects = {}
+        for pid, effect in session.exec(
+            select(ProductSideEffect.product_id, ProductSideEffect.effect)
+            .where(ProductSideEffect.product_id.in_(list(labels))).order_by(ProductSideEffect.id)
+        ).all():
+            effects.setdefault(pid, []).append(effect)
+        for pid in list(labels):
+            r = labels[pid]
+            if current.get(pid) == (r["description"], r["target_indication"]) and effects.get(pid, []) == r["side_effects"]:
+                del labels[pid]
+                stats["unchanged"] += 1
+
+    if labels:
+        products = Product.__table__
+        session.execute(
+            update(products).where(products.c.id == bindparam("pid")),
+            [{"pid": pid, "description": r["description"], "target_indication": r["target_indication"]}
+             for pid, r in labels.items()]
+        )
+        indications = ProductIndication.__table__
+        session.execute(
+            update(indications)
+            .where(indications.c.product_id == bindparam("pid"), indications.c.reference_title == "FDA Label")
+            .values(disease_name=bindparam("disease")),
+            [{"pid": pid, "disease": r["disease"]} for pid, r in labels.items()]
+        )
+        session.execute(delete(ProductSideEffect).where(ProductSideEffect.product_id.in_(list(labels))))
+        written += bulk_insert(session, ProductSideEffect, [
+            {"product_id": pid, "effect": se} for pid, r in labels.items() for se in r["side_effects"]
+        ])
+        written += len(labels)
+
+    session.commit()
+    return {"written": written, "skipped": skipped, "unchanged": stats["unchanged"]}
+
+def reprocess_archive(root=ARCHIVE_DIR, sources=None, workers=None):
+    SQLModel.metadata.create_all(engine)
+    segments = list_segments(root, sources)
+    if not segments:
+        print(f"No archive segments found under {root}.")
+        return
+
+    print(f"♻️ Reprocessing {len(segments)} archive segments...")
+    started = time.perf_counter()
+    totals = {"records": 0, "written": 0, "unchanged": 0, "skipped": 0}
+    with Session(engine) as session:
+        product_ids = {name.lower(): pid for pid, name in session.exec(select(Product.id, Product.name)).all()}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() keeps segment order so newer payloads are written last
+            for path, items in pool.map(transform_segment, segments):
+                stats = write_segment(session, product_ids, items)
+                totals["records"] += len(items)
+                totals["written"] += stats["written"]
+                totals["unchanged"] += stats["unchanged"]
+                totals["skipped"] += stats["skipped"]
+                elapsed = time.perf_counter() - started
+                print(f"  > {os.path.basename(path)}: {len(items)} records ({totals['records'] / elapsed:.0f} records/s)")
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Reprocessed {totals['records']} records in {elapsed:.1f}s: "
+          f"{totals['written']} rows written, {totals['unchanged']} unchanged, "
+          f"{totals['skipped']} for products not in the catalogue")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild records from the raw-payload archive.")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help="Archive directory")
+    parser.add_argument("--source", action="append", dest="sources", help="Only these sources (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Transform processes (default: CPU count)")
+    args = parser.parse_args()
+    reprocess_archive(args.root, args.sources, args.workers)
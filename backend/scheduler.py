@@ -0,0 +1,256 @@
+"""
+Background refresh scheduler for the whole catalogue.
+
+Keeps one RefreshJob row per (product, source) and periodically runs the
+due ones through `refresh_product_source`, so sources are polled on a fixed
+cadence instead of from user requests or manual re-seeds.
+
+- Products with alert subscriptions are refreshed more often and first.
+- New jobs are spread over the first interval and every reschedule is
+  jittered, so the catalogue never hits a source all at once.
+- Job creation and picking are single SQL statements (anti-join INSERT ...
+  SELECT; ORDER BY subscribed, next_run_at LIMIT n), whatever the catalogue size.
+- Claimed jobs run on REFRESH_WORKERS threads; http_client's per-host rate
+  limits keep each source within its published limit. A full batch is
+  followed by another tick straight away, so a backlog drains at the rate
+  the sources allow.
+- Alert digests that are due are sent after each tick.
+- Jobs are claimed with a conditional UPDATE, so several processes can run
+  the scheduler against the same database safely.
+
+Runs standalone as a sidecar:
+    python -m backend.scheduler
+or inside the API process (started from the app lifespan) with
+REFRESH_SCHEDULER=on. It is off by default there, so API workers and
+dev/test runs make no network calls of their own.
+"""
+
+import os
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update, insert, literal, func, exists, and_
+from sqlmodel import Session, select
+
+from data_ingestion import metrics
+from .models import Product, AlertSubscription, RefreshJob
+from .alerts import dispatch_alerts
+from .digests import send_due_digests
+from .ingestion import (
+    SOURCE_PUBMED, SOURCE_CLINICAL_TRIALS, SOURCE_OPENFDA, WATERMARKED_SOURCES,
+    refresh_product_source, track_run
+)
+
+# Scheduler settings
+SCHEDULER_ENABLED = os.environ.get("REFRESH_SCHEDULER", "off").lower() in ("on", "1", "true")
+TICK_SECONDS = int(os.environ.get("REFRESH_TICK_SECONDS", "60"))
+JOBS_PER_TICK = int(os.environ.get("REFRESH_JOBS_PER_TICK", "200"))
+WORKERS = int(os.environ.get("REFRESH_WORKERS", "8"))
+JITTER = float(os.environ.get("REFRESH_JITTER", "0.1"))  # +/- fraction of the interval
+SUBSCRIBED_SPEEDUP = float(os.environ.get("REFRESH_SUBSCRIBED_SPEEDUP", "4"))
+RETRY_AFTER = timedelta(minutes=int(os.environ.get("REFRESH_RETRY_MINUTES", "30")))
+
+# Base interval per source (hours)
+REFRESH_INTERVALS = {
+    SOURCE_PUBMED: timedelta(hours=float(os.environ.get("REFRESH_INTERVAL_PUBMED_HOURS", "24"))),
+    SOURCE_CLINICAL_TRIALS: timedelta(hours=float(os.environ.get("REFRESH_INTERVAL_CLINICAL_TRIALS_HOURS", "24"))),
+    SOURCE_OPENFDA: timedelta(hours=float(os.environ.get("REFRESH_INTERVAL_OPENFDA_HOURS", "168"))),
+}
+
+
+def default_connectors() -> Dict:
+    from data_ingestion.pubmed_connector import PubMedConnector
+    from data_ingestion.clinical_trials_connector import ClinicalTrialsConnector
+    from data_ingestion.openfda_connector import OpenFDAConnector
+    return {
+        SOURCE_PUBMED: PubMedConnector(),
+        SOURCE_CLINICAL_TRIALS: ClinicalTrialsConnector(),
+        SOURCE_OPENFDA: OpenFDAConnector(),
+    }
+
+
+class RefreshScheduler:
+    def __init__(self, engine, connectors: Optional[Dict] = None, tick_seconds: int = TICK_SECONDS,
+                 jobs_per_tick: int = JOBS_PER_TICK, intervals: Optional[Dict] = None, workers: int = WORKERS):
+        self.engine = engine
+        self.connectors = connectors
+        self.tick_seconds = tick_seconds
+        self.jobs_per_tick = jobs_per_tick
+        self.workers = workers
+        self.intervals = intervals or REFRESH_INTERVALS
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------------
+    # Scheduling
+    # ---------------------
+
+    def interval(self, source: str, subscribed: bool) -> timedelta:
+        base = self.intervals[source]
+        return base / SUBSCRIBED_SPEEDUP if subscribed else base
+
+    def next_run(self, now: datetime, source: str, subscribed: bool) -> datetime:
+        interval = self.interval(source, subscribed)
+        return now + interval * (1 + random.uniform(-JITTER, JITTER))
+
+    def is_subscribed(self, product_id):
+        """SQL condition: the product has at least one alert subscription."""
+        return exists().where(AlertSubscription.product_id == product_id)
+
+    def _spread(self, session: Session, now: datetime, interval: timedelta):
+        """SQL expression: `now` plus a random fraction of `interval`, evaluated per row."""
+        seconds = max(int(interval.total_seconds()), 1)
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            offset = func.printf("+%d seconds", func.abs(func.random()) % seconds)
+            return func.datetime(literal(now.strftime("%Y-%m-%d %H:%M:%S")), offset)
+        if dialect == "postgresql":
+            return literal(now) + func.random() * literal(timedelta(seconds=seconds))
+        raise NotImplementedError(f"RefreshScheduler does not support {dialect}")
+
+    def sync_jobs(self, session: Session, now: datetime) -> int:
+        """
+        Creates jobs for new products, spread uniformly over their first interval.
+        One INSERT ... SELECT per (source, subscribed) over the products without a job.
+        """
+        created = 0
+        for source in WATERMARKED_SOURCES:
+            for subscribed in (True, False):
+                condition = self.is_subscribed(Product.id)
+                missing = select(Product.id, literal(source), self._spread(session, now, self.interval(source, subscribed))).where(
+                    condition if subscribed else ~condition,
+                    ~exists().where(and_(RefreshJob.product_id == Product.id, RefreshJob.source == source)),
+                )
+                result = session.execute(
+                    insert(RefreshJob).from_select(["product_id", "source", "next_run_at"], missing)
+                )
+                created += max(result.rowcount, 0)
+        session.commit()
+        return created
+
+    def due_jobs(self, session: Session, now: datetime) -> List[Tuple[int, int, datetime, bool]]:
+        """
+        (job id, product id, next_run_at, subscribed) for the due jobs, subscribed
+        products first, then most overdue first. Plain values, not ORM objects:
+        they must not be reloaded after another worker moved the job.
+        """
+        subscribed = self.is_subscribed(RefreshJob.product_id).label("subscribed")
+        return session.exec(
+            select(RefreshJob.id, RefreshJob.product_id, RefreshJob.next_run_at, subscribed)
+            .where(RefreshJob.next_run_at <= now)
+            .order_by(subscribed.desc(), RefreshJob.next_run_at).limit(self.jobs_per_tick)
+        ).all()
+
+    def claim(self, session: Session, job_id: int, seen: datetime, until: datetime) -> bool:
+        """
+        Pushes next_run_at forward only if it is still the `seen` value read by
+        due_jobs, i.e. nobody else claimed the run, so each run happens once.
+        """
+        result = session.execute(
+            update(RefreshJob)
+            .where(RefreshJob.id == job_id, RefreshJob.next_run_at == seen)
+            .values(next_run_at=until)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    # ---------------------
+    # Execution
+    # ---------------------
+
+    def run_job(self, job_id: int, subscribed: bool) -> Optional[Dict]:
+        with Session(self.engine) as session:
+            job = session.get(RefreshJob, job_id)
+            product = session.get(Product, job.product_id)
+            if not product:
+                session.delete(job)
+                session.commit()
+                return None
+
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            stats = None
+            try:
+                stats = refresh_product_source(session, product, job.source, self.connectors[job.source])
+                session.commit()
+                job.last_status = "ok"
+                job.last_error = None
+                job.next_run_at = self.next_run(now, job.source, subscribed)
+            except Exception as e:
+                session.rollback()
+                print(f"Refresh of {product.name} [{job.source}] failed: {e}")
+                metrics.record_error(job.source, f"{product.name}: {e}")
+                job.last_status = "error"
+                job.last_error = str(e)[:500]
+                job.next_run_at = now + RETRY_AFTER
+            job.last_run_at = now
+            job.last_duration_ms = int((time.perf_counter() - started) * 1000)
+            job.runs += 1
+            session.add(job)
+            session.commit()
+            return stats
+
+    def tick(self) -> int:
+        """Runs the jobs due now. Blocking; called from a worker thread."""
+        if self.connectors is None:
+            self.connectors = default_connectors()
+        now = datetime.utcnow()
+        with Session(self.engine) as session:
+            self.sync_jobs(session, now)
+            due = self.due_jobs(session, now)
+            # Lease long enough that a crashed run is retried, not lost
+            claimed = [(job_id, subscribed) for job_id, _, seen, subscribed in due
+                       if self.claim(session, job_id, seen, now + RETRY_AFTER)]
+
+        if not claimed:
+            return 0
+        # Ticks that ran jobs are recorded as ingestion runs
+        with track_run(self.engine, "scheduler"):
+            if self.workers > 1:
+                run = metrics.current_run()
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh") as pool:
+                    # Workers report into the tick's ingestion run
+                    list(pool.map(lambda job: metrics.run_in(run, self.run_job, *job), claimed))
+            else:
+                for job_id, subscribed in claimed:
+                    self.run_job(job_id, subscribed)
+        dispatch_alerts(self.engine)
+        return len(claimed)
+
+    async def run_forever(self):
+        print(f"⏱️ Refresh scheduler started (tick {self.tick_seconds}s, {self.workers} workers)")
+        while True:
+            ran = 0
+            try:
+                ran = await asyncio.to_thread(self.tick)
+                if ran:
+                    print(f"⏱️ Refresh scheduler ran {ran} jobs")
+                await asyncio.to_thread(send_due_digests, self.engine)
+            except Exception as e:
+                print(f"Refresh scheduler tick failed: {e}")
+            # A full batch means more is due: keep going instead of waiting a tick
+            if ran < self.jobs_per_tick:
+                await asyncio.sleep(self.tick_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+if __name__ == "__main__":
+    from sqlmodel import SQLModel
+    from .main import engine
+    SQLModel.metadata.create_all(engine)
+    asyncio.run(RefreshScheduler(engine).run_forever())
@@ -1,17 +1,19 @@
 import sys
 import os
+import time
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import Session, SQLModel, create_engine, select
 from backend.models import (
     Product, Patent, ScientificArticle, ClinicalTrial, Conference, 
     ProductSideEffect, ProductSynthesis, ProductMilestone, 
     ProductIndication, ProductPharmacokinetics, ProductExperimentalModel,
-    ProductPharmacodynamics, ProductSynthesisScheme
+    ProductPharmacodynamics, ProductSynthesisScheme, CompoundProperty, ProductSynonym, IngestionRun
 )
 from data_ingestion.pubmed_connector import PubMedConnector
 from data_ingestion.clinical_trials_connector import ClinicalTrialsConnector
@@ -19,9 +21,20 @@ from data_ingestion.openfda_connector import OpenFDAConnector
 from data_ingestion.patent_connector import PatentConnector
 from data_ingestion.conference_connector import ConferenceConnector
 from data_ingestion.pubchem_connector import PubChemConnector
+from data_ingestion import metrics
+from backend.nlp_utils import parse_label_side_effects
+from backend.matching import synonym_rows
+from backend.alerts import dispatch_alerts
+from backend.ingestion import (
+    SOURCE_PUBMED, SOURCE_CLINICAL_TRIALS, SOURCE_OPENFDA, WATERMARKED_SOURCES,
+    ARTICLE_KEY, TRIAL_KEY, PATENT_KEY, SYNONYM_KEY, CONFERENCE_KEY,
+    advance_watermark, bulk_upsert, lookup_compound_properties, refresh_product_source, track_run,
+    trial_row, article_row, patent_row, conference_row
+)
 
 sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///backend/{sqlite_file_name}"
+# SEED_DATABASE_URL lets benchmarks seed a scratch database
+sqlite_url = os.environ.get("SEED_DATABASE_URL", f"sqlite:///backend/{sqlite_file_name}")
 engine = create_engine(sqlite_url)
 
 TARGET_DRUGS = [
@@ -279,97 +292,73 @@ def generate_science_data(session, product_id, indication, name):
         source_url="https://pubchem.ncbi.nlm.nih.gov/"
     ))
 
-async def seed():
-    # Reset DB
-    db_path = f"backend/{sqlite_file_name}"
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        print("Removed existing database.")
-    
-    SQLModel.metadata.create_all(engine)
-    
-    # Initialize Connectors
-    fda = OpenFDAConnector()
-    ct = ClinicalTrialsConnector()
-    pubmed = PubMedConnector()
-    patents = PatentConnector() # Mock
-    confs = ConferenceConnector() # Mock
-    pubchem = PubChemConnector()
-    
-    # --- PHASE 1: DISCOVERY ---
-    print("🌍 Discovering top drugs from OpenFDA...")
-    # Get top 80 drugs to expand catalog approx 100 total
-    discovered_names = fda.discover_top_drugs(limit=80)
+# =====================
+# Seeding Pipeline
+# =====================
+# fetch (concurrent across products and sources, bounded) ->
+# transform (CPU-bound, process pool) -> write (single writer, batched commits)
+
+SEED_MAX_REQUESTS = int(os.environ.get("SEED_MAX_REQUESTS", "16")) # HTTP calls in flight
+SEED_BATCH_SIZE = int(os.environ.get("SEED_BATCH_SIZE", "25")) # products per commit
+
+async def fetch_drug(drug, connectors, limiter):
+    """Fetch stage: queries every source for one drug concurrently."""
+    name = drug["name"]
+
+    async def call(fn):
+        async with limiter:
+            return await asyncio.to_thread(fn, name)
+
+    label_data, trials, articles, pats, conf_data = await asyncio.gather(
+        call(connectors["fda"].search),
+        call(connectors["ct"].search),
+        call(connectors["pubmed"].search),
+        call(connectors["patents"].search),
+        call(connectors["confs"].search),
+    )
+    for source, records in [(SOURCE_OPENFDA, label_data), (SOURCE_CLINICAL_TRIALS, trials), (SOURCE_PUBMED, articles),
+                            ("patents", pats), ("conferences", conf_data)]:
+        metrics.count(source, fetched=len(records))
+    return {
+        "drug": drug, "label_data": label_data, "trials": trials, "articles": articles,
+        "patents": pats, "conferences": conf_data
+    }
+
+def transform_label(name, manual_indication, label_abstract, raw_indications, raw_se):
+    """
+    Transform stage (runs in a worker process): indication classification and
+    side-effect extraction from the FDA label text.
+    Returns (description, target_category, specific_disease, side_effects).
+    """
+    description = label_abstract or "Description not available."
+    indications = []
+    side_effects = []
     
-    # Create a set of existing target names to avoid duplicates
-    existing_names = {d["name"].lower() for d in TARGET_DRUGS}
+    if raw_indications:
+        # Simple heuristic split or use raw
+        indications.append({"disease": "Approved Indication", "status": "Approved"})
+    if raw_se:
+        side_effects = parse_label_side_effects(raw_se) # Top 8
     
-    final_drug_list = list(TARGET_DRUGS)
+    # 1. Manual override from TARGET_DRUGS
+    if manual_indication:
+        return description, manual_indication, manual_indication, side_effects
     
-    print(f"  > Found {len(discovered_names)} candidates.")
-    for d_name in discovered_names:
-        # Simple cleanup
-        clean_name = d_name.title()
-        if clean_name.lower() not in existing_names:
-            final_drug_list.append({"name": clean_name})
-            existing_names.add(clean_name.lower())
-            
-    print(f"🚀 Starting seeding for {len(final_drug_list)} total products...\n")
+    # 2. Heuristic Classification
+    context_text = description + " " + " ".join([ind.get("disease", "") for ind in indications])
+    target_category, specific_disease = classify_indication(context_text, name)
+    return description, target_category, specific_disease, side_effects
 
+def write_batch(items) -> int:
+    """Write stage: persists a batch of transformed products in one transaction."""
+    written = 0
     with Session(engine) as session:
-        for drug in final_drug_list:
+        for item in items:
+            drug = item["drug"]
             name = drug["name"]
-            print(f"--- Processing {name} ---")
-            
-            # 1. Fetch Label Data (OpenFDA)
-            print("  > Fetching FDA Label...")
-            label_data = fda.search(name)
-            
-            description = "Description not available."
-            indications = []
-            side_effects = []
-            
-            if label_data:
-                record = label_data[0]
-                description = record.abstract
-                
-                # Parse indications
-                if "indications" in record.metadata:
-                    raw_ind = record.metadata["indications"]
-                    # Simple heuristic split or use raw
-                    indications.append({"disease": "Approved Indication", "status": "Approved", "ref": record.url})
-                
-                # Parse side effects
-                if "side_effects" in record.metadata:
-                    raw_se = record.metadata["side_effects"]
-                    # Improve Parsing
-                    import re
-                    # Remove common intro phrases
-                    cleaned_se = re.split(r'(?:include|are|:|The most common)', raw_se, flags=re.IGNORECASE)[-1]
-                    # Split by common delimiters
-                    candidates = re.split(r'[,;\.]', cleaned_se)
-                    # Filter and clean
-                    side_effects = []
-                    for c in candidates:
-                        clean_c = c.strip()
-                        if 3 < len(clean_c) < 50 and "adverse" not in clean_c.lower() and "reported" not in clean_c.lower():
-                            side_effects.append(clean_c)
-                    
-                    side_effects = side_effects[:8] # Take top 8
+            label_data = item["label_data"]
+            description, target_category, specific_disease, side_effects = item["transformed"]
             
-            # Determine Indication Strategy
-            target_category = "General Medicine"
-            specific_disease = "General Indication"
-            
-            # 1. Manual override from TARGET_DRUGS
-            if drug.get("indication"):
-                 target_category = drug.get("indication")
-                 specific_disease = drug.get("indication")
-            else:
-                # 2. Heuristic Classification
-                context_text = description + " " + " ".join([ind.get("disease", "") for ind in indications])
-                target_category, specific_disease = classify_indication(context_text, name)
-
             # Create Product
             product = Product(
                 name=name,
@@ -379,67 +368,27 @@ async def seed():
                 moa_video_url=drug.get("video")
             )
             session.add(product)
-            session.commit()
-            session.refresh(product)
+            session.flush()
             
-            # 2. Clinical Trials
-            print("  > Fetching Clinical Trials...")
-            trials = ct.search(name)
-            for t in trials:
-                session.add(ClinicalTrial(
-                    product_id=product.id,
-                    nct_id=t.source_id,
-                    title=t.title,
-                    status=t.metadata.get("status", "Unknown"),
-                    phase=t.metadata.get("phase", ["N/A"])[0] if isinstance(t.metadata.get("phase"), list) else "N/A",
-                    start_date=datetime.now(), # Placeholder as API v2 might not give simple start date in list
-                    url=t.url
-                ))
-                
-            # 3. PubMed Articles
-            print("  > Fetching Scientific Articles...")
-            articles = pubmed.search(name)
-            for a in articles:
-                session.add(ScientificArticle(
-                    product_id=product.id,
-                    doi=a.source_id,
-                    title=a.title,
-                    abstract=a.abstract,
-                    authors=", ".join(a.authors),
-                    publication_date=a.publication_date,
-                    url=a.url
-                ))
-                
-            # 4. Patents (Mock)
-            print("  > Adding Patents...")
-            pats = patents.search(name)
-            for p in pats:
-                session.add(Patent(
-                    product_id=product.id,
-                    source_id=p.source_id,
-                    title=p.title,
-                    abstract=p.abstract,
-                    assignee=p.metadata.get("assignee"),
-                    status=p.metadata.get("status"),
-                    publication_date=p.publication_date,
-                    url=p.url,
-                    patent_type="Product"
-                ))
+            # Names the bulk loaders match source records against
+            label_meta = label_data[0].metadata if label_data else {}
+            bulk_upsert(session, ProductSynonym, synonym_rows(
+                product.id, [name, drug.get("generic"), label_meta.get("brand_name"), label_meta.get("generic_name")], "seed"
+            ), SYNONYM_KEY)
 
-            # 5. Conferences (Mock)
-            print("  > Adding Conferences...")
-            conf_data = confs.search(name)
-            for c in conf_data:
-                session.add(Conference(
-                    product_id=product.id,
-                    title=c.title,
-                    abstract=c.abstract,
-                    conference_name=c.metadata.get("conference_name"),
-                    date=c.publication_date,
-                    url=c.url
-                ))
+            # Clinical Trials, PubMed Articles, Patents (Mock)
+            written += bulk_upsert(session, ClinicalTrial, [trial_row(product.id, t) for t in item["trials"]], TRIAL_KEY,
+                                   stats=metrics.source_stats(SOURCE_CLINICAL_TRIALS))
+            written += bulk_upsert(session, ScientificArticle, [article_row(product.id, a) for a in item["articles"]], ARTICLE_KEY,
+                                   stats=metrics.source_stats(SOURCE_PUBMED))
+            written += bulk_upsert(session, Patent, [patent_row(product.id, p) for p in item["patents"]], PATENT_KEY,
+                                   stats=metrics.source_stats("patents"))
+
+            # Conferences (local abstract dumps)
+            written += bulk_upsert(session, Conference, [conference_row(product.id, c) for c in item["conferences"]], CONFERENCE_KEY,
+                                   stats=metrics.source_stats("conferences"))
                 
-            # 6. Indications (Real-ish)
+            # Indications (Real-ish)
             if label_data:
                 session.add(ProductIndication(
                     product_id=product.id,
@@ -449,47 +398,208 @@ async def seed():
                     reference_title="FDA Label"
                 ))
             
-            # 7. Real Side Effects (Persist extracted lists)
-            if side_effects:
-                print(f"  > Adding {len(side_effects)} Side Effects...")
-                for se in side_effects:
-                    session.add(ProductSideEffect(
-                        product_id=product.id,
-                        effect=se
-                    ))
-
-            # 8. Chemical Properties from PubChem
-            print("  > Fetching PubChem Data...")
-            pc_data = pubchem.get_compound_properties(name)
-            
+            # Real Side Effects (Persist extracted lists)
+            for se in side_effects:
+                session.add(ProductSideEffect(
+                    product_id=product.id,
+                    effect=se
+                ))
+
+            # Chemical Properties from PubChem
+            pc_data = item["pubchem"]
             if pc_data:
-                # Add Molecular Weight
+                smiles = pc_data.get("CanonicalSMILES", "N/A")
                 session.add(ProductPharmacokinetics(
                     product_id=product.id,
                     parameter="Molecular Weight",
                     value=pc_data.get("MolecularWeight", "N/A"),
                     unit="g/mol"
                 ))
-                # Add Molecular Formula
                 session.add(ProductPharmacokinetics(
                     product_id=product.id,
                     parameter="Molecular Formula",
                     value=pc_data.get("MolecularFormula", "N/A")
                 ))
-                # Add SMILES
                 session.add(ProductPharmacokinetics(
                     product_id=product.id,
                     parameter="Canonical SMILES",
-                    value=pc_data.get("CanonicalSMILES", "N/A")[:100] + "..." if len(pc_data.get("CanonicalSMILES", "N/A")) > 100 else pc_data.get("CanonicalSMILES", "N/A")
+                    value=smiles[:100] + "..." if len(smiles) > 100 else smiles
                 ))
 
-            
-            # 9. Generate Additional Scientific Data (Models, PD, Synthesis, ADME completion)
+            # Generate Additional Scientific Data (Models, PD, Synthesis, ADME completion)
             generate_science_data(session, product.id, product.target_indication, name)
 
-            session.commit()
+            # Record watermarks so later refreshes only fetch what is new
+            advance_watermark(session, product.id, SOURCE_OPENFDA, [r.updated_at for r in label_data])
+            advance_watermark(session, product.id, SOURCE_CLINICAL_TRIALS, [t.updated_at for t in item["trials"]])
+            advance_watermark(session, product.id, SOURCE_PUBMED, [a.updated_at for a in item["articles"]])
+
+        session.commit()
+    return written
+
+async def writer(queue, total):
+    """Single writer: drains the queue and commits every SEED_BATCH_SIZE products."""
+    started = time.perf_counter()
+    batch = []
+    done = 0
+    records = 0
+    
+    async def flush():
+        nonlocal batch, done, records
+        with metrics.stage("write"):
+            records += await asyncio.to_thread(write_batch, batch)
+        done += len(batch)
+        batch = []
+        elapsed = time.perf_counter() - started
+        print(f"  > {done}/{total} products written "
+              f"({done / elapsed:.1f} products/s, {records / elapsed:.1f} records/s)")
+    
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        batch.append(item)
+        if len(batch) >= SEED_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return done, records
+
+async def seed():
+    with track_run(engine, "seed"):
+        await seed_catalogue()
+
+async def seed_catalogue():
+    # Reset DB, keeping the PubChem property cache and the ingestion run history across re-seeds
+    SQLModel.metadata.drop_all(engine, tables=[
+        t for t in SQLModel.metadata.sorted_tables
+        if t.name not in (CompoundProperty.__tablename__, IngestionRun.__tablename__)
+    ])
+    print("Reset existing database.")
+    
+    SQLModel.metadata.create_all(engine)
+    
+    # Initialize Connectors
+    connectors = {
+        "fda": OpenFDAConnector(),
+        "ct": ClinicalTrialsConnector(),
+        "pubmed": PubMedConnector(),
+        "patents": PatentConnector(), # Mock
+        "confs": ConferenceConnector(), # Local abstract exports (CONFERENCE_DUMP_DIR), else none
+        "pubchem": PubChemConnector(),
+    }
+    
+    # --- PHASE 1: DISCOVERY ---
+    print("🌍 Discovering top drugs from OpenFDA...")
+    # Get top 80 drugs to expand catalog approx 100 total
+    with metrics.stage("discovery"):
+        discovered_names = connectors["fda"].discover_top_drugs(limit=80)
+    
+    # Create a set of existing target names to avoid duplicates
+    existing_names = {d["name"].lower() for d in TARGET_DRUGS}
+    
+    final_drug_list = list(TARGET_DRUGS)
+    
+    print(f"  > Found {len(discovered_names)} candidates.")
+    for d_name in discovered_names:
+        # Simple cleanup
+        clean_name = d_name.title()
+        if clean_name.lower() not in existing_names:
+            final_drug_list.append({"name": clean_name})
+            existing_names.add(clean_name.lower())
             
-    print("\n✅ Real data seeding complete!")
+    print(f"🚀 Starting seeding for {len(final_drug_list)} total products...\n")
+
+    # Chemical properties for the whole list in a few batched, cached PubChem calls
+    print("🧪 Looking up PubChem properties...")
+    with Session(engine) as session, metrics.stage("pubchem"):
+        compound_props = lookup_compound_properties(session, [d["name"] for d in final_drug_list], connectors["pubchem"])
+        session.commit()
+    print(f"  > {sum(1 for p in compound_props.values() if p)} compounds with properties.")
+    
+    # --- PHASE 2: FETCH -> TRANSFORM -> WRITE ---
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    limiter = asyncio.Semaphore(SEED_MAX_REQUESTS)
+    # Bounded queue: fetchers pause when the writer falls behind
+    queue = asyncio.Queue(maxsize=SEED_BATCH_SIZE * 2)
+    
+    with ProcessPoolExecutor() as pool:
+        async def produce(drug):
+            try:
+                with metrics.stage("fetch"):
+                    item = await fetch_drug(drug, connectors, limiter)
+                item["pubchem"] = compound_props.get(drug["name"])
+                label = item["label_data"][0] if item["label_data"] else None
+                with metrics.stage("transform"):
+                    item["transformed"] = await loop.run_in_executor(
+                        pool, transform_label,
+                        drug["name"], drug.get("indication"),
+                        label.abstract if label else None,
+                        label.metadata.get("indications") if label else None,
+                        label.metadata.get("side_effects") if label else None
+                    )
+                await queue.put(item)
+            except Exception as e:
+                print(f"  ! Skipping {drug['name']}: {e}")
+                metrics.record_error("seed", f"{drug['name']}: {e}")
+        
+        writer_task = asyncio.create_task(writer(queue, len(final_drug_list)))
+        await asyncio.gather(*(produce(drug) for drug in final_drug_list))
+        await queue.put(None)
+        done, records = await writer_task
+    
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Real data seeding complete! {done} products, {records} records in {elapsed:.1f}s")
+
+async def refresh_catalogue(connectors=None):
+    """
+    Incremental refresh of every product already in the database.
+    Each source is only asked for records changed since the product's watermark.
+    A failing (product, source) is logged and skipped; the run is then stored
+    as failed. Returns the refreshes that failed.
+    """
+    SQLModel.metadata.create_all(engine)
+    connectors = connectors or {
+        SOURCE_OPENFDA: OpenFDAConnector(),
+        SOURCE_CLINICAL_TRIALS: ClinicalTrialsConnector(),
+        SOURCE_PUBMED: PubMedConnector(),
+    }
+    
+    failed = []
+    try:
+        with track_run(engine, "refresh"), Session(engine) as session:
+            products = session.exec(select(Product)).all()
+            print(f"🔄 Refreshing {len(products)} products...")
+            for product in products:
+                name = product.name
+                for source in WATERMARKED_SOURCES:
+                    # One failing product or source must not stop the rest of the refresh
+                    try:
+                        stats = refresh_product_source(session, product, source, connectors[source])
+                        session.commit()
+                    except Exception as e:
+                        session.rollback()
+                        print(f"  > {name} [{source}] failed: {e}")
+                        metrics.record_error(source, f"{name}: {e}")
+                        failed.append(f"{name} [{source}]")
+                        continue
+                    print(f"  > {name} [{source}] since {stats['since'] or 'beginning'}: "
+                          f"{stats['fetched']} fetched, {stats['written']} written, {stats['unchanged']} unchanged")
+            if failed:
+                # Stored as a failed run; everything else was refreshed and committed
+                raise RuntimeError(f"{len(failed)} refreshes failed: {', '.join(failed[:20])}")
+    except RuntimeError as e:
+        print(f"\n⚠️ {e}")
+    finally:
+        dispatch_alerts(engine)
+
+    if not failed:
+        print("\n✅ Incremental refresh complete!")
+    return failed
 
 if __name__ == "__main__":
-    asyncio.run(seed())
+    if "--refresh" in sys.argv:
+        asyncio.run(refresh_catalogue())
+    else:
+        asyncio.run(seed())
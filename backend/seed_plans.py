@@ -16,19 +16,28 @@ def seed_plans():
             SubscriptionPlan(
                 name="Free Tier",
                 price_monthly=0.0,
-                features=json.dumps(["basic_search", "view_products"]),
+                features=json.dumps({
+                    "features": ["basic_search", "view_products"],
+                    "limits": {"requests_per_minute": 120, "reports_per_day": 3, "chat_per_minute": 5}
+                }),
                 stripe_price_id="price_free_test"
             ),
             SubscriptionPlan(
                 name="Professional Analyst",
                 price_monthly=49.99,
-                features=json.dumps(["predictor", "patent_reports", "combination_lab"]),
+                features=json.dumps({
+                    "features": ["predictor", "patent_reports", "combination_lab"],
+                    "limits": {"requests_per_minute": 600, "reports_per_day": 50, "chat_per_minute": 20}
+                }),
                 stripe_price_id="price_pro_test"
             ),
             SubscriptionPlan(
                 name="Enterprise",
                 price_monthly=299.00,
-                features=json.dumps(["all_features", "api_access", "dedicated_support"]),
+                features=json.dumps({
+                    "features": ["all_features", "api_access", "dedicated_support"],
+                    "limits": {"requests_per_minute": 3000, "reports_per_day": None, "chat_per_minute": 60}
+                }),
                 stripe_price_id="price_enterprise_test"
             )
         ]
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+from backend import main
+from backend.models import Product, ScientificArticle
+
+def test_single_flight_refresh():
+    print("Testing coalesced article refresh...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Product(name="TestMab"))
+        session.commit()
+
+    calls = []
+    async def fake_fetch(keyword, max_results=5, mindate=None):
+        calls.append(keyword)
+        await asyncio.sleep(0.05)  # Keep the fetch in flight while the others arrive
+        return [{"title": "A paper", "doi": "N/A", "source_id": "123", "authors": "Doe J",
+                 "desc": "", "url": "https://pubmed.ncbi.nlm.nih.gov/123/", "date": "2024 Jan"}]
+
+    original_engine, original_fetch = main.engine, main.fetch_pubmed_articles
+    main.engine, main.fetch_pubmed_articles = engine, fake_fetch
+    try:
+        async def click(n):
+            sessions = [Session(engine) for _ in range(n)]
+            results = await asyncio.gather(*[main.refresh_product_articles(1, s) for s in sessions])
+            for s in sessions:
+                s.close()
+            return results
+
+        results = asyncio.run(click(5))
+        # Five simultaneous clicks, one PubMed round-trip, one shared result
+        assert calls == ["TestMab"]
+        assert all(r["articles_added"] == 1 for r in results)
+
+        # Within the TTL the endpoint answers without refetching
+        again = asyncio.run(click(1))[0]
+        assert calls == ["TestMab"] and again["articles_added"] == 0 and "refreshed_at" in again
+
+        with Session(engine) as session:
+            assert len(session.exec(select(ScientificArticle)).all()) == 1
+    finally:
+        main.engine, main.fetch_pubmed_articles = original_engine, original_fetch
+
+    print("Single-flight refresh test passed!")
+
+if __name__ == "__main__":
+    test_single_flight_refresh()
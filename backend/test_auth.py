@@ -0,0 +1,177 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import asyncio
+import hashlib
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from fastapi import HTTPException
+from sqlmodel import Session, SQLModel, create_engine
+from backend import main, auth
+from backend.auth import create_token, token_cache, hash_password, verify_password, needs_rehash
+from backend.models import Product, User, AlertSubscription
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+def test_cached_user_lookup():
+    print("Testing cached token verification...")
+    engine = make_engine()
+    with Session(engine) as session:
+        session.add(User(username="ana", email="ana@b.c", password_hash="x"))
+        session.add(User(username="root", email="root@b.c", password_hash="x", is_admin=True))
+        for name in ["Alpha", "Beta", "Gamma"]:
+            session.add(Product(name=name))
+        session.commit()
+        session.add(AlertSubscription(user_id=1, product_id=2))
+        session.commit()
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    token_cache.clear()
+    header = f"Bearer {create_token(1, 'ana')}"
+
+    with Session(engine) as session:
+        assert main.get_current_user(header, session).username == "ana"
+    assert len(queries) == 1
+
+    # Cached: no HMAC, only the primary-key load of the user
+    queries.clear()
+    with Session(engine) as session:
+        user = main.get_current_user(header, session)
+        assert user.username == "ana" and user.is_active
+        assert len(queries) == 1
+        # One query answers the batched subscription check
+        result = main.check_subscriptions([1, 2, 3], user, session)
+        assert result == {"subscribed": {1: False, 2: True, 3: False}} and len(queries) == 2
+
+    # A change made elsewhere (another worker) is seen on the next request
+    with Session(engine) as session:
+        session.get(User, 1).totp_secret = "SECRET"
+        session.commit()
+    with Session(engine) as session:
+        assert main.get_current_user(header, session).totp_secret == "SECRET"
+
+    # Deactivation locks the token out even while it is cached
+    with Session(engine) as session:
+        session.get(User, 1).is_active = False
+        session.commit()
+    assert token_cache.get(header[len("Bearer "):]) == 1
+    with Session(engine) as session:
+        assert main.get_current_user(header, session) is None
+
+    assert main.get_current_user("Bearer not-a-token", None) is None
+    token_cache.clear()
+    print("Cached token verification test passed!")
+
+def test_password_schemes_and_rehash():
+    print("Testing password schemes and rehash-on-login...")
+    # Hashes stored before the scheme prefix still verify, and are flagged for upgrade
+    legacy = "abcd$" + hashlib.pbkdf2_hmac("sha256", b"s3cret", b"abcd", 100000).hex()
+    assert verify_password("s3cret", legacy) and not verify_password("wrong", legacy)
+    assert needs_rehash(legacy)
+
+    current = hash_password("s3cret")
+    assert current.startswith("pbkdf2_sha256$") and verify_password("s3cret", current) and not needs_rehash(current)
+
+    original = auth.PASSWORD_SCHEME, auth.SCRYPT_N
+    auth.PASSWORD_SCHEME, auth.SCRYPT_N = "scrypt", 2 ** 10
+    try:
+        scrypt_hash = hash_password("s3cret")
+        assert scrypt_hash.startswith("scrypt$1024,8,1$") and verify_password("s3cret", scrypt_hash)
+        assert needs_rehash(current) and not needs_rehash(scrypt_hash)
+
+        engine = make_engine()
+        with Session(engine) as session:
+            session.add(User(username="ana", email="ana@b.c", password_hash=legacy))
+            session.add(User(username="bo", email="bo@b.c", password_hash=legacy, is_active=False))
+            session.commit()
+        with Session(engine) as session:
+            result = asyncio.run(main.login(main.LoginRequest(username="ana", password="s3cret"), session))
+            assert result["access_token"] and result["user"]["username"] == "ana"
+        with Session(engine) as session:
+            upgraded = session.get(User, 1).password_hash
+            assert upgraded.startswith("scrypt$") and verify_password("s3cret", upgraded)
+            assert session.get(User, 1).last_login is not None
+
+        # Disabled accounts are refused before anything is written
+        with Session(engine) as session:
+            try:
+                asyncio.run(main.login(main.LoginRequest(username="bo", password="s3cret"), session))
+                assert False, "disabled account logged in"
+            except HTTPException as e:
+                assert e.status_code == 403
+        with Session(engine) as session:
+            assert session.get(User, 2).password_hash == legacy
+
+        # Registration runs its queries off the event loop too
+        with Session(engine) as session:
+            result = asyncio.run(main.register(main.RegisterRequest(username="cy", email="cy@b.c", password="pw"), session))
+        with Session(engine) as session:
+            assert session.get(User, result["user_id"]).username == "cy"
+    finally:
+        auth.PASSWORD_SCHEME, auth.SCRYPT_N = original
+
+    print("Password scheme test passed!")
+
+def test_shared_signing_keys():
+    print("Testing JWT signing keys and rotation...")
+    original = auth.signing_keys
+    keys_file = os.path.join(tempfile.mkdtemp(), "auth_keys.json")
+    try:
+        # Nothing is touched until a key is needed
+        worker_a = auth.SigningKeys(keys_file)
+        worker_b = auth.SigningKeys(keys_file)
+        assert not os.path.exists(keys_file)
+
+        # Two workers sharing a key file: the first creates it, the second reuses it
+        auth.signing_keys = worker_a
+        token = create_token(7, "ana")
+        assert worker_b.signing_key()[0] == worker_a.active
+        header, payload, _ = token.split(".")
+        assert json.loads(auth._b64url_decode(header)) == {"alg": "HS256", "typ": "JWT", "kid": worker_a.active}
+        assert json.loads(auth._b64url_decode(payload))["sub"] == "7"
+        auth.signing_keys = worker_b
+        assert auth.verify_token(token)["user_id"] == 7
+
+        # Tampered or unsigned tokens are rejected
+        forged = auth._b64url(json.dumps({"sub": "1", "username": "root", "exp": 9999999999}).encode())
+        assert auth.verify_token(f"{header}.{forged}.{token.split('.')[2]}") is None
+        none_header = auth._b64url(json.dumps({"alg": "none", "kid": worker_a.active}).encode())
+        assert auth.verify_token(f"{none_header}.{payload}.") is None
+
+        # Rotation in one worker: the other picks up the new key, old tokens still verify
+        old_kid = worker_a.active
+        new_kid = worker_a.rotate()
+        assert new_kid != old_kid
+        auth.signing_keys = worker_a
+        rotated = create_token(7, "ana")
+        os.utime(keys_file, (0, 0))  # Make the mtime change visible whatever the clock resolution
+        auth.signing_keys = worker_b
+        assert auth.verify_token(rotated)["user_id"] == 7 and auth.verify_token(token)["user_id"] == 7
+        # ...and signs with it, even before seeing a token that names it
+        worker_c = auth.SigningKeys(keys_file)
+        worker_c.signing_key()
+        worker_a.rotate()
+        os.utime(keys_file, (1, 1))
+        assert worker_c.signing_key()[0] == worker_a.active
+
+        # Keys beyond AUTH_KEEP_KEYS are retired
+        for _ in range(auth.AUTH_KEEP_KEYS):
+            worker_a.rotate()
+        auth.signing_keys = worker_a
+        assert auth.verify_token(token) is None and old_kid not in worker_a.keys
+    finally:
+        auth.signing_keys = original
+
+    print("Signing key test passed!")
+
+if __name__ == "__main__":
+    test_cached_user_lookup()
+    test_password_schemes_and_rehash()
+    test_shared_signing_keys()
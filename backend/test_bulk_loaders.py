@@ -0,0 +1,398 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import gzip
+import json
+import tempfile
+from sqlmodel import Session, SQLModel, create_engine, select
+from backend.models import Product, ClinicalTrial, ProductSideEffect, Patent, ScientificArticle, Conference
+from backend.reprocess_archive import transform_segment, write_segment
+from backend.matching import ProductMatcher
+from backend.load_aact_trials import match_aact_interventions, lead_sponsors, iter_aact_rows, write_rows
+from backend.load_patents import map_patent_file, FULLTEXT_UPDATE
+from backend.load_pubmed_baseline import map_baseline_file, delete_citations
+from backend.load_conference_abstracts import map_abstract_file
+from backend.bulk_load import load_matched_files
+from backend.ingestion import (
+    PATENT_KEY, ARTICLE_KEY, ARTICLE_UPDATE, CONFERENCE_KEY, CONFERENCE_UPDATE, TRIAL_KEY, TRIAL_UPDATE,
+    bulk_upsert, new_upsert_stats, trial_row
+)
+from data_ingestion.archive import RawArchive, list_segments, iter_segment
+from data_ingestion.bulk_files import iter_json_array
+from data_ingestion.conference_connector import ConferenceConnector
+from data_ingestion.clinical_trials_connector import parse_study
+
+def test_streaming_json_array():
+    print("Testing incremental JSON array parsing...")
+    # "meta" also has a "results" key (an object) that must not be mistaken for the array
+    doc = {
+        "meta": {"results": {"skip": 0, "total": 500}},
+        "results": [{"set_id": str(i), "text": "x" * (i % 50)} for i in range(500)]
+    }
+    # Tiny reads force elements to straddle chunk boundaries
+    items = list(iter_json_array(io.StringIO(json.dumps(doc)), "results", chunk_size=64))
+
+    assert len(items) == 500
+    assert items[0]["set_id"] == "0" and items[-1]["set_id"] == "499"
+    assert items[123] == doc["results"][123]
+    print("Streaming JSON test passed!")
+
+def study(nct_id, status):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": nct_id, "briefTitle": f"Study {nct_id}"},
+        "statusModule": {"overallStatus": status, "lastUpdatePostDateStruct": {"date": "2024-03"}},
+        "designModule": {"phases": ["PHASE2"]}
+    }}
+
+def test_archive_reprocessing():
+    print("Testing raw archive replay...")
+    with tempfile.TemporaryDirectory() as root:
+        archive = RawArchive(root, use_zstd=False)
+        # Two fetches of the same study: the later payload must win on replay
+        archive.write("clinical_trials", "TestMab", [("NCT1", study("NCT1", "Recruiting")), ("NCT2", study("NCT2", "Completed"))])
+        archive.write("clinical_trials", "TestMab", [("NCT1", study("NCT1", "Completed"))])
+        archive.write("clinical_trials", "Unknown Drug", [("NCT3", study("NCT3", "Recruiting"))])
+        archive.write("openfda", "TestMab", [("set-1", {
+            "set_id": "set-1", "description": ["A monoclonal antibody."],
+            "adverse_reactions": ["Adverse reactions include nausea, headache and fatigue."],
+            "openfda": {"brand_name": ["TestMab"]}
+        })])
+
+        segments = list_segments(root)
+        assert len(segments) == 2  # One segment per source, frames appended
+        assert [e["id"] for e in iter_segment(segments[0])] == ["NCT1", "NCT2", "NCT1", "NCT3"]
+
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(Product(name="TestMab"))
+            session.commit()
+            product_ids = {"testmab": 1}
+
+            skipped = 0
+            for path in segments:
+                _, items = transform_segment(path)
+                skipped += write_segment(session, product_ids, items)["skipped"]
+
+            trials = {t.nct_id: t.status for t in session.exec(select(ClinicalTrial)).all()}
+            assert trials == {"NCT1": "Completed", "NCT2": "Completed"} and skipped == 1
+            assert session.get(Product, 1).description.startswith("A monoclonal antibody")
+            assert len(session.exec(select(ProductSideEffect)).all()) > 0
+
+    print("Archive replay test passed!")
+
+def test_archive_retention():
+    print("Testing raw archive retention...")
+    with tempfile.TemporaryDirectory() as root:
+        old = RawArchive(root, use_zstd=False, max_bytes=0, max_age_seconds=0)
+        for n in range(3):
+            old._segments.clear()  # A new segment per write, as after a restart
+            old.write("pubmed", "TestMab", [(str(n), {"n": n, "text": "x" * 2000})])
+        segments = list_segments(root)
+        assert len(segments) == 3
+        os.utime(segments[0], (0, 0))  # Far past any age limit
+        sizes = sum(os.path.getsize(p) for p in segments[1:])
+
+        # Starting a segment expires the old one and trims the oldest over the size cap
+        archive = RawArchive(root, use_zstd=False, max_bytes=sizes - 1, max_age_seconds=86400)
+        archive.write("pubmed", "TestMab", [("3", {"n": 3})])
+        remaining = list_segments(root)
+        assert segments[0] not in remaining and segments[1] not in remaining
+        assert segments[2] in remaining and len(remaining) == 2
+    print("Archive retention test passed!")
+
+def test_product_matcher():
+    print("Testing product synonym matcher...")
+    matcher = ProductMatcher([("Keytruda", 1), ("Pembrolizumab", 1), ("Sacubitril/Valsartan", 2), ("IL", 3)])
+    assert matcher.lookup("PEMBROLIZUMAB") == {1}
+    assert matcher.lookup("sacubitril-valsartan") == {2}
+    assert matcher.find("Keytruda® 200 mg IV every 3 weeks") == {1}
+    assert matcher.find("sacubitril / valsartan twice daily") == {2}
+    # Whole words only, and very short synonyms are ignored
+    assert matcher.find("pembrolizumabs, an IL-2 variant") == set()
+    print("Matcher test passed!")
+
+def test_aact_flat_file_loader():
+    print("Testing AACT flat-file loader...")
+    files = {
+        "interventions.txt": "id|nct_id|intervention_type|name|description\n"
+                             "1|NCT01|Biological|Pembrolizumab|IV\n"
+                             "2|NCT02|Drug|Placebo|\n"
+                             "3|NCT03|Drug|MK-3475 200 mg|\n",
+        "intervention_other_names.txt": "id|nct_id|intervention_id|name\n"
+                                        "1|NCT02|2|Keytruda\n",
+        "sponsors.txt": "id|nct_id|agency_class|lead_or_collaborator|name\n"
+                        "1|NCT01|INDUSTRY|lead|Merck Sharp & Dohme LLC\n"
+                        "2|NCT01|OTHER|collaborator|Some University\n",
+        "studies.txt": "nct_id|brief_title|official_title|overall_status|phase|start_date|completion_date\n"
+                       "NCT01|Short|\"A Phase 3 Study of \"\"Pembro\"\"\nin NSCLC\"|COMPLETED|Phase 3|2019-01-15|2022-06\n"
+                       "NCT02|Other||RECRUITING|Phase 2|2023-02-01|\n"
+                       "NCT03|Unmatched||RECRUITING|Phase 1||\n"
+                       "NCT04|Unrelated||RECRUITING|Phase 1||\n",
+    }
+    with tempfile.TemporaryDirectory() as source:
+        for name, content in files.items():
+            with open(os.path.join(source, name), "w") as fh:
+                fh.write(content)
+
+        matcher = ProductMatcher([("Keytruda", 1), ("Pembrolizumab", 1)])
+        matched = match_aact_interventions(source, matcher)
+        assert matched == {"NCT01": {1}, "NCT02": {1}}
+
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            stats = new_upsert_stats()
+            rows = iter_aact_rows(source, matched, lead_sponsors(source, matched))
+            write_rows(session, rows, stats)
+            assert stats["inserted"] == 2
+
+            trial = session.exec(select(ClinicalTrial).where(ClinicalTrial.nct_id == "NCT01")).one()
+            assert trial.sponsor == "Merck Sharp & Dohme LLC" and trial.status == "Completed"
+            assert trial.title == 'A Phase 3 Study of "Pembro"\nin NSCLC'  # Quoted multi-line field
+            assert trial.completion_date.year == 2022 and trial.start_date.month == 1
+
+            # A second pass over the same dump changes nothing
+            again = new_upsert_stats()
+            write_rows(session, iter_aact_rows(source, matched, lead_sponsors(source, matched)), again)
+            assert again == {"inserted": 0, "updated": 0, "unchanged": 2}
+
+            # The CT.gov API refresh of the same study agrees with the AACT row: no rewrite either way
+            api_study = study("NCT01", "COMPLETED")
+            api_study["protocolSection"]["identificationModule"]["officialTitle"] = trial.title
+            api_study["protocolSection"]["designModule"]["phases"] = ["PHASE3"]
+            api = new_upsert_stats()
+            bulk_upsert(session, ClinicalTrial, [trial_row(1, parse_study(api_study))], TRIAL_KEY, TRIAL_UPDATE, stats=api)
+            assert api == {"inserted": 0, "updated": 0, "unchanged": 1}
+            again = new_upsert_stats()
+            write_rows(session, iter_aact_rows(source, matched, lead_sponsors(source, matched)), again)
+            assert again["unchanged"] == 2
+
+            # A change to an AACT-only column is still written
+            session.execute(ClinicalTrial.__table__.update().where(ClinicalTrial.nct_id == "NCT01").values(sponsor="Old Sponsor"))
+            again = new_upsert_stats()
+            write_rows(session, iter_aact_rows(source, matched, lead_sponsors(source, matched)), again)
+            assert again == {"inserted": 0, "updated": 1, "unchanged": 1}
+            session.expire_all()
+            assert session.get(ClinicalTrial, trial.id).sponsor == "Merck Sharp & Dohme LLC"
+
+    print("AACT loader test passed!")
+
+USPTO_GRANT = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE us-patent-grant SYSTEM "us-patent-grant-v47-2022-02-17.dtd" [ ]>
+<us-patent-grant lang="EN" dtd-version="v4.7 2022-02-17" file="{number}.XML">
+<us-bibliographic-data-grant>
+<publication-reference><document-id><country>US</country><doc-number>{number}</doc-number><kind>B2</kind><date>20240213</date></document-id></publication-reference>
+<application-reference appl-type="{appl_type}"><document-id><country>US</country><doc-number>17123456</doc-number><date>20200105</date></document-id></application-reference>
+<us-term-of-grant><us-term-extension>100</us-term-extension></us-term-of-grant>
+<priority-claims><priority-claim sequence="01" kind="regional"><country>EP</country><doc-number>19000001</doc-number><date>20190110</date></priority-claim></priority-claims>
+<invention-title id="d2e1">{title}</invention-title>
+<us-parties><us-applicants><us-applicant sequence="001"><addressbook><last-name>Doe</last-name><first-name>Jane</first-name></addressbook></us-applicant></us-applicants></us-parties>
+<assignees><assignee><addressbook><orgname>Merck Sharp &amp; Dohme LLC</orgname><role>02</role></addressbook></assignee></assignees>
+</us-bibliographic-data-grant>
+<abstract id="abstract"><p>Stable formulations of an anti-PD-1 antibody&mdash;for injection.</p></abstract>
+<description id="description"><p>Very long description...</p></description>
+<claims id="claims">
+<claim id="CLM-00001" num="00001"><claim-text>1. A method of treating melanoma comprising administering <claim-text>{drug} to a patient.</claim-text></claim-text></claim>
+<claim id="CLM-00002" num="00002"><claim-text>2. The method of claim 1, wherein the patient has lung cancer.</claim-text></claim>
+</claims>
+</us-patent-grant>
+"""
+
+EP_DOCUMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<ep-patent-document id="EP3000001B1" lang="en" country="EP" doc-number="3000001" kind="B1" date-publ="20230104">
+<SDOBI lang="en">
+<B200><B210>15000001.2</B210><B220><date>20150301</date></B220></B200>
+<B300><B310>201414</B310><B320><date>20140302</date></B320><B330><ctry>US</ctry></B330></B300>
+<B500><B540><B541>de</B541><B542>Semaglutid-Tablette</B542><B541>en</B541><B542>Semaglutide tablet</B542></B540></B500>
+<B700><B730><B731><snm>Novo Nordisk A/S</snm></B731></B730></B700>
+</SDOBI>
+<claims id="claims01" lang="de"><claim><claim-text>Tablette mit Semaglutid.</claim-text></claim></claims>
+<claims id="claims02" lang="en"><claim><claim-text>A tablet comprising semaglutide and an excipient.</claim-text></claim></claims>
+</ep-patent-document>
+"""
+
+def test_patent_fulltext_loader():
+    print("Testing USPTO/EPO full-text patent loader...")
+    with tempfile.TemporaryDirectory() as tmp:
+        weekly = os.path.join(tmp, "ipg240213.xml")
+        with open(weekly, "w") as fh:
+            # Concatenated documents: a matching grant, a design patent and an unrelated grant
+            fh.write(USPTO_GRANT.format(number="09220776", appl_type="utility", title="Anti-PD-1 antibody", drug="pembrolizumab"))
+            fh.write(USPTO_GRANT.format(number="D0999999", appl_type="design", title="Pen", drug="pembrolizumab"))
+            fh.write(USPTO_GRANT.format(number="11000000", appl_type="utility", title="Widget", drug="a widget"))
+        ep = os.path.join(tmp, "EP3000001.xml")
+        with open(ep, "w") as fh:
+            fh.write(EP_DOCUMENT)
+
+        matcher = ProductMatcher([("Keytruda", 1), ("Pembrolizumab", 1), ("Semaglutide", 2)])
+        _, documents, rows = map_patent_file(weekly, matcher)
+        assert documents == 2 and len(rows) == 1  # Design patent skipped, unrelated grant unmatched
+        row = rows[0]
+        assert row["product_id"] == 1 and row["source_id"] == "US9220776"
+        assert row["assignee"] == "Merck Sharp & Dohme LLC" and row["status"] == "Granted"
+        assert row["abstract"] == "Stable formulations of an anti-PD-1 antibody\u2014for injection."
+        assert row["filing_date"].year == 2020 and row["priority_date"].year == 2019
+        # 20 years from filing plus the 100-day term adjustment
+        assert row["expiry_date"].date().isoformat() == "2040-04-14"
+        assert row["claim_summary"].startswith("1. A method of treating melanoma")
+        assert row["patent_type"] == "Method of Use"
+        assert row["diseases_in_claims"] == "Melanoma, Lung Cancer"
+
+        _, documents, ep_rows = map_patent_file(ep, matcher)
+        assert documents == 1 and len(ep_rows) == 1
+        ep_row = ep_rows[0]
+        assert ep_row["source_id"] == "EP3000001" and ep_row["title"] == "Semaglutide tablet"
+        assert ep_row["assignee"] == "Novo Nordisk A/S" and ep_row["patent_type"] == "Formulation"
+        assert ep_row["priority_date"].year == 2014 and ep_row["expiry_date"].year == 2035
+
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            stats = new_upsert_stats()
+            bulk_upsert(session, Patent, rows + ep_rows, PATENT_KEY, FULLTEXT_UPDATE, stats=stats)
+            assert stats["inserted"] == 2
+            patent = session.exec(select(Patent).where(Patent.source_id == "US9220776")).one()
+            assert "lung cancer" in patent.claims
+
+            # Next week's file re-ships the same grant: nothing to write
+            again = new_upsert_stats()
+            bulk_upsert(session, Patent, map_patent_file(weekly, matcher)[2], PATENT_KEY, FULLTEXT_UPDATE, stats=again)
+            assert again == {"inserted": 0, "updated": 0, "unchanged": 1}
+
+    print("Patent loader test passed!")
+
+PUBMED_CITATION = """<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"><PMID Version="1">{pmid}</PMID>
+<Article><Journal><JournalIssue><PubDate><MedlineDate>2019 Dec-2020 Jan</MedlineDate></PubDate></JournalIssue></Journal>
+<ArticleTitle>{title}</ArticleTitle>
+<Abstract><AbstractText Label="BACKGROUND">Background.</AbstractText><AbstractText Label="RESULTS">Results.</AbstractText></Abstract>
+<AuthorList><Author><LastName>Smith</LastName><Initials>J</Initials></Author><Author><CollectiveName>KEYNOTE Investigators</CollectiveName></Author></AuthorList>
+</Article>
+<ChemicalList><Chemical><RegistryNumber>DPT0O3T46P</RegistryNumber><NameOfSubstance UI="C582435">{chemical}</NameOfSubstance></Chemical></ChemicalList>
+</MedlineCitation>
+<PubmedData><ArticleIdList><ArticleId IdType="pubmed">{pmid}</ArticleId><ArticleId IdType="doi">10.1000/{pmid}</ArticleId></ArticleIdList>
+<ReferenceList><Reference><Citation>Cited paper.</Citation><ArticleIdList><ArticleId IdType="doi">10.1000/ref</ArticleId></ArticleIdList></Reference></ReferenceList></PubmedData>
+</PubmedArticle>"""
+
+# No DOI of its own, only in the references and the journal's electronic location
+PUBMED_CITATION_NO_DOI = """<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"><PMID Version="1">{pmid}</PMID>
+<Article><Journal><JournalIssue><PubDate><Year>2021</Year></PubDate></JournalIssue></Journal>
+<ArticleTitle>{title}</ArticleTitle>{elocation}
+</Article>
+<ChemicalList><Chemical><RegistryNumber>DPT0O3T46P</RegistryNumber><NameOfSubstance UI="C582435">{chemical}</NameOfSubstance></Chemical></ChemicalList>
+</MedlineCitation>
+<PubmedData><ArticleIdList><ArticleId IdType="pubmed">{pmid}</ArticleId></ArticleIdList>
+<ReferenceList><Reference><Citation>Cited paper.</Citation><ArticleIdList><ArticleId IdType="doi">10.1000/ref</ArticleId></ArticleIdList></Reference></ReferenceList></PubmedData>
+</PubmedArticle>"""
+
+def test_pubmed_baseline_loader():
+    print("Testing PubMed baseline loader...")
+    baseline = "".join([
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN" '
+        '"https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">\n<PubmedArticleSet>',
+        PUBMED_CITATION.format(pmid="101", title="Outcomes of <i>PD-1</i> blockade in melanoma", chemical="pembrolizumab"),
+        PUBMED_CITATION.format(pmid="102", title="Unrelated cohort study", chemical="Water"),
+        PUBMED_CITATION.format(pmid="103", title="Keytruda in NSCLC", chemical="Antibodies"),
+        PUBMED_CITATION_NO_DOI.format(pmid="104", title="Pembrolizumab letter", chemical="pembrolizumab", elocation=""),
+        PUBMED_CITATION_NO_DOI.format(pmid="105", title="Pembrolizumab erratum", chemical="pembrolizumab",
+                                      elocation='<ELocationID EIdType="doi" ValidYN="Y">10.1000/105e</ELocationID>'),
+        "<DeleteCitation><PMID Version=\"1\">103</PMID></DeleteCitation></PubmedArticleSet>",
+    ])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pubmed24n0001.xml.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            fh.write(baseline)
+
+        matcher = ProductMatcher([("Keytruda", 1), ("Pembrolizumab", 1)])
+        _, citations, rows, deleted = map_baseline_file(path, matcher)
+        assert citations == 5 and deleted == ["103"]
+        assert [r["pmid"] for r in rows] == ["101", "103", "104", "105"]  # Matched on the chemical list, then the title
+        row = rows[0]
+        assert row["doi"] == "10.1000/101" and row["title"] == "Outcomes of PD-1 blockade in melanoma"
+        # A cited paper's DOI is never taken for the article's own
+        assert [r["doi"] for r in rows[2:]] == ["PMID:104", "10.1000/105e"]
+        assert row["authors"] == "Smith J, KEYNOTE Investigators"
+        assert row["publication_date"].year == 2019
+
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            stats = new_upsert_stats()
+            bulk_upsert(session, ScientificArticle, rows, ARTICLE_KEY, ARTICLE_UPDATE, stats=stats)
+            assert stats["inserted"] == 4
+            assert delete_citations(session, deleted) == 1
+            session.commit()
+            assert [a.pmid for a in session.exec(select(ScientificArticle).order_by(ScientificArticle.pmid)).all()] == ["101", "104", "105"]
+
+    print("PubMed baseline loader test passed!")
+
+def test_conference_abstract_loader():
+    print("Testing conference abstract exports...")
+    exports = {
+        "ASCO_2025.csv": "Abstract Number,Title,Abstract,Authors,Presentation Date\n"
+                         "1001,Pembrolizumab in resected melanoma,\"Adjuvant therapy, 3 years\",\"Smith J; Doe A\",2025-06-01\n"
+                         "1002,Unrelated health economics study,Costs,Lee K,2025-06-01\n"
+                         ",,,,\n",
+        "esmo.json": '{"meeting": "ESMO Congress 2024", "abstracts": ['
+                     '{"id": "LBA5", "title": "KEYTRUDA plus chemotherapy", "body": "OS update", "authors": [{"name": "Roe B"}], '
+                     '"conference": "ESMO Congress 2024", "date": "09/15/2024"}]}',
+        "aacr.xml": '<?xml version="1.0"?><abstracts>'
+                    '<abstract id="CT001"><title>Semaglutide and tumour growth</title><author>Kim C</author><author>Park D</author>'
+                    '<meeting>AACR Annual Meeting 2025</meeting><text>Mouse models.</text></abstract>'
+                    '<abstract id="CT002"><title>Pembrolizumab biomarkers</title></abstract></abstracts>',
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, content in exports.items():
+            with open(os.path.join(tmp, name), "w") as fh:
+                fh.write(content)
+
+        matcher = ProductMatcher([("Keytruda", 1), ("Pembrolizumab", 1), ("Semaglutide", 2)])
+        rows = []
+        for name, expected in [("ASCO_2025.csv", 2), ("esmo.json", 1), ("aacr.xml", 2)]:
+            _, abstracts, file_rows = map_abstract_file(os.path.join(tmp, name), matcher=matcher)
+            assert abstracts == expected  # The empty CSV row is not an abstract
+            rows += file_rows
+
+        by_id = {r["source_id"]: r for r in rows}
+        # Records without a meeting name fall back to the file name
+        assert set(by_id) == {"ASCO 2025:1001", "ESMO Congress 2024:LBA5", "AACR Annual Meeting 2025:CT001", "aacr:CT002"}
+        assert by_id["ASCO 2025:1001"]["conference_name"] == "ASCO 2025"
+        assert by_id["ESMO Congress 2024:LBA5"]["date"].month == 9
+        assert by_id["AACR Annual Meeting 2025:CT001"]["product_id"] == 2
+
+        engine = create_engine("sqlite://")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            stats = new_upsert_stats()
+            bulk_upsert(session, Conference, rows, CONFERENCE_KEY, CONFERENCE_UPDATE, stats=stats)
+            assert stats["inserted"] == 4
+            # Reloading the same exports does not duplicate abstracts
+            again = new_upsert_stats()
+            bulk_upsert(session, Conference, rows, CONFERENCE_KEY, CONFERENCE_UPDATE, stats=again)
+            assert again == {"inserted": 0, "updated": 0, "unchanged": 4}
+            assert len(session.exec(select(Conference)).all()) == 4
+
+        # The connector searches the same exports
+        connector = ConferenceConnector(dump_dir=tmp)
+        found = connector.search("Pembrolizumab")
+        assert sorted(a.source_id for a in found) == ["ASCO 2025:1001", "aacr:CT002"]
+        assert {a.source_id: a.authors for a in found}["ASCO 2025:1001"] == ["Smith J", "Doe A"]
+        # No exports configured: nothing, rather than made-up abstracts
+        assert ConferenceConnector(dump_dir="").search("Pembrolizumab") == []
+        # Loading no files still reports (empty) stats
+        assert load_matched_files(None, [], map_abstract_file, Conference, CONFERENCE_KEY, CONFERENCE_UPDATE,
+                                  "exports", "abstracts") == new_upsert_stats()
+
+    print("Conference abstract loader test passed!")
+
+if __name__ == "__main__":
+    test_streaming_json_array()
+    test_archive_reprocessing()
+    test_archive_retention()
+    test_product_matcher()
+    test_aact_flat_file_loader()
+    test_patent_fulltext_loader()
+    test_pubmed_baseline_loader()
+    test_conference_abstract_loader()
@@ -0,0 +1,187 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+from sqlmodel import Session, SQLModel, create_engine, select
+from backend import main
+from backend.cta_import import import_cta_file
+from backend.budget_rollup import ensure_rollups, rebuild_rollups
+from backend.models import ClinicalBudget, RegulatoryDocument, BudgetRollup
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+def test_chunked_budget_import():
+    print("Testing chunked CTA budget import...")
+    csv = (
+        "Site,Allocated,Spent,Currency\n"
+        "Hospital Sant Pau,650,10000,eur\n"
+        "Hospital Clinic,abc,100,EUR\n"
+        ",1200.5,,\n"
+        "La Paz,-5,0,EUR\n"
+        "Vall d'Hebron,3000,2500.25,USD\n"
+    )
+    with make_session() as session:
+        # Chunks of two rows: the row numbers must still match the spreadsheet
+        report = import_cta_file(session, io.BytesIO(csv.encode()), "budget.csv", chunksize=2)
+        assert report["type"] == "budget" and report["rows"] == 5
+        assert report["imported"] == 3 and report["rejected"] == 2
+        assert [(e["row"], e["field"], e["error"]) for e in report["errors"]] == [
+            (3, "allocated", "not a number"), (5, "allocated", "negative amount")
+        ]
+        assert report["rows_per_s"] > 0
+
+        items = session.exec(select(ClinicalBudget).order_by(ClinicalBudget.id)).all()
+        assert [(i.site_name, i.allocated_amount, i.spent_amount, i.currency) for i in items] == [
+            ("Hospital Sant Pau", 650.0, 10000.0, "EUR"),
+            ("Unknown Site", 1200.5, 0.0, "EUR"),
+            ("Vall d'Hebron", 3000.0, 2500.25, "USD"),
+        ]
+        assert all(i.trial_id == 1 and i.status == "Active" for i in items)
+
+    # Blank lines (before the header too) keep the reported row numbers; ids must be whole numbers
+    csv = (
+        "\n"
+        "Site,Allocated,Trial_ID\n"
+        "Sant Pau,100,1\n"
+        "\n"
+        "\n"
+        "La Paz,abc,1\n"
+        "Clinic,50,12.7\n"
+        "Vall d'Hebron,75,2.0\n"
+    )
+    with make_session() as session:
+        report = import_cta_file(session, io.BytesIO(csv.encode()), "budget.csv", chunksize=2)
+        assert report["rows"] == 4 and report["imported"] == 2
+        assert [(e["row"], e["field"]) for e in report["errors"]] == [(6, "allocated"), (7, "trial_id")]
+        items = session.exec(select(ClinicalBudget).order_by(ClinicalBudget.id)).all()
+        assert [(i.site_name, i.trial_id) for i in items] == [("Sant Pau", 1), ("Vall d'Hebron", 2)]
+    print("Chunked CTA budget import test passed!")
+
+def test_regulatory_import():
+    print("Testing CTA regulatory import...")
+    csv = (
+        "Title,Type,Status,Submission\n"
+        "Protocol v2.1,Protocol,in review,2024-03-01\n"
+        "Investigator Brochure,IB,,not a date\n"
+        ",Ethics,approved,\n"
+    )
+    with make_session() as session:
+        report = import_cta_file(session, io.BytesIO(csv.encode()), "docs.csv")
+        assert report["type"] == "regulatory" and report["imported"] == 2 and report["rejected"] == 1
+        assert report["errors"][0]["row"] == 3 and report["errors"][0]["field"] == "submission_date"
+        docs = session.exec(select(RegulatoryDocument).order_by(RegulatoryDocument.id)).all()
+        assert [(d.title, d.status) for d in docs] == [("Protocol v2.1", "In Review"), ("Untitled", "Approved")]
+        assert docs[0].submission_date.year == 2024
+
+        report = import_cta_file(session, io.BytesIO(b"foo,bar\n1,2\n"), "other.csv")
+        assert report["type"] == "unknown" and report["imported"] == 0
+
+        # Empty and header-only uploads are rejected as invalid, not as server errors
+        for content in [b"", b"\n\n", b"Title,Type\n", b"Title,Type\n\n"]:
+            try:
+                import_cta_file(session, io.BytesIO(content), "docs.csv")
+                assert False, f"{content!r} imported"
+            except ValueError as e:
+                assert "empty" in str(e) or "no rows" in str(e)
+    print("CTA regulatory import test passed!")
+
+def test_budget_aggregates():
+    print("Testing CTA budget aggregates...")
+    with make_session() as session:
+        for item in [
+            ClinicalBudget(trial_id=1, site_name="Sant Pau", allocated_amount=1000, spent_amount=1500),
+            ClinicalBudget(trial_id=1, site_name="Sant Pau", allocated_amount=500, spent_amount=0),
+            ClinicalBudget(trial_id=1, site_name="La Paz", allocated_amount=2000, spent_amount=100, status="Hold"),
+            ClinicalBudget(trial_id=2, site_name="Clinic", allocated_amount=1000, spent_amount=900),
+        ]:
+            main.create_clinical_budget(item, session=session)
+
+        memory = main.get_economic_memory(limit=2, offset=0, site_limit=50, site_offset=0, session=session)
+        assert memory["summary"] == {"total_budget": 4500, "total_spent": 2500, "balance": 2000, "utilization_rate": 55.56}
+        trials = {t["trial_id"]: t for t in memory["by_trial"]}
+        assert trials[1]["allocated"] == 3500 and trials[1]["items"] == 3 and trials[2]["utilization_rate"] == 90.0
+        assert {s["status"]: s["items"] for s in memory["by_status"]} == {"Active": 3, "Hold": 1}
+        assert [(s["trial_id"], s["site_name"], s["spent"]) for s in memory["by_site"]] == [
+            (1, "La Paz", 100), (1, "Sant Pau", 1500), (2, "Clinic", 900)
+        ]
+        assert len(memory["items"]) == 2 and memory["items_total"] == 4
+        assert memory["sites_total"] == 3
+
+        # Sites page independently of the line items
+        memory = main.get_economic_memory(limit=2, offset=2, site_limit=1, site_offset=1, session=session)
+        assert [(s["trial_id"], s["site_name"]) for s in memory["by_site"]] == [(1, "Sant Pau")]
+        assert len(memory["items"]) == 2 and memory["sites_total"] == 3
+
+        suggestions = {s["type"]: s["description"] for s in main.get_process_improvements(session=session)}
+        # One line over budget; two under 10% (0/500 and 100/2000)
+        assert suggestions["Critical"].startswith("1 ") and suggestions["Optimization"].startswith("2 ")
+    print("CTA budget aggregates test passed!")
+
+def rollup_rows(session):
+    return [
+        (r.trial_id, r.site_name, r.currency, r.allocated, r.spent, r.items, r.over_budget_items, r.underutilized_items)
+        for r in session.exec(select(BudgetRollup).order_by(BudgetRollup.trial_id, BudgetRollup.site_name, BudgetRollup.currency))
+    ]
+
+def test_budget_rollup_maintenance():
+    print("Testing incremental budget rollup...")
+    with make_session() as session:
+        first = main.create_clinical_budget(
+            ClinicalBudget(trial_id=1, site_name="Sant Pau", allocated_amount=1000, spent_amount=1500), session=session)
+        main.create_clinical_budget(
+            ClinicalBudget(trial_id=1, site_name="Sant Pau", allocated_amount=500, spent_amount=20), session=session)
+        csv = (
+            "Trial_ID,Site,Allocated,Spent,Currency\n"
+            "1,Sant Pau,250,100,EUR\n"
+            "1,Sant Pau,800,0,USD\n"
+            "2,Clinic,1000,900,EUR\n"
+            "2,Clinic,abc,0,EUR\n"
+        )
+        report = import_cta_file(session, io.BytesIO(csv.encode()), "budget.csv", chunksize=2)
+        assert report["imported"] == 3
+        assert rollup_rows(session) == [
+            (1, "Sant Pau", "EUR", 1750.0, 1620.0, 3, 1, 1),
+            (1, "Sant Pau", "USD", 800.0, 0.0, 1, 0, 1),
+            (2, "Clinic", "EUR", 1000.0, 900.0, 1, 0, 0),
+        ]
+
+        # Deleting lines subtracts exactly what they added; empty sites are dropped
+        main.delete_clinical_budget(first.id, session=session)
+        usd = session.exec(select(ClinicalBudget).where(ClinicalBudget.currency == "USD")).one()
+        main.delete_clinical_budget(usd.id, session=session)
+        maintained = rollup_rows(session)
+        assert maintained == [(1, "Sant Pau", "EUR", 750.0, 120.0, 2, 0, 1), (2, "Clinic", "EUR", 1000.0, 900.0, 1, 0, 0)]
+
+        # A full rebuild from the lines agrees with the incremental totals
+        rebuild_rollups(session)
+        session.commit()
+        assert rollup_rows(session) == maintained
+
+        # Lines written around the endpoints are caught at startup and rebuilt
+        assert not ensure_rollups(session)
+        session.add(ClinicalBudget(trial_id=2, site_name="Clinic", allocated_amount=400, spent_amount=0))
+        session.commit()
+        assert ensure_rollups(session)
+        assert rollup_rows(session)[-1] == (2, "Clinic", "EUR", 1400.0, 900.0, 2, 0, 1)
+        line = session.exec(select(ClinicalBudget).where(ClinicalBudget.allocated_amount == 400)).one()
+        session.delete(line)
+        session.commit()
+        assert ensure_rollups(session) and rollup_rows(session) == maintained
+
+        portfolio = main.get_budget_portfolio(trial_id=None, session=session)
+        assert [(p["trial_id"], p["currency"], p["allocated"], p["balance"], p["sites"], p["items"]) for p in portfolio] == [
+            (1, "EUR", 750.0, 630.0, 1, 2), (2, "EUR", 1000.0, 100.0, 1, 1)
+        ]
+        assert portfolio[1]["utilization_rate"] == 90.0
+        assert len(main.get_budget_portfolio(trial_id=2, session=session)) == 1
+    print("Incremental budget rollup test passed!")
+
+if __name__ == "__main__":
+    test_chunked_budget_import()
+    test_regulatory_import()
+    test_budget_aggregates()
+    test_budget_rollup_maintenance()
@@ -0,0 +1,553 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select, func
+import json
+import tempfile
+import asyncio
+from backend.models import Product, ClinicalTrial, Patent, AlertSubscription, User, RefreshJob, IngestionRun, IngestionWatermark, Notification
+from backend.ingestion import (
+    SOURCE_CLINICAL_TRIALS, PATENT_KEY, PATENT_UPDATE, TRIAL_KEY, TRIAL_UPDATE,
+    bulk_upsert, new_upsert_stats, get_watermark, lookup_compound_properties, refresh_product_source, track_run
+)
+from data_ingestion import http_client, metrics
+from backend.scheduler import RefreshScheduler
+from backend import alerts
+from backend.alerts import dispatch_alerts, dispatch_new_records
+from backend.alert_stream import AlertBroker
+from backend import digests
+from backend.digests import send_due_digests
+from data_ingestion.models import IntelligenceRecord, SourceType
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+class FakeTrialsConnector:
+    """Returns a fixed study and remembers the `since` it was asked for."""
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query, since=None):
+        self.calls.append(since)
+        return [IntelligenceRecord(
+            source_id="NCT00000001",
+            source_type=SourceType.CLINICAL_TRIAL,
+            title=f"A study of {query}",
+            metadata={"status": "Recruiting", "phase": ["Phase 2"]},
+            updated_at=datetime(2024, 3, 15)
+        )]
+
+def test_incremental_refresh_uses_watermark():
+    print("Testing watermark-driven refresh...")
+    with make_session() as session:
+        product = Product(name="TestMab")
+        session.add(product)
+        session.commit()
+        session.refresh(product)
+
+        connector = FakeTrialsConnector()
+        first = refresh_product_source(session, product, SOURCE_CLINICAL_TRIALS, connector)
+        session.commit()
+        refresh_product_source(session, product, SOURCE_CLINICAL_TRIALS, connector)
+        session.commit()
+
+        # First run starts from scratch, second only asks for changes since the watermark
+        assert connector.calls == [None, datetime(2024, 3, 15)]
+        assert first["written"] == 1
+        assert get_watermark(session, product.id, SOURCE_CLINICAL_TRIALS) == datetime(2024, 3, 15)
+        # The re-fetched study is upserted on (product_id, nct_id), not duplicated
+        assert len(session.exec(select(ClinicalTrial)).all()) == 1
+
+    print("Watermark refresh test passed!")
+
+def test_bulk_upsert_on_natural_key():
+    print("Testing batched upsert...")
+    with make_session() as session:
+        rows = [
+            {"product_id": 1, "source_id": f"US{i}", "title": f"Patent {i}", "abstract": None,
+             "assignee": "Acme", "status": "Application", "publication_date": None, "url": None}
+            for i in range(1200)
+        ]
+        # Spans several batches and repeats a key inside one of them
+        written = bulk_upsert(session, Patent, rows + [rows[0]], PATENT_KEY, batch_size=500)
+        assert written == 1200
+
+        granted = dict(rows[5], status="Granted")
+        bulk_upsert(session, Patent, [granted], PATENT_KEY, PATENT_UPDATE)
+        session.commit()
+
+        assert len(session.exec(select(Patent)).all()) == 1200
+        assert session.exec(select(Patent).where(Patent.source_id == "US5")).one().status == "Granted"
+
+    print("Bulk upsert test passed!")
+
+def test_content_hash_skips_unchanged_rows():
+    print("Testing content-hash change detection...")
+    with make_session() as session:
+        rows = [
+            {"product_id": 1, "nct_id": f"NCT{i}", "title": f"Study {i}", "status": "Recruiting",
+             "phase": "Phase 2", "url": None, "start_date": datetime.now()}
+            for i in range(10)
+        ]
+        first = new_upsert_stats()
+        assert bulk_upsert(session, ClinicalTrial, rows, TRIAL_KEY, TRIAL_UPDATE, stats=first) == 10
+        assert first == {"inserted": 10, "updated": 0, "unchanged": 0}
+
+        # Same content again (only the volatile placeholder date differs): nothing is written
+        rows = [dict(r, start_date=datetime.now()) for r in rows]
+        rows[3]["status"] = "Completed"
+        second = new_upsert_stats()
+        assert bulk_upsert(session, ClinicalTrial, rows, TRIAL_KEY, TRIAL_UPDATE, stats=second) == 1
+        assert second == {"inserted": 0, "updated": 1, "unchanged": 9}
+        session.commit()
+
+        assert session.exec(select(ClinicalTrial).where(ClinicalTrial.nct_id == "NCT3")).one().status == "Completed"
+
+    print("Content hash test passed!")
+
+class FakePubChem:
+    """Counts name resolutions and property batches."""
+    def __init__(self):
+        self.resolved = []
+        self.property_batches = 0
+
+    def resolve_cids(self, names):
+        self.resolved.extend(names)
+        return {n: (None if n == "unknownium" else len(n)) for n in names}
+
+    def get_properties_by_cids(self, cids):
+        self.property_batches += 1
+        return {cid: {"CID": cid, "MolecularWeight": str(cid * 10)} for cid in cids}
+
+def test_compound_property_cache():
+    print("Testing PubChem property cache...")
+    with make_session() as session:
+        pubchem = FakePubChem()
+        names = ["Apixaban", "Semaglutide", "Unknownium"]
+
+        first = lookup_compound_properties(session, names, pubchem)
+        session.commit()
+        assert first["Apixaban"]["MolecularWeight"] == "80"
+        assert first["Unknownium"] is None
+        assert pubchem.property_batches == 1
+
+        # Repeat lookups (any casing) are answered from the table
+        second = lookup_compound_properties(session, ["apixaban", "UNKNOWNIUM"], pubchem)
+        assert second["apixaban"] == first["Apixaban"] and second["UNKNOWNIUM"] is None
+        assert len(pubchem.resolved) == 3 and pubchem.property_batches == 1
+
+        # Expired entries with a known CID skip name resolution
+        lookup_compound_properties(session, ["Apixaban"], pubchem, ttl=timedelta(0))
+        assert len(pubchem.resolved) == 3 and pubchem.property_batches == 2
+
+    print("PubChem cache test passed!")
+
+class FakeSourceConnector:
+    """Records which products were refreshed, in order."""
+    def __init__(self, log, fail=False):
+        self.log = log
+        self.fail = fail
+
+    def search(self, query, since=None):
+        self.log.append(query)
+        if self.fail:
+            raise RuntimeError("source down")
+        return []
+
+def test_refresh_scheduler():
+    print("Testing background refresh scheduler...")
+    # A file DB shared by the scheduler's sessions: its workers need their own connections
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'scheduler.db')}",
+                           connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for name in ["Quiet", "Watched"]:
+            session.add(Product(name=name))
+        session.add(User(username="analyst", email="a@b.c", password_hash="x"))
+        session.commit()
+        session.add(AlertSubscription(user_id=1, product_id=2))
+        session.commit()
+
+    log = []
+    connectors = {
+        "pubmed": FakeSourceConnector(log),
+        "clinical_trials": FakeSourceConnector(log),
+        "openfda": FakeSourceConnector(log, fail=True),
+    }
+    # One worker so the run order can be checked
+    scheduler = RefreshScheduler(engine, connectors, jobs_per_tick=100, workers=1)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        assert scheduler.sync_jobs(session, now) == 6
+        assert scheduler.sync_jobs(session, now) == 0
+        for job in session.exec(select(RefreshJob)).all():
+            # First runs are spread over the first interval
+            assert now - timedelta(seconds=1) <= job.next_run_at <= now + scheduler.interval(job.source, job.product_id == 2)
+        # Make everything due now; the subscribed product must go first
+        for job in session.exec(select(RefreshJob)).all():
+            job.next_run_at = datetime(2000, 1, 1, job.product_id)
+            session.add(job)
+        session.commit()
+        scheduler.jobs_per_tick = 4
+        due = scheduler.due_jobs(session, datetime.utcnow())
+        assert [(product_id, subscribed) for _, product_id, _, subscribed in due] == [(2, True)] * 3 + [(1, False)]
+        scheduler.jobs_per_tick = 100
+
+    # Two workers reading the same due jobs: each job is claimed by exactly one of them
+    until = datetime.utcnow() + timedelta(minutes=5)
+    with Session(engine) as worker_a, Session(engine) as worker_b:
+        due_a = scheduler.due_jobs(worker_a, datetime.utcnow())
+        due_b = scheduler.due_jobs(worker_b, datetime.utcnow())
+        worker_a.rollback()
+        worker_b.rollback()
+        won_b = [job_id for job_id, _, seen, _ in due_b[1:] if scheduler.claim(worker_b, job_id, seen, until)]
+        won_a = [job_id for job_id, _, seen, _ in due_a if scheduler.claim(worker_a, job_id, seen, until)]
+        assert len(won_b) == 5 and sorted(won_a + won_b) == sorted(job_id for job_id, _, _, _ in due_a)
+    with Session(engine) as session:
+        # Due again for the ticks below
+        for job in session.exec(select(RefreshJob)).all():
+            job.next_run_at = datetime(2000, 1, 1, job.product_id)
+            session.add(job)
+        session.commit()
+
+    assert scheduler.tick() == 6
+    assert log[:3] == ["Watched"] * 3 and log[3:] == ["Quiet"] * 3
+    # Nothing is due right after a run
+    assert scheduler.tick() == 0
+
+    with Session(engine) as session:
+        jobs = session.exec(select(RefreshJob)).all()
+        assert len(jobs) == 6 and all(j.runs == 1 for j in jobs)
+        failed = [j for j in jobs if j.last_status == "error"]
+        assert len(failed) == 2 and all(j.source == "openfda" for j in failed)
+        # Subscribed products come back sooner
+        watched = next(j for j in jobs if j.product_id == 2 and j.source == "pubmed")
+        quiet = next(j for j in jobs if j.product_id == 1 and j.source == "pubmed")
+        assert watched.next_run_at < quiet.next_run_at
+
+        # Concurrent workers run every due job exactly once
+        for job in jobs:
+            job.next_run_at = datetime(2000, 1, 1)
+            session.add(job)
+        session.commit()
+    scheduler.workers = 4
+    log.clear()
+    assert scheduler.tick() == 6 and sorted(log) == ["Quiet"] * 3 + ["Watched"] * 3
+    with Session(engine) as session:
+        assert all(j.runs == 2 for j in session.exec(select(RefreshJob)).all())
+
+    print("Refresh scheduler test passed!")
+
+class FlakyProductConnector(FakeSourceConnector):
+    """Fails for one product only."""
+    def __init__(self, log, broken):
+        super().__init__(log)
+        self.broken = broken
+
+    def search(self, query, since=None):
+        if query == self.broken:
+            raise RuntimeError("bad record")
+        return super().search(query, since)
+
+def test_refresh_catalogue_isolates_failures():
+    print("Testing catalogue refresh error isolation...")
+    from backend import seed_data
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'refresh.db')}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for name in ["Alpha", "Broken", "Gamma"]:
+            session.add(Product(name=name))
+        session.commit()
+
+    log = []
+    connectors = {
+        "pubmed": FakeSourceConnector(log),
+        "clinical_trials": FlakyProductConnector(log, "Broken"),
+        "openfda": FakeSourceConnector(log),
+    }
+    original = seed_data.engine
+    seed_data.engine = engine
+    try:
+        failed = asyncio.run(seed_data.refresh_catalogue(connectors))
+    finally:
+        seed_data.engine = original
+
+    # The failure skips one (product, source); every other refresh still runs
+    assert failed == ["Broken [clinical_trials]"]
+    assert log.count("Gamma") == 3 and log.count("Broken") == 2
+    with Session(engine) as session:
+        run = session.exec(select(IngestionRun).where(IngestionRun.name == "refresh")).one()
+        assert run.status == "error" and "Broken [clinical_trials]" in run.error
+        assert json.loads(run.metrics)["errors"]
+        assert session.exec(select(func.count(IngestionWatermark.id))).one() == 8
+    print("Catalogue refresh isolation test passed!")
+
+def test_host_rate_limits():
+    print("Testing per-host request rate limits...")
+    limiter = http_client.RateLimiter({"eutils.ncbi.nlm.nih.gov": 10})
+    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?term=x"
+    # Back-to-back requests are booked 100 ms apart; other hosts are not limited
+    delays = [limiter.reserve(url) for _ in range(3)]
+    assert delays[0] == 0 and 0.09 < delays[1] <= 0.1 and 0.19 < delays[2] <= 0.2
+    assert limiter.reserve("http://127.0.0.1:8765/pubmed/esearch.fcgi") == 0
+    print("Host rate limit test passed!")
+
+def test_ingestion_run_metrics():
+    print("Testing ingestion run metrics...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Product(name="TestMab"))
+        session.commit()
+
+    url = "https://clinicaltrials.gov/api/v2/studies"
+    with track_run(engine, "refresh"):
+        # What http_client reports for a throttled request and its retry
+        http_client.record(url, 0.03, 429, 0)
+        http_client.record(url, 0.12, 200, 1)
+        with Session(engine) as session:
+            product = session.exec(select(Product)).one()
+            refresh_product_source(session, product, SOURCE_CLINICAL_TRIALS, FakeTrialsConnector())
+            session.commit()
+        metrics.record_error("pubmed", RuntimeError("timeout"))
+
+    # Outside a run, reporting is a no-op
+    http_client.record(url, 0.5, 200, 0)
+    metrics.count("pubmed", fetched=3)
+
+    try:
+        with track_run(engine, "seed"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with Session(engine) as session:
+        runs = {r.name: r for r in session.exec(select(IngestionRun)).all()}
+        refresh = runs["refresh"]
+        assert refresh.status == "ok" and refresh.records_written == 1 and refresh.duration_ms is not None
+        summary = json.loads(refresh.metrics)
+        assert summary["sources"]["clinical_trials"]["fetched"] == 1
+        assert summary["sources"]["clinical_trials"]["inserted"] == 1
+        assert summary["sources"]["pubmed"]["errors"] == 1 and "timeout" in summary["errors"][0]
+        http = summary["http"]["clinicaltrials.gov"]
+        assert http["requests"] == 2 and http["throttled"] == 1 and http["retries"] == 1
+        assert http["histogram_ms"]["50"] == 1 and http["histogram_ms"]["250"] == 1
+        assert summary["stages"]["fetch.clinical_trials"]["calls"] == 1
+        assert runs["seed"].status == "error" and runs["seed"].error == "boom"
+
+    print("Ingestion run metrics test passed!")
+
+def test_alert_fan_out():
+    print("Testing alert fan-out...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for name in ["Alpha", "Beta", "Gamma"]:
+            session.add(Product(name=name))
+        for name in ["ana", "bob"]:
+            session.add(User(username=name, email=f"{name}@b.c", password_hash="x"))
+        session.commit()
+        session.add(AlertSubscription(user_id=1, product_id=1))
+        session.add(AlertSubscription(user_id=2, product_id=1, alert_patents=False))
+        session.add(AlertSubscription(user_id=2, product_id=2))
+        # Existing rows are not sent on the first dispatch
+        session.add(ClinicalTrial(product_id=1, nct_id="NCT00000001", title="Old trial", status="Completed", phase="Phase 3"))
+        session.commit()
+
+    assert dispatch_alerts(engine) == 0
+
+    with Session(engine) as session:
+        session.add(ClinicalTrial(product_id=1, nct_id="NCT00000002", title="New trial", status="Recruiting", phase="Phase 2"))
+        session.add(Patent(product_id=1, source_id="US1", title="New patent", status="Granted"))
+        session.add(Patent(product_id=2, source_id="US2", title="Beta patent", status="Granted"))
+        session.add(Patent(product_id=3, source_id="US3", title="Unwatched patent", status="Granted"))
+        session.commit()
+
+    assert dispatch_alerts(engine) == 4
+    # Nothing new, nothing sent
+    assert dispatch_alerts(engine) == 0
+
+    with Session(engine) as session:
+        sent = {(n.user_id, n.record_type, n.title) for n in session.exec(select(Notification)).all()}
+        assert sent == {
+            (1, "trial", "New trial"), (1, "patent", "New patent"),
+            (2, "trial", "New trial"), (2, "patent", "Beta patent"),
+        }
+
+    # A lower id that commits after the cursor moved past it is picked up within the grace window
+    with Session(engine) as session:
+        session.add(Patent(id=10, product_id=2, source_id="US10", title="Later patent", status="Granted"))
+        session.commit()
+    assert dispatch_alerts(engine) == 1
+    with Session(engine) as session:
+        session.add(Patent(id=8, product_id=2, source_id="US8", title="Late commit", status="Granted"))
+        session.commit()
+        assert dispatch_new_records(session, grace=0) == 0
+        dispatch_new_records(session, grace=5)
+        session.commit()
+        late = session.exec(select(Notification).where(Notification.title == "Late commit")).all()
+        assert [n.user_id for n in late] == [2]
+        # Records already notified are not sent twice
+        assert dispatch_new_records(session, grace=5) == 0
+
+    print("Alert fan-out test passed!")
+
+def test_alert_stream():
+    print("Testing live alert stream...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Product(name="Alpha"))
+        session.add(User(username="ana", email="ana@b.c", password_hash="x"))
+        session.commit()
+        session.add(AlertSubscription(user_id=1, product_id=1))
+        session.commit()
+    dispatch_alerts(engine)
+
+    def ingest_trial():
+        with Session(engine) as session:
+            session.add(ClinicalTrial(product_id=1, nct_id="NCT00000002", title="New trial", status="Recruiting", phase="Phase 2"))
+            session.commit()
+        return dispatch_alerts(engine)
+
+    async def run():
+        # Long poll interval: delivery must come from the dispatch waking the broker
+        broker = AlertBroker(engine, poll_seconds=60)
+        try:
+            stream = broker.stream(1, heartbeat=0.05)
+            assert (await stream.__anext__()).startswith("retry:")
+            await asyncio.sleep(0.05)
+            assert await stream.__anext__() == ": ping\n\n"
+            assert broker.connections() == 1
+
+            assert await asyncio.to_thread(ingest_trial) == 1
+            frame = await asyncio.wait_for(stream.__anext__(), 2)
+            assert frame.startswith("id: 1\nevent: trial\n") and '"title": "New trial"' in frame
+            await stream.aclose()
+            assert broker.connections() == 0
+
+            # Reconnecting with Last-Event-ID replays what was missed
+            stream = broker.stream(1, last_event_id=0, heartbeat=0.05)
+            await stream.__anext__()
+            assert (await stream.__anext__()).startswith("id: 1\n")
+            await stream.aclose()
+        finally:
+            await broker.stop()
+            alerts.remove_listener(broker.notify)
+
+    asyncio.run(run())
+    print("Live alert stream test passed!")
+
+class FlakySink:
+    """Collects digests; fails the first `failures` sends."""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def send(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("smtp down")
+        self.batches.append(messages)
+
+def test_alert_digests():
+    print("Testing alert digests...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for name in ["Alpha", "Beta"]:
+            session.add(Product(name=name))
+        for name in ["ana", "bob", "cy"]:
+            session.add(User(username=name, email=f"{name}@b.c", password_hash="x"))
+        session.commit()
+        session.add(AlertSubscription(user_id=1, product_id=1))
+        session.add(AlertSubscription(user_id=2, product_id=1))
+        session.add(AlertSubscription(user_id=2, product_id=2, alert_patents=False))
+        session.add(AlertSubscription(user_id=3, product_id=1, digest_frequency="weekly"))
+        session.commit()
+
+    start = datetime(2025, 1, 1, 8)
+    dispatch_alerts(engine)
+    assert send_due_digests(engine, FlakySink(), now=start) == 0
+
+    with Session(engine) as session:
+        for i in range(8):
+            session.add(ClinicalTrial(product_id=1, nct_id=f"NCT0000001{i}", title=f"Trial {i}", status="Recruiting", phase="Phase 2"))
+        session.add(Patent(product_id=2, source_id="US2", title="Beta patent", status="Granted"))
+        session.add(ClinicalTrial(product_id=2, nct_id="NCT00000020", title="Beta trial", status="Recruiting", phase="Phase 1"))
+        session.commit()
+    dispatch_alerts(engine)
+
+    # Not due yet
+    assert send_due_digests(engine, FlakySink(), now=start + timedelta(hours=12)) == 0
+
+    sink = FlakySink(failures=1)
+    assert send_due_digests(engine, sink, now=start + timedelta(days=1)) == 2
+    messages = {m["to"]: m for batch in sink.batches for m in batch}
+    assert set(messages) == {"ana@b.c", "bob@b.c"}
+    assert "8 new clinical trials" in messages["ana@b.c"]["body"] and "... and 3 more" in messages["ana@b.c"]["body"]
+    bob = messages["bob@b.c"]["body"]
+    assert "Alpha" in bob and "Beta trial" in bob and "patent" not in bob
+    assert messages["bob@b.c"]["subject"].endswith("9 updates on 2 products")
+
+    # Window consumed: the next daily digest has nothing new, the weekly one goes out later
+    assert send_due_digests(engine, FlakySink(), now=start + timedelta(days=2)) == 0
+    sink = FlakySink()
+    assert send_due_digests(engine, sink, now=start + timedelta(days=7)) == 1
+    assert sink.batches[0][0]["to"] == "cy@b.c"
+
+    # One user's delivery keeps failing: the others move on, that user is sent the whole backlog later
+    class BouncingSink(FlakySink):
+        def send(self, messages):
+            if any(m["to"] == "bob@b.c" for m in messages):
+                raise ConnectionError("mailbox unavailable")
+            super().send(messages)
+
+    def add_trial(nct_id, title):
+        with Session(engine) as session:
+            session.add(ClinicalTrial(product_id=1, nct_id=nct_id, title=title, status="Recruiting", phase="Phase 3"))
+            session.commit()
+        dispatch_alerts(engine)
+
+    deliver = digests.deliver
+    digests.deliver = lambda sink, messages: deliver(sink, messages, batch_size=1, retries=0)
+    try:
+        add_trial("NCT00000030", "Missed trial")
+        sink = BouncingSink()
+        assert send_due_digests(engine, sink, now=start + timedelta(days=8)) == 1
+        assert [m["to"] for batch in sink.batches for m in batch] == ["ana@b.c"]
+
+        add_trial("NCT00000031", "Next trial")
+        sink = FlakySink()
+        assert send_due_digests(engine, sink, now=start + timedelta(days=9)) == 2
+        messages = {m["to"]: m["body"] for batch in sink.batches for m in batch}
+        assert "Missed trial" not in messages["ana@b.c"] and "Next trial" in messages["ana@b.c"]
+        assert "Missed trial" in messages["bob@b.c"] and "Next trial" in messages["bob@b.c"]
+
+        # Caught up: back on the shared window
+        add_trial("NCT00000032", "Last trial")
+        sink = FlakySink()
+        assert send_due_digests(engine, sink, now=start + timedelta(days=10)) == 2
+        assert all("Next trial" not in m["body"] for batch in sink.batches for m in batch)
+    finally:
+        digests.deliver = deliver
+
+    print("Alert digests test passed!")
+
+if __name__ == "__main__":
+    test_incremental_refresh_uses_watermark()
+    test_bulk_upsert_on_natural_key()
+    test_content_hash_skips_unchanged_rows()
+    test_compound_property_cache()
+    test_refresh_scheduler()
+    test_refresh_catalogue_isolates_failures()
+    test_host_rate_limits()
+    test_ingestion_run_metrics()
+    test_alert_fan_out()
+    test_alert_stream()
+    test_alert_digests()
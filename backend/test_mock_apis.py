@@ -0,0 +1,127 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.mock_server import serve, MockAPI
+from data_ingestion import http_client
+from data_ingestion.openfda_connector import OpenFDAConnector
+from data_ingestion.clinical_trials_connector import ClinicalTrialsConnector
+import xml.etree.ElementTree as ET
+from data_ingestion.pubmed_connector import PubMedConnector, parse_article
+from backend import pubmed_connector as backend_pubmed
+
+def test_connectors_retry_throttled_requests():
+    print("Testing connectors against the mock APIs...")
+    server = serve(port=0, latency_scale=0)  # Real rate limits, no artificial latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    statuses = []
+    listener = lambda url, seconds, status, attempt: statuses.append(status)
+    http_client.add_listener(listener)
+    try:
+        fda = OpenFDAConnector()
+        fda.BASE_URL = f"{base}/openfda/drug/label.json"
+        fda.archive = False  # Nothing to keep from a test run
+        drugs = [f"Mockdrug {n}" for n in range(8)]
+        # OpenFDA allows 4 requests/s: half of these are throttled, then retried
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            labels = list(pool.map(fda.search, drugs))
+        assert all(len(l) == 1 for l in labels)
+        assert labels[3][0].metadata["brand_name"] == "MOCKDRUG 3"
+        assert 429 in statuses
+
+        ct = ClinicalTrialsConnector()
+        ct.BASE_URL = f"{base}/ctgov/studies"
+        ct.archive = False
+        trials = ct.search("Mockdrug 1")
+        assert len(trials) == 5 and trials[0].source_id.startswith("NCT")
+    finally:
+        http_client.remove_listener(listener)
+        server.shutdown()
+
+    print("Mock API test passed!")
+
+def test_incremental_fetches_page_through_results():
+    print("Testing paged incremental fetches...")
+    server = serve(port=0, latency_scale=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    api = MockAPI(latency_scale=0)
+    since = datetime(2024, 1, 1)
+
+    urls = []
+    listener = lambda url, seconds, status, attempt: urls.append(url)
+    http_client.add_listener(listener)
+    try:
+        pubmed = PubMedConnector()
+        pubmed.BASE_URL = f"{base}/pubmed"
+        pubmed.archive = False
+        pubmed.page_size = 25
+        total = int(json_body(api.esearch({"term": "Mockdrug 1"}))["esearchresult"]["count"])
+        assert total > 2 * pubmed.page_size
+        # Every hit in the since-window is fetched, not just the first page
+        articles = pubmed.search("Mockdrug 1", since=since)
+        assert len(articles) == total
+        assert len([u for u in urls if "esearch" in u and "retstart" in u]) >= 3
+        # Without a watermark only the first few most relevant articles are taken
+        assert len(pubmed.search("Mockdrug 1")) == pubmed.initial_results
+
+        # The on-demand refresh pages through its since-window too
+        original = backend_pubmed.BASE_URL, backend_pubmed.PAGE_SIZE, backend_pubmed.MAX_RESULTS
+        backend_pubmed.BASE_URL, backend_pubmed.PAGE_SIZE = f"{base}/pubmed", 25
+        try:
+            articles = asyncio.run(backend_pubmed.fetch_pubmed_articles("Mockdrug 1", max_results=5, mindate=since))
+            assert len(articles) == total > 5 and all(a["entrez_date"] for a in articles)
+            assert len(asyncio.run(backend_pubmed.fetch_pubmed_articles("Mockdrug 1", max_results=5))) == 5
+            # A window too large to page through leaves the watermark where it was
+            backend_pubmed.MAX_RESULTS = 30
+            articles = asyncio.run(backend_pubmed.fetch_pubmed_articles("Mockdrug 1", max_results=5, mindate=since))
+            assert len(articles) == 30 and not any(a["entrez_date"] for a in articles)
+        finally:
+            backend_pubmed.BASE_URL, backend_pubmed.PAGE_SIZE, backend_pubmed.MAX_RESULTS = original
+
+        ct = ClinicalTrialsConnector()
+        ct.BASE_URL = f"{base}/ctgov/studies"
+        ct.archive = False
+        ct.page_size = 7
+        total = json_body(api.studies({"query.term": "Mockdrug 2", "countTotal": "true"}))["totalCount"]
+        assert total > ct.page_size
+        urls.clear()
+        trials = ct.search("Mockdrug 2", since=since)
+        assert len(trials) == total and len({t.source_id for t in trials}) == len(trials)
+        assert any("pageToken" in u for u in urls) and all("LastUpdatePostDate%3Aasc" in u for u in urls)
+    finally:
+        http_client.remove_listener(listener)
+        server.shutdown()
+
+    print("Paged incremental fetch test passed!")
+
+def test_article_doi_ignores_references():
+    print("Testing PubMed DOI extraction...")
+    article = """<PubmedArticle><MedlineCitation><PMID>42</PMID><Article><ArticleTitle>Letter</ArticleTitle>{elocation}</Article></MedlineCitation>
+<PubmedData><ArticleIdList><ArticleId IdType="pubmed">42</ArticleId>{own}</ArticleIdList>
+<ReferenceList><Reference><Citation>Cited.</Citation><ArticleIdList><ArticleId IdType="doi">10.1000/ref</ArticleId></ArticleIdList></Reference></ReferenceList>
+</PubmedData></PubmedArticle>"""
+    def doi(**parts):
+        return parse_article(ET.fromstring(article.format(**dict({"elocation": "", "own": ""}, **parts)))).source_id
+
+    # The cited paper's DOI is never the article's own
+    assert doi() == "PMID:42"
+    assert doi(own='<ArticleId IdType="doi">10.1000/own</ArticleId>') == "10.1000/own"
+    assert doi(elocation='<ELocationID EIdType="doi" ValidYN="Y">10.1000/eloc</ELocationID>') == "10.1000/eloc"
+    print("PubMed DOI extraction test passed!")
+
+def json_body(response):
+    """Body of a MockAPI (content_type, body) handler result."""
+    return json.loads(response[1])
+
+if __name__ == "__main__":
+    test_connectors_retry_throttled_requests()
+    test_incremental_fetches_page_through_results()
+    test_article_doi_ignores_references()
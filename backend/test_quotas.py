@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+from backend.auth import create_token, token_cache
+from backend.models import User, SubscriptionPlan, UserSubscription
+from backend.quotas import QuotaMiddleware, parse_features, DEFAULT_LIMITS
+
+def make_app(engine, **options):
+    app = FastAPI()
+    app.add_middleware(QuotaMiddleware, engine=engine, enabled=True, **options)
+
+    @app.get("/products/")
+    def products():
+        return []
+
+    @app.post("/chat")
+    def chat():
+        return {"reply": "ok"}
+
+    @app.get("/reports/landscape")
+    def landscape():
+        return {"pdf": "..."}
+
+    return app
+
+def test_plan_quotas():
+    print("Testing plan-aware quotas...")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(username="free", email="free@b.c", password_hash="x"))
+        session.add(User(username="pro", email="pro@b.c", password_hash="x"))
+        session.add(SubscriptionPlan(name="Pro", price_monthly=49.99, features=json.dumps({
+            "features": ["predictor"], "limits": {"reports_per_day": 2, "chat_per_minute": None}
+        })))
+        session.commit()
+        session.add(UserSubscription(user_id=2, plan_id=1))
+        session.commit()
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    client = TestClient(make_app(engine))
+
+    # Anonymous callers are limited per client address
+    replies = [client.post("/chat").status_code for _ in range(6)]
+    assert replies == [200] * 5 + [429]
+    rejected = client.post("/chat")
+    assert rejected.json()["limit"] == "chat_per_minute" and int(rejected.headers["retry-after"]) >= 1
+    assert client.get("/products/").status_code == 200
+
+    # The plan's limits apply; entitlements are loaded once
+    pro = {"Authorization": f"Bearer {create_token(2, 'pro')}"}
+    assert [client.get("/reports/landscape", headers=pro).status_code for _ in range(3)] == [200, 200, 429]
+    assert all(client.post("/chat", headers=pro).status_code == 200 for _ in range(20))
+    assert len(queries) == 1
+
+    # Users without a plan get the defaults
+    free = {"Authorization": f"Bearer {create_token(1, 'free')}"}
+    assert client.post("/chat", headers=free).status_code == 200
+
+    # Verified tokens are cached: the next request runs no HMAC
+    assert token_cache.get(pro["Authorization"][7:]) == 2
+
+    # Behind a trusted proxy anonymous callers are told apart by X-Forwarded-For...
+    proxied = TestClient(make_app(engine, trusted_proxies={"testclient", "10.0.0.2"}))
+    for caller in ["203.0.113.5", "203.0.113.6"]:
+        headers = {"X-Forwarded-For": f"{caller}, 10.0.0.2"}
+        assert [proxied.post("/chat", headers=headers).status_code for _ in range(6)] == [200] * 5 + [429]
+    # ...which is ignored from anyone else
+    direct = TestClient(make_app(engine))
+    replies = [direct.post("/chat", headers={"X-Forwarded-For": f"198.51.100.{i}"}).status_code for i in range(6)]
+    assert replies == [200] * 5 + [429]
+
+    # Historical plans store a plain feature list
+    assert parse_features('["search", "predictor"]') == (["search", "predictor"], DEFAULT_LIMITS)
+    print("Plan quota test passed!")
+
+if __name__ == "__main__":
+    test_plan_quotas()
@@ -1,40 +1,35 @@
 from sqlmodel import Session, select, create_engine
 from backend.models import Product
+from backend.ingestion import set_if_changed
 
 # Connect to DB
 engine = create_engine('sqlite:///backend/database.db')
 
+MOA_IMAGES = {
+    1: ("Keytruda", "/app/assets/moa_keytruda.png"),
+    2: ("Ozempic", "/app/assets/moa_ozempic.png"),
+    3: ("Humira", "/app/assets/moa_humira.png"),
+    4: ("Eliquis", "/app/assets/moa_eliquis.png"),
+}
+
 def update_moa():
+    changed = unchanged = 0
     with Session(engine) as session:
-        # 1. Keytruda
-        p1 = session.get(Product, 1)
-        if p1:
-            p1.moa_video_url = "/app/assets/moa_keytruda.png"
-            session.add(p1)
-            print("Updated Keytruda")
-
-        # 2. Ozempic
-        p2 = session.get(Product, 2)
-        if p2:
-            p2.moa_video_url = "/app/assets/moa_ozempic.png"
-            session.add(p2)
-            print("Updated Ozempic")
-        
-        # 3. Humira
-        p3 = session.get(Product, 3)
-        if p3:
-            p3.moa_video_url = "/app/assets/moa_humira.png"
-            session.add(p3)
-            print("Updated Humira")
-
-        # 4. Eliquis
-        p4 = session.get(Product, 4)
-        if p4:
-            p4.moa_video_url = "/app/assets/moa_eliquis.png"
-            session.add(p4)
-            print("Updated Eliquis")
+        for product_id, (label, url) in MOA_IMAGES.items():
+            product = session.get(Product, product_id)
+            if not product:
+                continue
+            # Skip the write when the image is already set
+            if set_if_changed(product, moa_video_url=url):
+                session.add(product)
+                changed += 1
+                print(f"Updated {label}")
+            else:
+                unchanged += 1
 
-        session.commit()
+        if changed:
+            session.commit()
+        print(f"MoA images: {changed} changed, {unchanged} unchanged.")
 
 if __name__ == "__main__":
     update_moa()
@@ -9,10 +9,6 @@ def update_synthesis():
         # Eliquis (ID 4)
         product = session.get(Product, 4)
         if product:
-            # Clear existing steps
-            for step in product.synthesis_steps:
-                session.delete(step)
-            
             # Add new real steps
             steps = [
                 "Formation of the pyrazole-5-carboxamide intermediate from ethyl 2-chloro-2-(2-(4-methoxyphenyl)hydrazono)acetate.",
@@ -20,6 +16,16 @@ def update_synthesis():
                 "Ullmann-type coupling with 4-iodo-delta-valerolactam to introduce the lactam ring.",
                 "Final amidation of the ester group to yield Apixaban."
             ]
+
+            # Re-runs with the same steps leave the table untouched
+            existing = sorted(product.synthesis_steps, key=lambda s: s.id)
+            if [s.step_description for s in existing] == steps:
+                print(f"Eliquis Synthesis Steps unchanged ({len(steps)} steps).")
+                return
+
+            # Clear existing steps
+            for step in existing:
+                session.delete(step)
             
             for step_desc in steps:
                 step = ProductSynthesis(
@@ -29,7 +35,7 @@ def update_synthesis():
                 session.add(step)
             
             session.commit()
-            print("Updated Eliquis Synthesis Steps")
+            print(f"Updated Eliquis Synthesis Steps: {len(existing)} replaced by {len(steps)}.")
 
 if __name__ == "__main__":
     update_synthesis()
@@ -0,0 +1,185 @@
+"""
+Throughput benchmark for the ingestion layer, run against the local mock
+APIs (benchmarks/mock_server.py) instead of the live sources.
+
+Measures, per connector and for a full `seed()` into a scratch database:
+records/second, p50/p95 request latency as seen by the client (including
+retries after 429s) and peak RSS.
+
+Usage:
+    python benchmarks/bench_ingestion.py [--drugs 40] [--workers 8] [--no-seed]
+                                         [--latency-scale 1.0] [--rate-scale 1.0] [--json out.json]
+"""
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import resource
+import subprocess
+import shutil
+import tempfile
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mock_server(port, latency_scale, rate_scale):
+    proc = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_server.py"),
+        "--port", str(port), "--latency-scale", str(latency_scale), "--rate-scale", str(rate_scale)
+    ])
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Mock server did not start")
+
+def point_connectors_at(base):
+    """Must run before the connectors are imported: base URLs are read at import time."""
+    os.environ["PUBMED_BASE_URL"] = f"{base}/pubmed"
+    os.environ["CLINICAL_TRIALS_BASE_URL"] = f"{base}/ctgov"
+    os.environ["OPENFDA_BASE_URL"] = f"{base}/openfda"
+    os.environ["PUBCHEM_BASE_URL"] = f"{base}/pubchem"
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = []  # (url, seconds, status, attempt)
+        self.lock = threading.Lock()
+
+    def __call__(self, url, seconds, status, attempt):
+        with self.lock:
+            self.samples.append((url, seconds, status, attempt))
+
+    def reset(self):
+        with self.lock:
+            self.samples = []
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = sorted(s[1] * 1000 for s in self.samples)
+            throttled = sum(1 for s in self.samples if s[2] == 429)
+            retries = sum(1 for s in self.samples if s[3] > 0)
+        pct = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 1) if latencies else None
+        return {"requests": len(latencies), "p50_ms": pct(0.50), "p95_ms": pct(0.95),
+                "throttled": throttled, "retries": retries}
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux; children covers seed()'s worker processes once they exit
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+def run_case(name, recorder, fn):
+    recorder.reset()
+    started = time.perf_counter()
+    records = fn()
+    elapsed = time.perf_counter() - started
+    result = {"case": name, "records": records, "seconds": round(elapsed, 2),
+              "records_per_s": round(records / elapsed, 1) if elapsed else None}
+    result.update(recorder.summary())
+    result["peak_rss_mb"] = peak_rss_mb()["self"]
+    return result
+
+
+def bench_connectors(drugs, workers, recorder):
+    from data_ingestion.pubmed_connector import PubMedConnector
+    from data_ingestion.clinical_trials_connector import ClinicalTrialsConnector
+    from data_ingestion.openfda_connector import OpenFDAConnector
+    from data_ingestion.pubchem_connector import PubChemConnector
+
+    def search_all(connector):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return sum(len(r) for r in pool.map(connector.search, drugs))
+
+    def pubchem_batch():
+        props = PubChemConnector().get_compound_properties_batch(drugs)
+        return sum(1 for p in props.values() if p)
+
+    return [
+        run_case("pubmed.search", recorder, lambda: search_all(PubMedConnector())),
+        run_case("clinical_trials.search", recorder, lambda: search_all(ClinicalTrialsConnector())),
+        run_case("openfda.search", recorder, lambda: search_all(OpenFDAConnector())),
+        run_case("pubchem.batch", recorder, pubchem_batch),
+    ]
+
+def bench_seed(recorder):
+    from sqlmodel import Session, select, func
+    from backend import seed_data
+    from backend.models import Product, ClinicalTrial, ScientificArticle, Patent, ProductSideEffect
+
+    def run():
+        asyncio.run(seed_data.seed())
+        with Session(seed_data.engine) as session:
+            return sum(session.exec(select(func.count()).select_from(m)).one()
+                       for m in [Product, ClinicalTrial, ScientificArticle, Patent, ProductSideEffect])
+
+    result = run_case("seed()", recorder, run)
+    result["peak_rss_mb_workers"] = peak_rss_mb()["children"]
+    return result
+
+
+def print_table(results):
+    header = f"{'case':<24}{'records':>9}{'secs':>8}{'rec/s':>9}{'reqs':>7}{'p50 ms':>9}{'p95 ms':>9}{'429s':>6}{'RSS MB':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['case']:<24}{r['records']:>9}{r['seconds']:>8}{r['records_per_s']:>9}{r['requests']:>7}"
+              f"{r['p50_ms'] or '-':>9}{r['p95_ms'] or '-':>9}{r['throttled']:>6}{r['peak_rss_mb']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the connectors and seed() against the mock APIs.")
+    parser.add_argument("--drugs", type=int, default=40, help="Drug names queried per connector")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent searches per connector")
+    parser.add_argument("--no-seed", action="store_true", help="Skip the full seed() run")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--rate-scale", type=float, default=1.0)
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_mock_server(port, args.latency_scale, args.rate_scale)
+    scratch = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        point_connectors_at(f"http://127.0.0.1:{port}")
+        os.environ.setdefault("RAW_ARCHIVE", "off")
+        os.environ["SEED_DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+        from data_ingestion import http_client
+        recorder = LatencyRecorder()
+        http_client.add_listener(recorder)
+
+        with open(os.path.join(ROOT, "openfda_discovery.json"), encoding="utf-8") as fh:
+            drugs = [d["term"] for d in json.load(fh)["results"]]
+        drugs = (drugs + [f"Mockdrug {n:04d}" for n in range(args.drugs)])[:args.drugs]
+
+        results = bench_connectors(drugs, args.workers, recorder)
+        if not args.no_seed:
+            results.append(bench_seed(recorder))
+        print_table(results)
+
+        if args.json:
+            with open(args.json, "w") as fh:
+                json.dump(results, fh, indent=2)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
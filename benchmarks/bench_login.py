@@ -0,0 +1,135 @@
+"""
+Login burst benchmark: API latency of an unrelated endpoint while a burst of
+logins is in flight, in-process against the FastAPI app and a scratch
+database.
+
+Runs the burst twice:
+- "blocking": the previous behaviour, hashing inline in a sync endpoint, so
+  every login holds a request threadpool thread for the whole PBKDF2/scrypt run;
+- "offloaded": the real /auth/login, hashing on the bounded password pool.
+
+The probe (GET /products/, a sync endpoint) is sampled throughout; its p50/p95
+should stay close to the idle baseline in the offloaded case.
+
+Usage:
+    python benchmarks/bench_login.py [--logins 200] [--users 20] [--json out.json]
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import asyncio
+import tempfile
+import shutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# The burst comes from one client: keep the API rate limits out of the measurement
+os.environ.setdefault("QUOTAS", "off")
+
+PASSWORD = "correct horse battery staple"
+
+
+def percentiles(samples) -> dict:
+    latencies = sorted(s * 1000 for s in samples)
+    pct = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 1) if latencies else None
+    return {"probes": len(latencies), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "max_ms": pct(1.0)}
+
+async def probe_until(client, done: asyncio.Event, interval: float = 0.01) -> list:
+    samples = []
+    while not done.is_set():
+        started = time.perf_counter()
+        response = await client.get("/products/")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return samples
+
+async def run_case(client, name, path, logins, users):
+    done = asyncio.Event()
+    probe = asyncio.create_task(probe_until(client, done))
+    started = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post(path, json={"username": f"user{i % users}", "password": PASSWORD}) for i in range(logins)
+    ])
+    elapsed = time.perf_counter() - started
+    done.set()
+    samples = await probe
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200][:1]
+    result = {"case": name, "logins": logins, "seconds": round(elapsed, 2), "logins_per_s": round(logins / elapsed, 1)}
+    result.update(percentiles(samples))
+    return result
+
+async def bench(logins, users):
+    import httpx
+    from sqlmodel import SQLModel, Session, create_engine, select
+    from backend import main, auth
+    from backend.models import Product, User
+
+    scratch = tempfile.mkdtemp(prefix="bench_login_")
+    try:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}", connect_args={"check_same_thread": False})
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            password_hash = auth.hash_password(PASSWORD)
+            for i in range(users):
+                session.add(User(username=f"user{i}", email=f"user{i}@bench.local", password_hash=password_hash))
+            for i in range(20):
+                session.add(Product(name=f"Benchmab {i}"))
+            session.commit()
+
+        def get_session():
+            with Session(engine) as session:
+                yield session
+        main.app.dependency_overrides[main.get_session] = get_session
+
+        # The pre-offload login: verification inline on the request threadpool
+        @main.app.post("/bench/login-blocking")
+        def login_blocking(data: main.LoginRequest, session: Session = main.Depends(get_session)):
+            user = session.exec(select(User).where(User.username == data.username)).first()
+            password_hash = user.password_hash if user else None
+            session.rollback()  # Same connection handling as /auth/login: only the threadpool differs
+            if not user or not auth.verify_password(data.password, password_hash):
+                raise main.HTTPException(status_code=401, detail="Invalid credentials")
+            return {"access_token": auth.create_token(user.id, user.username)}
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            idle_done = asyncio.Event()
+            idle = asyncio.create_task(probe_until(client, idle_done))
+            await asyncio.sleep(1.0)
+            idle_done.set()
+            results = [dict({"case": "idle", "logins": 0, "seconds": 1.0, "logins_per_s": 0}, **percentiles(await idle))]
+            results.append(await run_case(client, "blocking", "/bench/login-blocking", logins, users))
+            results.append(await run_case(client, "offloaded", "/auth/login", logins, users))
+        return results
+    finally:
+        main.app.dependency_overrides.clear()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def print_table(results):
+    header = f"{'case':<12}{'logins':>8}{'secs':>8}{'login/s':>9}{'probes':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['case']:<12}{r['logins']:>8}{r['seconds']:>8}{r['logins_per_s']:>9}{r['probes']:>8}"
+              f"{r['p50_ms'] or '-':>9}{r['p95_ms'] or '-':>9}{r['max_ms'] or '-':>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API latency under a login burst.")
+    parser.add_argument("--logins", type=int, default=200, help="Concurrent logins in the burst")
+    parser.add_argument("--users", type=int, default=20, help="Distinct accounts logging in")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args.logins, args.users))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
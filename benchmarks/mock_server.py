@@ -0,0 +1,341 @@
+"""
+Local stand-in for the APIs behind data_ingestion/: PubMed E-utilities,
+ClinicalTrials.gov API v2, OpenFDA drug labels and PubChem PUG REST.
+
+Responses are built from recorded fixtures (benchmarks/fixtures/ and the
+openfda_*.json samples at the repo root) with deterministic, per-query
+result sets, so runs are repeatable. Each source reproduces:
+- the response shape and pagination parameters of the real API,
+- a log-normal latency distribution,
+- its published rate limit, answered with 429 + Retry-After when exceeded.
+
+Point the connectors at it with the *_BASE_URL environment variables:
+    PUBMED_BASE_URL=http://127.0.0.1:8765/pubmed
+    CLINICAL_TRIALS_BASE_URL=http://127.0.0.1:8765/ctgov
+    OPENFDA_BASE_URL=http://127.0.0.1:8765/openfda
+    PUBCHEM_BASE_URL=http://127.0.0.1:8765/pubchem
+
+Usage:
+    python benchmarks/mock_server.py [--port 8765] [--latency-scale 1.0] [--rate-scale 1.0]
+
+GET /__stats returns request, 429 and latency counters per source.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import parse_qs, unquote, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Median latency (ms) and log-normal sigma, roughly as observed from our servers
+LATENCY = {
+    "pubmed": (180, 0.5),
+    "ctgov": (250, 0.6),
+    "openfda": (120, 0.4),
+    "pubchem": (150, 0.5),
+}
+
+# Published limits (requests/second): NCBI with an API key, CT.gov's
+# documented fair use, OpenFDA with a key (240/min), PubChem (5/s)
+RATE_LIMITS = {
+    "pubmed": 10,
+    "ctgov": 50,
+    "openfda": 4,
+    "pubchem": 5,
+}
+
+# Size of each query's result set, drawn per query from these ranges
+HITS = {
+    "pubmed": (20, 400),
+    "ctgov": (5, 60),
+}
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()[:12], 16)
+
+def _rng(*parts) -> random.Random:
+    return random.Random(_seed(*parts))
+
+def _load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as fh:
+        return fh.read()
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockAPI:
+    """Response generation and per-source throttling, independent of the HTTP plumbing."""
+
+    def __init__(self, latency_scale: float = 1.0, rate_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        self.buckets = {s: TokenBucket(r * rate_scale) for s, r in RATE_LIMITS.items()} if rate_scale > 0 else {}
+        self.article_xml = Template(_load("pubmed_article.xml"))
+        self.summary_json = Template(_load("pubmed_esummary_item.json"))
+        self.study_json = Template(_load("ctgov_study.json"))
+        self.pubchem_props = json.loads(_load("pubchem_property.json"))
+        with open(os.path.join(ROOT, "openfda_sample.json"), encoding="utf-8") as fh:
+            self.label = json.load(fh)["results"][0]
+        with open(os.path.join(ROOT, "openfda_discovery.json"), encoding="utf-8") as fh:
+            self.top_drugs = json.load(fh)["results"]
+        self.stats = {s: {"requests": 0, "throttled": 0, "latency_ms": []} for s in LATENCY}
+        self.stats_lock = threading.Lock()
+
+    # ---------------------
+    # Throttling / latency
+    # ---------------------
+
+    def admit(self, source: str) -> bool:
+        bucket = self.buckets.get(source)
+        allowed = bucket is None or bucket.take()
+        with self.stats_lock:
+            self.stats[source]["requests"] += 1
+            if not allowed:
+                self.stats[source]["throttled"] += 1
+        return allowed
+
+    def delay(self, source: str) -> float:
+        median, sigma = LATENCY[source]
+        seconds = median * math.exp(random.gauss(0, sigma)) * self.latency_scale / 1000
+        with self.stats_lock:
+            self.stats[source]["latency_ms"].append(seconds * 1000)
+        return seconds
+
+    def summary(self) -> dict:
+        out = {}
+        with self.stats_lock:
+            for source, s in self.stats.items():
+                lat = sorted(s["latency_ms"])
+                out[source] = {
+                    "requests": s["requests"],
+                    "throttled": s["throttled"],
+                    "p50_ms": round(lat[len(lat) // 2], 1) if lat else None,
+                    "p95_ms": round(lat[int(len(lat) * 0.95)], 1) if lat else None,
+                }
+        return out
+
+    # ---------------------
+    # PubMed E-utilities
+    # ---------------------
+
+    def _pmids(self, term):
+        lo, hi = HITS["pubmed"]
+        rng = _rng("pubmed", term)
+        return [str(30000000 + rng.randrange(9000000)) for _ in range(rng.randint(lo, hi))]
+
+    def _article_fields(self, pmid, term=""):
+        rng = _rng("pmid", pmid)
+        return {"pmid": pmid, "term": term or "Study drug", "year": rng.randint(2015, 2025),
+                "month": f"{rng.randint(1, 12):02d}", "day": f"{rng.randint(1, 28):02d}"}
+
+    def esearch(self, params):
+        term = params.get("term", "").split("[")[0]
+        ids = self._pmids(term)
+        start = int(params.get("retstart", 0))
+        count = int(params.get("retmax", 20))
+        return "application/json", json.dumps({"header": {"type": "esearch", "version": "0.3"}, "esearchresult": {
+            "count": str(len(ids)), "retmax": str(min(count, max(len(ids) - start, 0))),
+            "retstart": str(start), "idlist": ids[start:start + count],
+            "querytranslation": f"{term}[All Fields]"
+        }})
+
+    def efetch(self, params):
+        ids = [i for i in params.get("id", "").split(",") if i]
+        body = "".join(self.article_xml.substitute(self._article_fields(i)) for i in ids)
+        return "text/xml", ('<?xml version="1.0" ?>\n<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, '
+                            '1st January 2024//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">\n'
+                            f"<PubmedArticleSet>{body}</PubmedArticleSet>")
+
+    def esummary(self, params):
+        ids = [i for i in params.get("id", "").split(",") if i]
+        result = {"uids": ids}
+        for i in ids:
+            result[i] = json.loads(self.summary_json.substitute(self._article_fields(i)))
+        return "application/json", json.dumps({"header": {"type": "esummary", "version": "0.3"}, "result": result})
+
+    # ---------------------
+    # ClinicalTrials.gov v2
+    # ---------------------
+
+    def studies(self, params):
+        term = params.get("query.term", "")
+        lo, hi = HITS["ctgov"]
+        rng = _rng("ctgov", term)
+        total = rng.randint(lo, hi)
+        offset = int(params.get("pageToken", 0) or 0)
+        size = min(int(params.get("pageSize", 10)), 1000)
+        studies = []
+        for n in range(offset, min(offset + size, total)):
+            r = _rng("ctgov", term, n)
+            studies.append(json.loads(self.study_json.substitute(
+                nct_id=f"NCT{r.randrange(10**7, 10**8)}", term=json.dumps(term)[1:-1], year=r.randint(2015, 2025),
+                month=f"{r.randint(1, 12):02d}", day=f"{r.randint(1, 28):02d}",
+                status=r.choice(["RECRUITING", "COMPLETED", "ACTIVE_NOT_RECRUITING", "TERMINATED"]),
+                phase=r.choice(["PHASE1", "PHASE2", "PHASE3"])
+            )))
+        page = {"studies": studies}
+        if params.get("countTotal") == "true":
+            page["totalCount"] = total
+        if offset + size < total:
+            page["nextPageToken"] = str(offset + size)
+        return "application/json", json.dumps(page)
+
+    # ---------------------
+    # OpenFDA drug labels
+    # ---------------------
+
+    def labels(self, params):
+        meta = {"disclaimer": "Mock openFDA", "last_updated": "2026-01-10"}
+        limit = int(params.get("limit", 1))
+        if "count" in params:
+            # The recorded aggregation is short: pad it with synthetic brands up to `limit`
+            top = self.top_drugs + [{"term": f"Mockdrug {n:04d}", "count": 10} for n in range(max(limit - len(self.top_drugs), 0))]
+            return 200, "application/json", json.dumps({"meta": meta, "results": top[:limit]})
+
+        search = params.get("search", "")
+        brand = search.split('"')[1] if '"' in search else search
+        label = copy.copy(self.label)
+        label["set_id"] = f"{_seed('label', brand.lower()):x}"
+        label["openfda"] = dict(label["openfda"], brand_name=[brand.upper()])
+        meta["results"] = {"skip": int(params.get("skip", 0)), "limit": limit, "total": 1}
+        return 200, "application/json", json.dumps({"meta": meta, "results": [label]})
+
+    # ---------------------
+    # PubChem PUG REST
+    # ---------------------
+
+    def _cid(self, name):
+        rng = _rng("pubchem", name.lower())
+        return None if rng.random() < 0.1 else rng.randrange(1000, 10**8)  # ~10% of names are unknown
+
+    def _props(self, cid):
+        return dict(self.pubchem_props, CID=cid)
+
+    def _not_found(self):
+        return 404, "application/json", json.dumps({"Fault": {"Code": "PUGREST.NotFound", "Message": "No CID found"}})
+
+    def pubchem(self, parts, form):
+        # compound/name/cids/JSON (POST name=), compound/name/<name>/property/<props>/JSON,
+        # compound/cid/property/<props>/JSON (POST cid=)
+        if parts[:3] == ["compound", "name", "cids"]:
+            cid = self._cid(form.get("name", ""))
+            if cid is None:
+                return self._not_found()
+            return 200, "application/json", json.dumps({"IdentifierList": {"CID": [cid]}})
+        if parts[:2] == ["compound", "name"] and len(parts) >= 4:
+            cid = self._cid(unquote(parts[2]))
+            if cid is None:
+                return self._not_found()
+            return 200, "application/json", json.dumps({"PropertyTable": {"Properties": [self._props(cid)]}})
+        if parts[:3] == ["compound", "cid", "property"]:
+            cids = [int(c) for c in form.get("cid", "").split(",") if c]
+            return 200, "application/json", json.dumps({"PropertyTable": {"Properties": [self._props(c) for c in cids]}})
+        return 404, "text/plain", "Unknown PubChem route"
+
+    # ---------------------
+    # Routing
+    # ---------------------
+
+    def handle(self, method, path, params, form):
+        """Returns (source, status, content_type, body)."""
+        parts = [p for p in path.split("/") if p]
+        if not parts or parts[0] not in LATENCY:
+            return None, 404, "text/plain", "Unknown route"
+        source, rest = parts[0], parts[1:]
+
+        if not self.admit(source):
+            return source, 429, "application/json", json.dumps({"error": "API rate limit exceeded"})
+        time.sleep(self.delay(source))
+
+        if source == "pubmed":
+            routes = {"esearch.fcgi": self.esearch, "efetch.fcgi": self.efetch, "esummary.fcgi": self.esummary}
+            handler = routes.get(rest[0] if rest else "")
+            if not handler:
+                return source, 404, "text/plain", "Unknown E-utility"
+            return (source, 200) + handler(params)
+        if source == "ctgov":
+            return (source, 200) + self.studies(params)
+        if source == "openfda":
+            return (source,) + self.labels(params)
+        return (source,) + self.pubchem(rest, form)
+
+
+def make_handler(api: MockAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, status, content_type, body):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, form):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                return self._respond(200, "application/json", json.dumps(api.summary()))
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            _, status, content_type, body = api.handle(self.command, url.path, params, form)
+            self._respond(status, content_type, body)
+
+        def do_GET(self):
+            self._dispatch({})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            self._dispatch({k: v[0] for k, v in parse_qs(raw).items()})
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output readable
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, latency_scale=1.0, rate_scale=1.0):
+    server = ThreadingHTTPServer((host, port), make_handler(MockAPI(latency_scale, rate_scale)))
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for PubMed, ClinicalTrials.gov, OpenFDA and PubChem.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier on the latency distributions (0 disables)")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="Multiplier on the rate limits (0 disables throttling)")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency_scale, args.rate_scale)
+    print(f"Mock APIs listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
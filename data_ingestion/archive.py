@@ -0,0 +1,160 @@
+"""
+Raw-payload archive: every source response the connectors map into
+IntelligenceRecords is also kept verbatim, so parsing or classification
+fixes can be re-applied locally (backend/reprocess_archive.py) instead of
+re-ingesting from the network.
+
+Layout: <root>/<source>/<timestamp>-<pid>.jsonl.zst, one JSON envelope per line:
+    {"source": ..., "id": ..., "query": ..., "fetched_at": ..., "payload": ...}
+
+Each write is appended as its own compressed frame (zstd frames and gzip
+members both concatenate), so segments are always readable even if the
+process dies. zstandard is optional; without it segments are gzip.
+
+Archiving is opt-in: set RAW_ARCHIVE=on. Segments go to <repo>/raw_archive
+(RAW_ARCHIVE_DIR moves it). Retention is enforced whenever a segment is
+started: segments older than RAW_ARCHIVE_MAX_DAYS are deleted, then the
+oldest ones until the archive fits in RAW_ARCHIVE_MAX_GB.
+"""
+import glob
+import gzip
+import io
+import json
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency: fall back to gzip segments
+    zstandard = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_DIR = os.path.abspath(os.environ.get("RAW_ARCHIVE_DIR", os.path.join(ROOT, "raw_archive")))
+ARCHIVE_ENABLED = os.environ.get("RAW_ARCHIVE", "off").lower() in ("on", "1", "true")
+SEGMENT_MAX_BYTES = int(os.environ.get("RAW_ARCHIVE_SEGMENT_MB", "64")) << 20
+# Retention (0 disables a limit)
+ARCHIVE_MAX_BYTES = int(float(os.environ.get("RAW_ARCHIVE_MAX_GB", "5")) * (1 << 30))
+ARCHIVE_MAX_AGE_SECONDS = float(os.environ.get("RAW_ARCHIVE_MAX_DAYS", "90")) * 86400
+ZSTD_LEVEL = 3
+
+SEGMENT_PATTERN = "*.jsonl.*"
+
+
+class RawArchive:
+    def __init__(self, root: str = ARCHIVE_DIR, use_zstd: Optional[bool] = None,
+                 max_bytes: int = ARCHIVE_MAX_BYTES, max_age_seconds: float = ARCHIVE_MAX_AGE_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.use_zstd = (zstandard is not None) if use_zstd is None else use_zstd
+        if self.use_zstd and zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        self.ext = ".jsonl.zst" if self.use_zstd else ".jsonl.gz"
+        self._segments = {}  # source -> current segment path
+        self._lock = threading.Lock()
+
+    def _segment(self, source: str) -> str:
+        path = self._segments.get(source)
+        if path is None or os.path.getsize(path) >= SEGMENT_MAX_BYTES:
+            folder = os.path.join(self.root, source)
+            os.makedirs(folder, exist_ok=True)
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            path = os.path.join(folder, f"{stamp}-{os.getpid()}{self.ext}")
+            open(path, "ab").close()
+            self._segments[source] = path
+            self.prune()
+        return path
+
+    def prune(self) -> int:
+        """Deletes expired segments, then the oldest ones over max_bytes. Returns the number deleted."""
+        in_use = set(self._segments.values())
+        segments = []
+        for path in list_segments(self.root):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Pruned by another process
+            segments.append((stat.st_mtime, stat.st_size, path))
+        segments.sort()
+
+        total = sum(size for _, size, _ in segments)
+        expire_before = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        deleted = 0
+        for mtime, size, path in segments:
+            expired = expire_before is not None and mtime < expire_before
+            if path in in_use or not (expired or (self.max_bytes and total > self.max_bytes)):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+        return deleted
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.use_zstd:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        return gzip.compress(data)
+
+    def write(self, source: str, query: Optional[str], items: Iterable[Tuple[str, Any]]) -> int:
+        """Appends one frame holding an envelope per (id, payload). Returns the number written."""
+        fetched_at = datetime.utcnow().isoformat()
+        lines = [
+            json.dumps({"source": source, "id": item_id, "query": query, "fetched_at": fetched_at, "payload": payload})
+            for item_id, payload in items
+        ]
+        if not lines:
+            return 0
+        frame = self._compress(("\n".join(lines) + "\n").encode("utf-8"))
+        with self._lock:
+            with open(self._segment(source), "ab") as fh:
+                fh.write(frame)
+        return len(lines)
+
+
+_default_archive = None
+
+def default_archive() -> Optional[RawArchive]:
+    """Process-wide archive used by the connectors, or None when archiving is disabled."""
+    global _default_archive
+    if ARCHIVE_ENABLED and _default_archive is None:
+        _default_archive = RawArchive()
+    return _default_archive if ARCHIVE_ENABLED else None
+
+
+# =====================
+# Reading
+# =====================
+
+def list_segments(root: str = ARCHIVE_DIR, sources: Optional[List[str]] = None) -> List[str]:
+    """Segment files, oldest first within each source (names start with a timestamp)."""
+    if not os.path.isdir(root):
+        return []
+    folders = sources or sorted(os.listdir(root))
+    files = []
+    for source in folders:
+        files.extend(sorted(glob.glob(os.path.join(root, source, SEGMENT_PATTERN))))
+    return files
+
+def iter_segment(path: str) -> Iterator[dict]:
+    """Yields the envelopes of one segment."""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        fh = open(path, "rb")
+        raw = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+    else:
+        fh = None
+        raw = gzip.open(path, "rb")
+    try:
+        for line in io.TextIOWrapper(raw, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        raw.close()
+        if fh:
+            fh.close()
@@ -0,0 +1,147 @@
+"""
+Helpers for reading the bulk download dumps published by our sources
+(OpenFDA, ClinicalTrials.gov, USPTO, PubMed...) from local disk without
+loading whole files into memory.
+"""
+import csv
+import glob
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+from contextlib import contextmanager
+from typing import IO, Iterator, List, Optional
+
+CHUNK_SIZE = 1 << 20  # 1 MiB of text per read
+
+_WS_OR_COMMA = re.compile(r"[\s,]*")
+
+# Flat-file dumps carry multi-MB free-text fields (e.g. AACT descriptions)
+csv.field_size_limit(sys.maxsize)
+
+
+def expand_paths(paths: List[str], pattern: str) -> List[str]:
+    """Expands directories to the files inside them matching `pattern`, sorted."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def iter_json_array(stream: IO[str], key: Optional[str], chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Incrementally yields the elements of the top-level array stored under `key`
+    in a (possibly multi-GB) JSON document, e.g. `{"meta": {...}, "results": [...]}`,
+    or of the document itself when `key` is None and it is an array.
+
+    Only the element being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key)) if key else re.compile(r'^\ufeff?\s*\[')
+    key = key or ""
+
+    # 1. Seek to the opening bracket of the array
+    buf = ""
+    while True:
+        match = start.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        if buf and not key:
+            return  # Not an array document
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        # Keep a tail in case the key is split across reads
+        buf = buf[-(len(key) + 16):] + chunk
+
+    # 2. Decode one element at a time, reading more text whenever an element is incomplete
+    pos = 0
+    while True:
+        pos = _WS_OR_COMMA.match(buf, pos).end()
+        if pos >= len(buf):
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+        # Drop consumed text so the buffer stays around one chunk
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def iter_zip_json_arrays(path: str, key: str) -> Iterator[dict]:
+    """Streams `key` array elements from every .json member of a zip archive (or a plain .json file)."""
+    if not zipfile.is_zipfile(path):
+        with open(path, encoding="utf-8") as fh:
+            yield from iter_json_array(fh, key)
+        return
+
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if not member.endswith(".json"):
+                continue
+            with zf.open(member) as raw:
+                yield from iter_json_array(io.TextIOWrapper(raw, encoding="utf-8"), key)
+
+
+@contextmanager
+def open_member(source: str, name: str) -> Iterator[Optional[IO[str]]]:
+    """
+    Opens file `name` from a dump that is either a directory or a zip archive
+    (members may sit in a sub-folder). Yields None when the dump has no such file.
+    """
+    if os.path.isdir(source):
+        matches = glob.glob(os.path.join(source, "**", name), recursive=True)
+        if not matches:
+            yield None
+            return
+        with open(matches[0], encoding="utf-8", newline="") as fh:
+            yield fh
+        return
+
+    with zipfile.ZipFile(source) as zf:
+        member = next((m for m in zf.namelist() if os.path.basename(m) == name), None)
+        if member is None:
+            yield None
+            return
+        with zf.open(member) as raw:
+            yield io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+def iter_delimited(source: str, name: str, delimiter: str = "|") -> Iterator[dict]:
+    """Streams the rows of a delimited flat file (header line first) from a dump directory or zip."""
+    with open_member(source, name) as fh:
+        if fh is None:
+            return
+        yield from csv.DictReader(fh, delimiter=delimiter)
+
+def iter_json_documents(source: str) -> Iterator[dict]:
+    """Streams one-document-per-file JSON dumps (e.g. the ClinicalTrials.gov NCTxxxxxxxx.json export)."""
+    if os.path.isdir(source):
+        for path in sorted(glob.glob(os.path.join(source, "**", "*.json"), recursive=True)):
+            with open(path, encoding="utf-8") as fh:
+                yield json.load(fh)
+        return
+
+    with zipfile.ZipFile(source) as zf:
+        for member in zf.namelist():
+            if member.endswith(".json"):
+                with zf.open(member) as raw:
+                    yield json.load(raw)
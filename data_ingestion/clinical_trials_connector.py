@@ -1,69 +1,170 @@
-import httpx
-from typing import List
+import os
+import re
+import time
+import subprocess
+from typing import List, Optional
 from datetime import datetime
+from urllib.parse import urlencode
 from .models import DataSourceConnector, IntelligenceRecord, SourceType
+from . import http_client, metrics
 
 class ClinicalTrialsConnector(DataSourceConnector):
     """
     Connects to ClinicalTrials.gov API v2.
     """
-    BASE_URL = "https://clinicaltrials.gov/api/v2/studies"
+    BASE_URL = os.environ.get("CLINICAL_TRIALS_BASE_URL", "https://clinicaltrials.gov/api/v2") + "/studies"
 
-    def search(self, query: str) -> List[IntelligenceRecord]:
+    def _curl(self, url: str, retries: int = http_client.MAX_RETRIES) -> subprocess.CompletedProcess:
+        """
+        GET via curl, retrying throttled (429) and transient 5xx responses.
+        The status code is appended by curl on the last line and stripped from stdout.
+        """
+        cmd = [
+            "curl", "-s", url,
+            "-H", "User-Agent: curl/8.7.1",
+            "-H", "Accept: application/json",
+            "-w", "\\n%{http_code}"
+        ]
+        for attempt in range(retries + 1):
+            http_client.throttle(url)
+            started = time.perf_counter()
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            body, _, code = result.stdout.rpartition("\n")
+            status = int(code) if code.isdigit() and int(code) else None
+            http_client.record(url, time.perf_counter() - started, status, attempt)
+            result.stdout = body
+            if not http_client.should_retry(status) or attempt == retries:
+                return result
+            time.sleep(http_client.retry_delay(attempt))
+
+    # Studies per page (the API allows up to 1000)
+    page_size = int(os.environ.get("CLINICAL_TRIALS_PAGE_SIZE", "100"))
+    # First fetch of a product (no watermark yet): the most relevant studies only
+    initial_results = int(os.environ.get("CLINICAL_TRIALS_INITIAL_RESULTS", "5"))
+    # Upper bound on one incremental fetch; pages are oldest update first, so a
+    # capped fetch still ends exactly at the newest study returned
+    max_results = int(os.environ.get("CLINICAL_TRIALS_MAX_RESULTS", "10000"))
+
+    def search(self, query: str, since: Optional[datetime] = None) -> List[IntelligenceRecord]:
         results = []
         try:
             # Fallback to curl via subprocess because httpx/requests are blocked (TLS fingerprinting likely)
-            import subprocess
             import json
             
-            cmd = [
-                "curl", "-s", 
-                f"{self.BASE_URL}?query.term={query}&pageSize=5",
-                "-H", "User-Agent: curl/8.7.1",
-                "-H", "Accept: application/json"
-            ]
-            
-            # print(f"DEBUG: Running {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"Error fetching Clinical Trials (curl failed): {result.stderr}")
-                return []
-                
-            try:
-                data = json.loads(result.stdout)
-            except json.JSONDecodeError:
-                print(f"Error decoding Clinical Trials JSON from curl: {result.stdout[:100]}")
-                return []
-            
-            studies = data.get("studies", [])
-            for study in studies:
-                protocol = study.get("protocolSection", {})
-                id_module = protocol.get("identificationModule", {})
-                status_module = protocol.get("statusModule", {})
-                design_module = protocol.get("designModule", {})
-                
-                nct_id = id_module.get("nctId", "Unknown")
-                title = id_module.get("officialTitle") or id_module.get("briefTitle", "No Title")
-                status = status_module.get("overallStatus", "Unknown")
-                phases = design_module.get("phases", ["N/A"])
-                
-                record = IntelligenceRecord(
-                    source_id=nct_id,
-                    source_type=SourceType.CLINICAL_TRIAL,
-                    title=title,
-                    abstract=f"Study Status: {status}. Phases: {', '.join(phases)}",
-                    publication_date=None, # Trials are ongoing
-                    url=f"https://clinicaltrials.gov/study/{nct_id}",
-                    metadata={
-                        "phase": phases,
-                        "status": status,
-                        "conditions": protocol.get("conditionsModule", {}).get("conditions", [])
-                    }
-                )
-                results.append(record)
+            limit = self.max_results if since else self.initial_results
+            params = {"query.term": query, "pageSize": min(self.page_size, limit)}
+            if since:
+                # Only studies updated since the last refresh, oldest first
+                params["filter.advanced"] = f"AREA[LastUpdatePostDate]RANGE[{since:%Y-%m-%d},MAX]"
+                params["sort"] = "LastUpdatePostDate:asc"
+
+            while len(results) < limit:
+                url = f"{self.BASE_URL}?{urlencode(params)}"
+                result = self._curl(url)
+
+                if result.returncode != 0:
+                    print(f"Error fetching Clinical Trials (curl failed): {result.stderr}")
+                    break
+
+                try:
+                    data = json.loads(result.stdout)
+                except json.JSONDecodeError:
+                    print(f"Error decoding Clinical Trials JSON from curl: {result.stdout[:100]}")
+                    break
+
+                studies = data.get("studies", [])[:limit - len(results)]
+                self.archive_raw("clinical_trials", query, [
+                    (s.get("protocolSection", {}).get("identificationModule", {}).get("nctId"), s) for s in studies
+                ])
+                for study in studies:
+                    results.append(parse_study(study))
+
+                if not data.get("nextPageToken") or not studies:
+                    break
+                params["pageToken"] = data["nextPageToken"]
                 
         except Exception as e:
             print(f"Error fetching Clinical Trials: {e}")
+            metrics.record_error("clinical_trials", e)
             
         return results
+
+def parse_study(study: dict) -> IntelligenceRecord:
+    """
+    Maps one API v2 study document (search response or archived payload)
+    to a clinical trial IntelligenceRecord.
+    """
+    protocol = study.get("protocolSection", {})
+    id_module = protocol.get("identificationModule", {})
+    status_module = protocol.get("statusModule", {})
+    design_module = protocol.get("designModule", {})
+    
+    nct_id = id_module.get("nctId", "Unknown")
+    title = id_module.get("officialTitle") or id_module.get("briefTitle", "No Title")
+    status = normalize_status(status_module.get("overallStatus"))
+    phases = [normalize_phase(p) for p in design_module.get("phases") or ["N/A"]]
+    last_update = parse_date(status_module.get("lastUpdatePostDateStruct", {}).get("date"))
+    
+    return IntelligenceRecord(
+        source_id=nct_id,
+        source_type=SourceType.CLINICAL_TRIAL,
+        title=title,
+        abstract=f"Study Status: {status}. Phases: {', '.join(phases)}",
+        publication_date=None, # Trials are ongoing
+        url=f"https://clinicaltrials.gov/study/{nct_id}",
+        metadata={
+            "phase": phases,
+            "status": status,
+            "conditions": protocol.get("conditionsModule", {}).get("conditions", [])
+        },
+        updated_at=last_update
+    )
+
+# Labels shown on ClinicalTrials.gov for the API v2 overallStatus enum
+STATUS_LABELS = {
+    "ACTIVE_NOT_RECRUITING": "Active, not recruiting",
+    "ENROLLING_BY_INVITATION": "Enrolling by invitation",
+    "NOT_YET_RECRUITING": "Not yet recruiting",
+    "TEMPORARILY_NOT_AVAILABLE": "Temporarily not available",
+    "NO_LONGER_AVAILABLE": "No longer available",
+    "APPROVED_FOR_MARKETING": "Approved for marketing",
+    "UNKNOWN": "Unknown",
+    "UNKNOWN_STATUS": "Unknown",
+}
+
+def normalize_status(value: Optional[str]) -> str:
+    """
+    One form for a study status whatever the source: API enums ("ACTIVE_NOT_RECRUITING")
+    and AACT/legacy labels ("Active, Not Recruiting") both give "Active, not recruiting".
+    """
+    key = re.sub(r"[^A-Z]+", "_", (value or "").upper()).strip("_")
+    if not key:
+        return "Unknown"
+    return STATUS_LABELS.get(key) or key.replace("_", " ").capitalize()
+
+def normalize_phase(value: Optional[str]) -> str:
+    """"PHASE2", "Phase 2" -> "Phase 2"; "EARLY_PHASE1" -> "Early Phase 1"; "NA" -> "N/A"."""
+    parts = []
+    for part in re.split(r"\s*/\s*", value or ""):
+        key = re.sub(r"[^A-Z0-9]+", "", part.upper())
+        match = re.fullmatch(r"(EARLY)?PHASE(\d)", key)
+        if match:
+            parts.append(f"{'Early ' if match.group(1) else ''}Phase {match.group(2)}")
+    return "/".join(parts) or "N/A"
+
+def format_phases(phases) -> str:
+    """A study's phase list as one value: ["PHASE1", "PHASE2"] -> "Phase 1/Phase 2"."""
+    if isinstance(phases, str):
+        return normalize_phase(phases)
+    return normalize_phase("/".join(phases or []))
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parses CT.gov partial dates ("2024-03-15" or "2024-03")."""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d", "%Y-%m"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
@@ -1,40 +1,197 @@
-from typing import List
-from datetime import datetime, timedelta
+"""
+Conference abstracts (ASCO, ESMO, AACR...).
+
+Meetings publish their abstracts as downloadable exports (CSV, JSON or XML)
+rather than through a public API. Point CONFERENCE_DUMP_DIR at a directory
+of such exports (or pass `dump_dir`) and the connector searches them; the
+bulk loader (backend/load_conference_abstracts.py) reads the same files.
+Without exports the connector finds nothing: there is no public source to
+query instead.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional
+from datetime import datetime
+from .bulk_files import expand_paths, iter_json_array
 from .models import DataSourceConnector, IntelligenceRecord, SourceType
 
+CONFERENCE_DUMP_DIR = os.environ.get("CONFERENCE_DUMP_DIR", "")
+DUMP_EXTENSIONS = (".csv", ".tsv", ".json", ".jsonl", ".xml")
+
+# Export column/element names differ between meetings and years
+FIELD_ALIASES = {
+    "id": ["abstract_id", "abstract_number", "abstract_no", "id", "number", "doi"],
+    "title": ["title", "abstract_title"],
+    "abstract": ["abstract", "abstract_text", "body", "text", "content"],
+    "authors": ["authors", "author", "presenter", "presenting_author"],
+    "conference": ["conference_name", "conference", "meeting", "meeting_name"],
+    "date": ["date", "presentation_date", "session_date", "publication_date"],
+    "url": ["url", "link"],
+    "presentation_type": ["presentation_type", "session_type", "type"],
+}
+JSON_ARRAY_KEYS = ["abstracts", "results", "items", "records", "data"]
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%B %d, %Y", "%d %B %Y", "%Y"]
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+# =====================
+# Export readers
+# =====================
+
+def _field_key(name: str) -> str:
+    return _NON_WORD.sub("_", name.strip().lower()).strip("_")
+
+def _text_value(value) -> str:
+    if isinstance(value, list):
+        return ", ".join(filter(None, (_text_value(v) for v in value)))
+    if isinstance(value, dict):
+        return value.get("name") or " ".join(str(v) for v in value.values() if isinstance(v, str))
+    return "" if value is None else str(value)
+
+def _flatten(record: Dict) -> Dict[str, str]:
+    return {_field_key(k): _text_value(v) for k, v in record.items()}
+
+def _iter_json_records(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8-sig") as fh:
+        head = fh.read(1 << 16)
+    key = next((k for k in JSON_ARRAY_KEYS if re.search(r'"%s"\s*:\s*\[' % k, head)), None)
+    with open(path, encoding="utf-8-sig") as fh:
+        yield from iter_json_array(fh, key)
+
+def _iter_xml_records(path: str) -> Iterator[Dict[str, str]]:
+    """Each child of the document root is one abstract; its child elements are the fields."""
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            record = {}
+            for child in elem:
+                value = " ".join("".join(child.itertext()).split())
+                key = _field_key(child.tag)
+                # Repeated elements (<author>...) are joined
+                record[key] = f"{record[key]}, {value}" if key in record else value
+            for k, v in elem.attrib.items():
+                record.setdefault(_field_key(k), v)
+            yield record
+            root.clear()
+
+def iter_abstract_records(path: str) -> Iterator[Dict[str, str]]:
+    """Streams the raw records of one export as {normalized field name: text}."""
+    lower = path.lower()
+    if lower.endswith((".csv", ".tsv")):
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            for row in csv.DictReader(fh, delimiter="\t" if lower.endswith(".tsv") else ","):
+                yield {_field_key(k): v or "" for k, v in row.items() if k}
+    elif lower.endswith(".jsonl"):
+        with open(path, encoding="utf-8-sig") as fh:
+            for line in fh:
+                if line.strip():
+                    yield _flatten(json.loads(line))
+    elif lower.endswith(".json"):
+        for record in _iter_json_records(path):
+            yield _flatten(record)
+    elif lower.endswith(".xml"):
+        yield from _iter_xml_records(path)
+
+def _get(record: Dict[str, str], field: str) -> Optional[str]:
+    for alias in FIELD_ALIASES[field]:
+        value = (record.get(alias) or "").strip()
+        if value:
+            return value
+    return None
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+def conference_from_filename(path: str) -> str:
+    """Fallback meeting name for exports that do not carry one: "ASCO_2025.csv" -> "ASCO 2025"."""
+    return " ".join(re.split(r"[_\-\s]+", os.path.splitext(os.path.basename(path))[0])).strip()
+
+def parse_abstract(record: Dict[str, str], conference: Optional[str] = None) -> Optional[IntelligenceRecord]:
+    """
+    Maps one export record to a conference IntelligenceRecord.
+    Returns None for records without a title (session headers, empty rows).
+    """
+    title = _get(record, "title")
+    if not title:
+        return None
+    conference_name = _get(record, "conference") or conference or "Unknown Meeting"
+    # Abstract numbers restart every meeting: the key includes the meeting name
+    abstract_id = _get(record, "id") or hashlib.sha1(title.encode("utf-8")).hexdigest()[:12]
+    authors = _get(record, "authors")
+
+    return IntelligenceRecord(
+        source_id=f"{conference_name}:{abstract_id}",
+        source_type=SourceType.CONFERENCE,
+        title=title,
+        abstract=_get(record, "abstract"),
+        authors=[a.strip() for a in re.split(r"[;,]", authors) if a.strip()] if authors else [],
+        publication_date=_parse_date(_get(record, "date")),
+        url=_get(record, "url"),
+        metadata={
+            "conference_name": conference_name,
+            "presentation_type": _get(record, "presentation_type")
+        }
+    )
+
+def iter_abstracts(path: str, conference: Optional[str] = None) -> Iterator[IntelligenceRecord]:
+    conference = conference or conference_from_filename(path)
+    for record in iter_abstract_records(path):
+        abstract = parse_abstract(record, conference)
+        if abstract is not None:
+            yield abstract
+
+def find_dump_files(paths: List[str]) -> List[str]:
+    return [f for f in expand_paths(paths, "*") if f.lower().endswith(DUMP_EXTENSIONS) and os.path.isfile(f)]
+
+
 class ConferenceConnector(DataSourceConnector):
     """
-    Connects to abstract databases for major conferences (ASCO, ESMO, AACR).
-    Data access is usually restricted, so this is a simulation for the prototype.
+    Connects to abstract databases for major conferences (ASCO, ESMO, AACR)
+    through their local exports. The exports are parsed once, on the first search.
     """
-    def search(self, query: str) -> List[IntelligenceRecord]:
-        # Simulated recent conference abstracts
-        mock_abstracts = [
-            IntelligenceRecord(
-                source_id="ASCO-2025-ABS-1001",
-                source_type=SourceType.CONFERENCE,
-                title=f"Phase 2 results of Novel Agent X in {query} patients",
-                abstract="Presented at ASCO 2025. The study demonstrated significant improvement in PFS...",
-                authors=["Dr. Oncologist A", "University Hospital Zurich"],
-                publication_date=datetime.now() - timedelta(days=60),
-                url="https://asco.org/abstracts/1001",
-                metadata={
-                    "conference_name": "ASCO Annual Meeting 2025",
-                    "presentation_type": "Oral Presentation"
-                }
-            ),
-             IntelligenceRecord(
-                source_id="ESMO-2024-LBA-5",
-                source_type=SourceType.CONFERENCE,
-                title=f"Late Breaking Abstract: Survival outcomes in {query}",
-                abstract="ESMO Congress 2024. Overall survival data remains immature but promising...",
-                authors=["Leading Researcher B", "Global Cancer Center"],
-                publication_date=datetime(2024, 9, 15),
-                url="https://esmo.org/abstracts/LBA5",
-                metadata={
-                    "conference_name": "ESMO Congress 2024",
-                    "presentation_type": "Poster Discussion"
-                }
-            )
+    def __init__(self, dump_dir: Optional[str] = None):
+        self.dump_dir = CONFERENCE_DUMP_DIR if dump_dir is None else dump_dir
+        self._abstracts: Optional[List[IntelligenceRecord]] = None
+        self._lock = threading.Lock()
+
+    def load_abstracts(self) -> List[IntelligenceRecord]:
+        with self._lock:
+            if self._abstracts is None:
+                files = find_dump_files([self.dump_dir]) if self.dump_dir and os.path.isdir(self.dump_dir) else []
+                self._abstracts = [a for f in files for a in iter_abstracts(f)]
+            return self._abstracts
+
+    def search(self, query: str, since: Optional[datetime] = None) -> List[IntelligenceRecord]:
+        abstracts = self.load_abstracts()
+        if not abstracts:
+            return []
+
+        pattern = re.compile(r"\b%s\b" % re.escape(query), re.IGNORECASE)
+        return [
+            a for a in abstracts
+            if pattern.search(a.title) or (a.abstract and pattern.search(a.abstract))
+            if since is None or (a.publication_date and a.publication_date >= since)
         ]
-        return mock_abstracts
@@ -0,0 +1,134 @@
+"""
+Shared HTTP helpers for the connectors: retries with backoff on throttling
+(429, honouring Retry-After) and transient server errors, a per-host request
+rate limit shared by every thread of the process, and a listener hook that
+reports every request's latency (used by the benchmarks).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "4"))
+BACKOFF_SECONDS = float(os.environ.get("HTTP_BACKOFF_SECONDS", "0.5"))
+MAX_BACKOFF_SECONDS = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests per second per host, under each API's published limit. Concurrent
+# fetches (e.g. the refresh scheduler's workers) share the host's budget.
+HOST_RATE_LIMITS = {
+    "eutils.ncbi.nlm.nih.gov": float(os.environ.get("PUBMED_RATE_LIMIT", "3")),  # 10 with an NCBI API key
+    "clinicaltrials.gov": float(os.environ.get("CLINICAL_TRIALS_RATE_LIMIT", "10")),
+    "api.fda.gov": float(os.environ.get("OPENFDA_RATE_LIMIT", "4")),  # 240/min with a key
+    "pubchem.ncbi.nlm.nih.gov": float(os.environ.get("PUBCHEM_RATE_LIMIT", "5")),
+}
+
+# Callables invoked as listener(url, seconds, status, attempt); status is None on transport errors
+_listeners: List[Callable] = []
+
+
+def add_listener(listener: Callable):
+    _listeners.append(listener)
+
+def remove_listener(listener: Callable):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+def record(url: str, seconds: float, status: Optional[int], attempt: int = 0):
+    """Reports one request to the listeners (connectors not using httpx call this directly)."""
+    for listener in list(_listeners):
+        try:
+            listener(url, seconds, status, attempt)
+        except Exception as e:
+            print(f"HTTP listener failed: {e}")
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if given, else jittered exponential backoff."""
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass  # HTTP-date form: fall back to backoff
+    return min(BACKOFF_SECONDS * (2 ** attempt), MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+
+def should_retry(status: Optional[int]) -> bool:
+    return status is None or status in RETRY_STATUSES
+
+
+class RateLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart, across threads."""
+    def __init__(self, limits: Dict[str, float]):
+        self.limits = limits
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url: str) -> float:
+        """Books the next free slot for the URL's host. Returns the seconds to wait for it."""
+        host = urlparse(url).hostname
+        rate = self.limits.get(host)
+        if not rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + 1 / rate
+        return slot - now
+
+rate_limiter = RateLimiter(HOST_RATE_LIMITS)
+
+def throttle(url: str):
+    """Blocks until a request to the URL's host fits its rate limit (connectors not using httpx call this directly)."""
+    delay = rate_limiter.reserve(url)
+    if delay > 0:
+        time.sleep(delay)
+
+
+def request(method: str, url: str, client: Optional[httpx.Client] = None, retries: int = MAX_RETRIES, **kwargs) -> httpx.Response:
+    """httpx request with retries. Returns the last response, raises the last transport error."""
+    for attempt in range(retries + 1):
+        throttle(url)
+        started = time.perf_counter()
+        try:
+            response = client.request(method, url, **kwargs) if client else httpx.request(method, url, **kwargs)
+        except httpx.TransportError:
+            record(url, time.perf_counter() - started, None, attempt)
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay(attempt))
+            continue
+        record(url, time.perf_counter() - started, response.status_code, attempt)
+        if not should_retry(response.status_code) or attempt == retries:
+            return response
+        time.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
+
+def get(url: str, **kwargs) -> httpx.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> httpx.Response:
+    return request("POST", url, **kwargs)
+
+
+async def arequest(client: httpx.AsyncClient, method: str, url: str, retries: int = MAX_RETRIES, **kwargs) -> httpx.Response:
+    """Async counterpart of `request` for httpx.AsyncClient users."""
+    for attempt in range(retries + 1):
+        delay = rate_limiter.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            record(url, time.perf_counter() - started, None, attempt)
+            if attempt == retries:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+        record(url, time.perf_counter() - started, response.status_code, attempt)
+        if not should_retry(response.status_code) or attempt == retries:
+            return response
+        await asyncio.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
@@ -0,0 +1,155 @@
+"""
+Per-run ingestion metrics: records per source, time per stage, HTTP latency
+histograms, retries and errors.
+
+The collector of the current run is held in a context variable, so connectors
+and helpers report to it without being passed it: asyncio tasks and
+`asyncio.to_thread` calls inherit it, and every request made through
+http_client is recorded automatically. Outside a run, reporting is a no-op.
+backend.ingestion.track_run starts a run and persists it as an IngestionRun.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from . import http_client
+
+# Upper bounds (ms) of the HTTP latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+MAX_ERRORS = 20  # Error messages kept per run
+
+_current: ContextVar[Optional["RunMetrics"]] = ContextVar("ingestion_run", default=None)
+
+
+def new_source_stats() -> Dict[str, int]:
+    """Per-source counters; also usable as bulk_upsert `stats`."""
+    return {"fetched": 0, "inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+
+
+class RunMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.sources: Dict[str, Dict[str, int]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.http: Dict[str, Dict] = {}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def source(self, source: str) -> Dict[str, int]:
+        with self._lock:
+            return self.sources.setdefault(source, new_source_stats())
+
+    def count(self, source: str, **counts: int):
+        stats = self.source(source)
+        with self._lock:
+            for key, n in counts.items():
+                stats[key] = stats.get(key, 0) + n
+
+    def error(self, source: str, error):
+        self.count(source, errors=1)
+        with self._lock:
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append(f"[{source}] {error}"[:300])
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                stage["seconds"] += elapsed
+                stage["calls"] += 1
+
+    def observe_request(self, url: str, seconds: float, status: Optional[int], attempt: int):
+        host = urlparse(url).netloc or url
+        ms = seconds * 1000
+        bucket = next((str(b) for b in LATENCY_BUCKETS_MS if ms <= b), "inf")
+        with self._lock:
+            h = self.http.setdefault(host, {
+                "requests": 0, "retries": 0, "throttled": 0, "failed": 0, "total_ms": 0.0,
+                "histogram_ms": {str(b): 0 for b in LATENCY_BUCKETS_MS + ["inf"]}
+            })
+            h["requests"] += 1
+            h["total_ms"] += ms
+            h["histogram_ms"][bucket] += 1
+            if attempt > 0:
+                h["retries"] += 1
+            if status == 429:
+                h["throttled"] += 1
+            elif status is None or status >= 500:
+                h["failed"] += 1
+
+    def records_written(self) -> int:
+        return sum(s["inserted"] + s["updated"] for s in self.sources.values())
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            written = self.records_written()
+            return {
+                "seconds": round(elapsed, 3),
+                "records_written": written,
+                "records_per_s": round(written / elapsed, 1) if elapsed else None,
+                "sources": {k: dict(v) for k, v in self.sources.items()},
+                # Busy time summed over concurrent tasks, so it can exceed the run time
+                "stages": {k: {"seconds": round(v["seconds"], 3), "calls": v["calls"]} for k, v in self.stages.items()},
+                "http": {k: dict(v, total_ms=round(v["total_ms"], 1)) for k, v in self.http.items()},
+                "errors": list(self.errors),
+            }
+
+
+def current_run() -> Optional[RunMetrics]:
+    return _current.get()
+
+@contextmanager
+def collecting(metrics: RunMetrics):
+    """Makes `metrics` the current run for this context and the tasks and to_thread calls started from it."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+def run_in(metrics: Optional[RunMetrics], fn, *args):
+    """Calls fn(*args) with `metrics` as the current run, e.g. in a thread pool worker."""
+    with collecting(metrics):
+        return fn(*args)
+
+def source_stats(source: str) -> Optional[Dict[str, int]]:
+    """The current run's counters for `source` (None outside a run), for bulk_upsert `stats`."""
+    run = _current.get()
+    return run.source(source) if run else None
+
+def count(source: str, **counts: int):
+    run = _current.get()
+    if run:
+        run.count(source, **counts)
+
+def record_error(source: str, error):
+    run = _current.get()
+    if run:
+        run.error(source, error)
+
+@contextmanager
+def stage(name: str):
+    run = _current.get()
+    if run is None:
+        yield
+        return
+    with run.stage(name):
+        yield
+
+
+def _on_request(url, seconds, status, attempt):
+    run = _current.get()
+    if run:
+        run.observe_request(url, seconds, status, attempt)
+
+http_client.add_listener(_on_request)
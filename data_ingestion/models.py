@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict
+from typing import Any, Iterable, List, Optional, Dict, Tuple
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -26,9 +26,32 @@ class IntelligenceRecord(BaseModel):
     # Link to a specific product/compound if known at ingestion time
     related_product: Optional[str] = None
 
+    # When the source last added/changed this record (PubMed edat,
+    # ClinicalTrials.gov LastUpdatePostDate, OpenFDA effective_time).
+    # Used to advance per-product ingestion watermarks.
+    updated_at: Optional[datetime] = None
+
 class DataSourceConnector:
     """
     Base class for all data connectors.
     """
-    def search(self, query: str) -> List[IntelligenceRecord]:
+    # Raw-payload archive (see archive.py); None uses the process-wide default, False disables it
+    archive = None
+
+    def archive_raw(self, source: str, query: Optional[str], items: Iterable[Tuple[str, Any]]):
+        """Keeps the unparsed (id, payload) pairs of a response for later reprocessing."""
+        from .archive import default_archive
+        archive = default_archive() if self.archive is None else self.archive
+        if not archive:
+            return
+        try:
+            archive.write(source, query, items)
+        except Exception as e:
+            print(f"Error archiving {source} payloads: {e}")
+
+    def search(self, query: str, since: Optional[datetime] = None) -> List[IntelligenceRecord]:
+        """
+        Returns records matching `query`. When `since` is given, connectors that
+        support it only return records added or changed on/after that date.
+        """
         raise NotImplementedError
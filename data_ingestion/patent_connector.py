@@ -14,7 +14,7 @@ class PatentConnector(DataSourceConnector):
         import random
         from datetime import timedelta
         
-    def search(self, query: str) -> List[IntelligenceRecord]:
+    def search(self, query: str, since: Optional[datetime] = None) -> List[IntelligenceRecord]:
         """
         Returns REAL patent data for supported drugs, and high-quality synthetic data for others.
         """
@@ -0,0 +1,182 @@
+"""
+Parsers for patent full-text bulk XML:
+- USPTO weekly grant (`ipgYYMMDD.zip`) and application (`ipaYYMMDD.zip`) files
+  from https://bulkdata.uspto.gov/ (`us-patent-grant` / `us-patent-application`),
+- EPO publication server documents (`ep-patent-document`).
+
+A USPTO weekly file is thousands of complete XML documents concatenated, each
+with its own declaration and DOCTYPE, so it is not well-formed as a whole:
+`iter_xml_documents` splits it back into documents while streaming, and
+`parse_patent_document` reads each one with iterparse, dropping the (large)
+description section as soon as it has been read.
+"""
+import io
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from html.entities import name2codepoint
+from typing import Dict, Iterator, Optional
+
+PATENT_TERM_YEARS = 20
+
+_XML_ENTITIES = {"amp", "lt", "gt", "quot", "apos"}
+_NAMED_ENTITY = re.compile(rb"&([A-Za-z][A-Za-z0-9]*);")
+
+
+def iter_xml_documents(path: str) -> Iterator[bytes]:
+    """Yields the XML documents of a bulk file (zip of .xml members, or plain .xml), one at a time."""
+    if not zipfile.is_zipfile(path):
+        with open(path, "rb") as fh:
+            yield from _split_documents(fh)
+        return
+
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if member.lower().endswith(".xml"):
+                with zf.open(member) as fh:
+                    yield from _split_documents(fh)
+
+def _split_documents(stream) -> Iterator[bytes]:
+    lines = []
+    for line in stream:
+        if line.startswith(b"<?xml") and lines:
+            yield b"".join(lines)
+            lines = []
+        lines.append(line)
+    if lines and b"".join(lines).strip():
+        yield b"".join(lines)
+
+
+def _replace_entities(doc: bytes) -> bytes:
+    # The DTDs are not loaded, so named entities (&mdash; ...) would be undefined
+    def numeric(match):
+        name = match.group(1).decode()
+        if name in _XML_ENTITIES or name not in name2codepoint:
+            return match.group(0)
+        return b"&#%d;" % name2codepoint[name]
+    return _NAMED_ENTITY.sub(numeric, doc)
+
+def _text(elem) -> str:
+    return " ".join("".join(elem.itertext()).split()) if elem is not None else ""
+
+def _date(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value.strip()[:8], "%Y%m%d") if value else None
+    except ValueError:
+        return None
+
+def add_years(date: datetime, years: int) -> datetime:
+    try:
+        return date.replace(year=date.year + years)
+    except ValueError:
+        return date.replace(year=date.year + years, day=28)  # 29 February
+
+def _party_name(elem) -> Optional[str]:
+    """Organisation name of an assignee/applicant, or "First Last" for individuals."""
+    org = elem.findtext(".//orgname") or elem.findtext(".//snm")
+    if org:
+        return org.strip()
+    name = " ".join(filter(None, [elem.findtext(".//first-name"), elem.findtext(".//last-name")]))
+    return name or None
+
+def _source_id(country: str, number: str) -> str:
+    # Grants are zero-padded to 8 digits ("09220776"), applications are not
+    if number.isdigit() and len(number) == 8:
+        number = number.lstrip("0")
+    return f"{country}{number}"
+
+
+def parse_patent_document(doc: bytes) -> Optional[Dict]:
+    """
+    Extracts the stored fields of one USPTO or EPO document.
+    Returns None for design/plant patents and documents that are not patents
+    (e.g. sequence listings shipped in the same file).
+    """
+    fields = {"priority_dates": [], "claims": [], "assignee": None, "applicant": None, "title": None, "abstract": None}
+    root = None
+    title_lang = None
+    term_extension = 0
+
+    for event, elem in ET.iterparse(io.BytesIO(_replace_entities(doc)), events=("start", "end")):
+        if root is None:
+            root = elem
+            if root.tag not in ("us-patent-grant", "us-patent-application", "ep-patent-document"):
+                return None
+            continue
+        if event == "start":
+            continue
+
+        tag = elem.tag
+        # USPTO
+        if tag == "publication-reference":
+            fields["country"] = elem.findtext(".//country")
+            fields["number"] = elem.findtext(".//doc-number")
+            fields["kind"] = elem.findtext(".//kind")
+            fields["publication_date"] = _date(elem.findtext(".//date"))
+        elif tag == "application-reference":
+            if elem.get("appl-type", "utility") != "utility":
+                return None
+            fields["filing_date"] = _date(elem.findtext(".//date"))
+        elif tag in ("priority-claim", "us-provisional-application"):
+            fields["priority_dates"].append(_date(elem.findtext(".//date")))
+        elif tag == "invention-title" and not fields["title"]:
+            fields["title"] = _text(elem)
+        elif tag == "assignee" and not fields["assignee"]:
+            fields["assignee"] = _party_name(elem)
+        elif tag in ("us-applicant", "applicant") and not fields["applicant"]:
+            fields["applicant"] = _party_name(elem)
+        elif tag == "us-term-extension":
+            term_extension = int(elem.text or 0)
+        # EPO
+        elif tag == "B220":
+            fields["filing_date"] = _date(elem.findtext("date"))
+        elif tag == "B320":
+            fields["priority_dates"].append(_date(elem.findtext("date")))
+        elif tag == "B541":
+            title_lang = (elem.text or "").strip()
+        elif tag == "B542" and (title_lang == "en" or not fields["title"]):
+            fields["title"] = _text(elem)
+        elif tag == "B731" and not fields["assignee"]:
+            fields["assignee"] = _party_name(elem)
+        # Both: EPO repeats abstract and claims per language, keep the English ones
+        elif tag == "abstract" and elem.get("lang", "en") == "en":
+            fields["abstract"] = _text(elem)
+        elif tag == "claims" and elem.get("lang", "en") == "en":
+            fields["claims"] = [_text(claim) for claim in elem.iter("claim")]
+            elem.clear()
+        elif tag == "description":
+            elem.clear()
+
+    if root.tag == "ep-patent-document":
+        fields["country"] = root.get("country", "EP")
+        fields["number"] = root.get("doc-number")
+        fields["kind"] = root.get("kind")
+        fields["publication_date"] = _date(root.get("date-publ"))
+        granted = (fields["kind"] or "").startswith("B")
+    else:
+        granted = root.tag == "us-patent-grant"
+
+    if not fields.get("number"):
+        return None
+
+    filing_date = fields.get("filing_date")
+    priority_dates = [d for d in fields["priority_dates"] + [filing_date] if d]
+    expiry_date = None
+    if filing_date:
+        # Term runs from the filing date; USPTO adds any patent term adjustment (days)
+        expiry_date = add_years(filing_date, PATENT_TERM_YEARS) + timedelta(days=term_extension)
+
+    return {
+        "source_id": _source_id(fields.get("country") or "US", fields["number"].strip()),
+        "kind": fields.get("kind"),
+        "title": fields["title"] or "Untitled",
+        "abstract": fields["abstract"],
+        "assignee": fields["assignee"] or fields["applicant"],
+        "status": "Granted" if granted else "Application",
+        "publication_date": fields.get("publication_date"),
+        "filing_date": filing_date,
+        "priority_date": min(priority_dates) if priority_dates else None,
+        "expiry_date": expiry_date,
+        "claims": fields["claims"],
+    }
@@ -1,25 +1,84 @@
+import os
 import httpx
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from . import http_client, metrics
+
+PUBCHEM_BASE_URL = os.environ.get("PUBCHEM_BASE_URL", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+
+PROPERTIES = "MolecularWeight,MolecularFormula,CanonicalSMILES,IsomericSMILES,IUPACName"
 
 class PubChemConnector:
     """
     Connects to PubChem PUG REST API to fetch chemical properties.
     """
-    BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name"
+    BASE_URL = f"{PUBCHEM_BASE_URL}/compound/name"
+    CID_URL = f"{PUBCHEM_BASE_URL}/compound/cid"
+    CID_BATCH_SIZE = 100 # CIDs per property request
+    MAX_CONCURRENT = 4 # PubChem allows at most 5 requests/second
 
     def get_compound_properties(self, drug_name: str) -> Optional[Dict[str, Any]]:
         # Properties to fetch
-        props = "MolecularWeight,MolecularFormula,CanonicalSMILES,IsomericSMILES,IUPACName"
+        props = PROPERTIES
         url = f"{self.BASE_URL}/{drug_name}/property/{props}/JSON"
         
         try:
             # print(f"DEBUG: Fetching PubChem for {drug_name}")
-            response = httpx.get(url, timeout=10)
+            response = http_client.get(url, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if "PropertyTable" in data and "Properties" in data["PropertyTable"]:
                     return data["PropertyTable"]["Properties"][0]
         except Exception as e:
             print(f"Error fetching PubChem data for {drug_name}: {e}")
+            metrics.record_error("pubchem", e)
             
         return None
+
+    def resolve_cids(self, names: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Maps drug names to their first PubChem CID (None when unknown).
+        PUG REST accepts a single name per request, so names are resolved over
+        one pooled connection with a few requests in flight.
+        """
+        with httpx.Client(timeout=10) as client:
+            def resolve(name):
+                try:
+                    # POSTing the name avoids URL-escaping issues with "/" in combination products
+                    response = http_client.post(f"{self.BASE_URL}/cids/JSON", client=client, data={"name": name})
+                    if response.status_code == 200:
+                        cids = response.json().get("IdentifierList", {}).get("CID", [])
+                        return name, (cids[0] if cids and cids[0] else None)
+                except Exception as e:
+                    print(f"Error resolving PubChem CID for {name}: {e}")
+                    metrics.record_error("pubchem", e)
+                return name, None
+
+            run = metrics.current_run()  # Pool threads do not inherit the caller's context
+            with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as pool:
+                return dict(pool.map(lambda name: metrics.run_in(run, resolve, name), names))
+
+    def get_properties_by_cids(self, cids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Fetches properties for many compounds, CID_BATCH_SIZE CIDs per request."""
+        results = {}
+        with httpx.Client(timeout=30) as client:
+            for i in range(0, len(cids), self.CID_BATCH_SIZE):
+                chunk = cids[i:i + self.CID_BATCH_SIZE]
+                try:
+                    response = http_client.post(
+                        f"{self.CID_URL}/property/{PROPERTIES}/JSON", client=client,
+                        data={"cid": ",".join(str(c) for c in chunk)}
+                    )
+                    if response.status_code == 200:
+                        for props in response.json().get("PropertyTable", {}).get("Properties", []):
+                            results[props["CID"]] = props
+                except Exception as e:
+                    print(f"Error fetching PubChem properties for {len(chunk)} CIDs: {e}")
+                    metrics.record_error("pubchem", e)
+        return results
+
+    def get_compound_properties_batch(self, names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Batched variant of get_compound_properties: {name: properties or None}."""
+        cids = self.resolve_cids(names)
+        props = self.get_properties_by_cids(sorted({c for c in cids.values() if c}))
+        return {name: props.get(cid) if cid else None for name, cid in cids.items()}
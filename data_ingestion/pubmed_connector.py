@@ -1,60 +1,115 @@
-import httpx
+import os
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from .models import DataSourceConnector, IntelligenceRecord, SourceType
+from . import http_client, metrics
 
 class PubMedConnector(DataSourceConnector):
-    BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    BASE_URL = os.environ.get("PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
 
-    def search(self, query: str) -> List[IntelligenceRecord]:
+    # PMIDs per ESearch/EFetch page
+    page_size = int(os.environ.get("PUBMED_PAGE_SIZE", "200"))
+    # First fetch of a product (no watermark yet): the most relevant articles only
+    initial_results = int(os.environ.get("PUBMED_INITIAL_RESULTS", "5"))
+    # ESearch cannot page past retstart 9999
+    max_results = 9999
+
+    def search(self, query: str, since: Optional[datetime] = None) -> List[IntelligenceRecord]:
         results = []
         try:
-            # 1. ESearh to get IDs
-            search_url = f"{self.BASE_URL}/esearch.fcgi?db=pubmed&term={query}&retmode=json&retmax=5"
-            response = httpx.get(search_url)
-            data = response.json()
-            ids = data.get("esearchresult", {}).get("idlist", [])
-            
-            if not ids:
-                return []
+            # Incremental fetches page through the whole since-window: the default
+            # relevance order says nothing about which hits are newest
+            limit = self.max_results if since else min(self.initial_results, self.max_results)
+            start = total = 0
+            while start < limit:
+                # 1. ESearch to get one page of IDs
+                retmax = min(self.page_size, limit - start)
+                search_url = f"{self.BASE_URL}/esearch.fcgi?db=pubmed&term={query}&retmode=json&retstart={start}&retmax={retmax}"
+                if since:
+                    # Only articles added to PubMed (Entrez date) since the last refresh
+                    search_url += f"&datetype=edat&mindate={since:%Y/%m/%d}&maxdate=3000"
+                response = http_client.get(search_url)
+                data = response.json().get("esearchresult", {})
+                ids = data.get("idlist", [])
+                if not ids:
+                    break
+                results.extend(self._fetch(query, ids))
+                start += len(ids)
+                total = int(data.get("count", 0))
+                if start >= total:
+                    break
+            if since and start < total:
+                # The watermark may skip the unpaged remainder: make it visible
+                print(f"PubMed: '{query}' has {total} new articles since {since:%Y-%m-%d}; only the first {start} were fetched")
+                metrics.record_error("pubmed", RuntimeError(f"since-window truncated at {start} of {total}"))
 
-            # 2. EFetch to get details
-            ids_str = ",".join(ids)
-            fetch_url = f"{self.BASE_URL}/efetch.fcgi?db=pubmed&id={ids_str}&retmode=xml"
-            response = httpx.get(fetch_url)
-            
-            # Simple XML parsing (robust parsing would use a library)
-            root = ET.fromstring(response.content)
-            
-            for article in root.findall(".//PubmedArticle"):
-                title_node = article.find(".//ArticleTitle")
-                abstract_node = article.find(".//AbstractText")
-                pub_date_node = article.find(".//PubDate/Year")
-                
-                title = title_node.text if title_node is not None else "No Title"
-                abstract = abstract_node.text if abstract_node is not None else "No Abstract"
-                year = pub_date_node.text if pub_date_node is not None else str(datetime.now().year)
-                
-                # Try to find DOI
-                doi = "N/A"
-                for aid in article.findall(".//ArticleId"):
-                    if aid.get("IdType") == "doi":
-                        doi = aid.text
-                        break
-
-                record = IntelligenceRecord(
-                    source_id=doi,
-                    source_type=SourceType.ARTICLE,
-                    title=title,
-                    abstract=abstract,
-                    publication_date=datetime(int(year), 1, 1),
-                    url=f"https://pubmed.ncbi.nlm.nih.gov/{doi}" if doi != "N/A" else None,
-                    metadata={"doi": doi}
-                )
-                results.append(record)
-                
         except Exception as e:
             print(f"Error fetching PubMed data: {e}")
+            metrics.record_error("pubmed", e)
+            # Pages are in relevance order: a partial window would move the
+            # watermark past articles not fetched yet, so retry it whole next time
+            results = []
             
         return results
+
+    def _fetch(self, query: str, ids: List[str]) -> List[IntelligenceRecord]:
+        """EFetch for one page of PMIDs."""
+        fetch_url = f"{self.BASE_URL}/efetch.fcgi?db=pubmed&id={','.join(ids)}&retmode=xml"
+        response = http_client.get(fetch_url)
+
+        # Simple XML parsing (robust parsing would use a library)
+        root = ET.fromstring(response.content)
+
+        articles = root.findall(".//PubmedArticle")
+        self.archive_raw("pubmed", query, [
+            (a.findtext(".//MedlineCitation/PMID"), ET.tostring(a, encoding="unicode")) for a in articles
+        ])
+        return [parse_article(article) for article in articles]
+
+def parse_article(article) -> IntelligenceRecord:
+    """
+    Maps one <PubmedArticle> element (efetch response or archived payload)
+    to an article IntelligenceRecord.
+    """
+    title_node = article.find(".//ArticleTitle")
+    abstract_node = article.find(".//AbstractText")
+    
+    # Titles may carry markup (<i>, <sup>...): keep all the text
+    title = "".join(title_node.itertext()) if title_node is not None else "No Title"
+    abstract = abstract_node.text if abstract_node is not None else "No Abstract"
+    # Older citations only have a free-text MedlineDate ("1998 Dec-1999 Jan")
+    pub_date = article.findtext(".//PubDate/Year") or (article.findtext(".//PubDate/MedlineDate") or "")[:4]
+    year = pub_date if pub_date.isdigit() else str(datetime.now().year)
+    authors = [
+        " ".join(filter(None, [a.findtext("LastName"), a.findtext("Initials")])) or a.findtext("CollectiveName")
+        for a in article.findall(".//AuthorList/Author")
+    ]
+    
+    # The article's own DOI: ReferenceList entries carry ArticleIds of the cited papers
+    doi = (article.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+           or article.findtext("MedlineCitation/Article/ELocationID[@EIdType='doi']") or "N/A").strip() or "N/A"
+    pmid = article.findtext(".//MedlineCitation/PMID")
+
+    return IntelligenceRecord(
+        # DOI is the natural key; fall back to the PMID when there is none
+        source_id=doi if doi != "N/A" or not pmid else f"PMID:{pmid}",
+        source_type=SourceType.ARTICLE,
+        title=title,
+        abstract=abstract,
+        authors=[a for a in authors if a],
+        publication_date=datetime(int(year), 1, 1),
+        url=f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/" if pmid else None,
+        metadata={"doi": doi, "pmid": pmid},
+        updated_at=_entrez_date(article)
+    )
+
+def _entrez_date(article) -> Optional[datetime]:
+    """Date the article was added to PubMed (edat), from the PubmedData history."""
+    node = article.find(".//PubmedData/History/PubMedPubDate[@PubStatus='entrez']")
+    if node is None:
+        return None
+    try:
+        return datetime(int(node.findtext("Year")), int(node.findtext("Month")), int(node.findtext("Day")))
+    except (TypeError, ValueError):
+        return None
@@ -344,7 +344,7 @@ def seed():
             except Exception as e:
                 print(f"    Warning: PubMed fetch failed: {e}")
             
-            # Conference data (mock)
+            # Conference data (local abstract exports, CONFERENCE_DUMP_DIR)
             print("  > Adding conference abstracts...")
             try:
                 confs = ConferenceConnector().search(product_name)